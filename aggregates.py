@@ -0,0 +1,269 @@
+"""
+Agregat statistik prediksi yang di-maintain secara incremental.
+
+Tabel prediksi_agregat berisi counter (total, positif) per dimensi:
+- semua : satu baris total keseluruhan
+- model : per nama model (tabel model, lihat schema.py)
+- hari  : per tanggal waktu_prediksi (UTC)
+- usia  : per kelompok usia 10 tahunan (batas_bawah/batas_atas = rentang usia numerik)
+
+Counter di-update oleh trigger SQLite saat INSERT/DELETE pada tabel prediksi,
+jadi /statistik cukup membaca beberapa baris tanpa scan tabel.
+
+Baris yang dipindah ke arsip (retention.py) dihapus dari tabel panas, tetapi
+counternya lebih dulu dipindah ke prediksi_agregat_arsip, sehingga /statistik
+tetap menghitung seluruh riwayat (panas + arsip).
+
+Pemakaian:
+    python aggregates.py rebuild    # hitung ulang semua counter dari tabel mentah
+"""
+import argparse
+import re
+import sys
+
+# Awal kelompok usia, dibulatkan ke bawah; usia / 10 di SQLite membulatkan ke
+# arah nol sehingga usia negatif (data lama) masuk ke kelompok yang salah
+AGE_LOWER = "({row}.usia - ({row}.usia % 10 + 10) % 10)"
+
+# (kunci, batas_bawah, batas_atas) per dimensi; {row} diganti NEW/OLD di trigger
+# atau prediksi saat rebuild. Batas hanya untuk usia, dimensi lain NULL.
+DIMENSIONS = {
+    'semua': ("''", 'NULL', 'NULL'),
+    'model': ("COALESCE((SELECT nama FROM model WHERE id = {row}.model_id), '-')", 'NULL', 'NULL'),
+    'hari': ("COALESCE(date({row}.waktu_prediksi), '-')", 'NULL', 'NULL'),
+    'usia': (
+        "CASE WHEN {row}.usia IS NULL THEN '-' "
+        "ELSE printf('%03d-%03d', " + AGE_LOWER + ", " + AGE_LOWER + " + 9) END",
+        AGE_LOWER,
+        AGE_LOWER + ' + 9',
+    ),
+}
+
+SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        dimensi TEXT NOT NULL,
+        kunci TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        positif INTEGER NOT NULL DEFAULT 0,
+        batas_bawah INTEGER,
+        batas_atas INTEGER,
+        PRIMARY KEY (dimensi, kunci)
+    ) WITHOUT ROWID
+'''
+
+# Counter milik baris yang sudah dipindah ke file arsip
+ARCHIVE_TABLE = 'prediksi_agregat_arsip'
+
+
+def _columns(row):
+    """'name', kunci, batas_bawah, batas_atas per dimensi untuk VALUES / SELECT"""
+    return {
+        name: ', '.join([f"'{name}'"] + [expr.format(row=row) for expr in exprs])
+        for name, exprs in DIMENSIONS.items()
+    }
+
+
+def _insert_trigger_sql():
+    values = ',\n'.join(
+        f"({columns}, 1, COALESCE(NEW.hasil_prediksi = 1, 0))" for columns in _columns('NEW').values()
+    )
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS prediksi_agregat_insert AFTER INSERT ON prediksi
+        BEGIN
+            INSERT INTO prediksi_agregat (dimensi, kunci, batas_bawah, batas_atas, total, positif) VALUES
+            {values}
+            ON CONFLICT (dimensi, kunci) DO UPDATE SET
+                total = total + excluded.total,
+                positif = positif + excluded.positif;
+        END
+    '''
+
+
+def _delete_trigger_sql():
+    updates = '\n'.join(
+        f'''UPDATE prediksi_agregat
+            SET total = total - 1, positif = positif - COALESCE(OLD.hasil_prediksi = 1, 0)
+            WHERE dimensi = '{name}' AND kunci = {key.format(row='OLD')};'''
+        for name, (key, _, _) in DIMENSIONS.items()
+    )
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS prediksi_agregat_delete AFTER DELETE ON prediksi
+        BEGIN
+            {updates}
+        END
+    '''
+
+
+def create_triggers(conn, replace=False):
+    """Trigger INSERT/DELETE pada tabel prediksi (tanpa commit)"""
+    if replace:
+        conn.execute('DROP TRIGGER IF EXISTS prediksi_agregat_insert')
+        conn.execute('DROP TRIGGER IF EXISTS prediksi_agregat_delete')
+    conn.execute(_insert_trigger_sql())
+    conn.execute(_delete_trigger_sql())
+
+
+def _parse_age_key(kunci):
+    """(batas_bawah, batas_atas) dari kunci usia lama seperti '040-049' atau '-10--01'"""
+    match = re.fullmatch(r'(-?\d+)-(-?\d+)', kunci)
+    return (int(match.group(1)), int(match.group(2))) if match else (None, None)
+
+
+def _add_bounds(conn):
+    """
+    Tabel agregat dari versi sebelumnya belum punya kolom batas usia: tambah
+    kolom, isi batas counter arsip dari kuncinya. Return True jika diubah
+    (counter tabel panas lalu dihitung ulang oleh rebuild).
+    """
+    upgraded = False
+    # Dicek per tabel: database dari sebelum retensi belum punya tabel arsip (baru dibuat, sudah berkolom batas)
+    for table in ('prediksi_agregat', ARCHIVE_TABLE):
+        if 'batas_bawah' not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN batas_bawah INTEGER')
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN batas_atas INTEGER')
+            upgraded = True
+    if not upgraded:
+        return False
+    keys = conn.execute(f"SELECT kunci FROM {ARCHIVE_TABLE} WHERE dimensi = 'usia' AND kunci <> '-'").fetchall()
+    conn.executemany(
+        f"UPDATE {ARCHIVE_TABLE} SET batas_bawah = ?, batas_atas = ? WHERE dimensi = 'usia' AND kunci = ?",
+        [(*_parse_age_key(kunci), kunci) for kunci, in keys],
+    )
+    return True
+
+
+def init_aggregates(conn):
+    """Buat tabel + trigger; isi counter dari tabel mentah jika tabel agregat baru atau versi lama"""
+    with conn:
+        # Satu transaksi: insert writer tidak pernah jatuh di antara DROP dan CREATE trigger
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(SCHEMA_SQL.format(table='prediksi_agregat'))
+        conn.execute(SCHEMA_SQL.format(table=ARCHIVE_TABLE))
+        upgraded = _add_bounds(conn)
+        # Selalu dibuat ulang: trigger dari versi lama (tanpa COALESCE untuk hasil NULL) ikut diganti
+        create_triggers(conn, replace=True)
+        empty = conn.execute('SELECT COUNT(*) FROM prediksi_agregat').fetchone()[0] == 0
+    if empty or upgraded:
+        rebuild(conn)
+
+
+def rebuild(conn):
+    """Hitung ulang counter tabel panas dari tabel prediksi dalam satu transaksi (counter arsip tetap)"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        before = dict(
+            ((dimensi, kunci), (total, positif))
+            for dimensi, kunci, total, positif in conn.execute(
+                'SELECT dimensi, kunci, total, positif FROM prediksi_agregat WHERE total > 0'
+            )
+        )
+        conn.execute('DELETE FROM prediksi_agregat')
+        for name, columns in _columns('prediksi').items():
+            key = DIMENSIONS[name][0].format(row='prediksi')
+            conn.execute(f'''
+                INSERT INTO prediksi_agregat (dimensi, kunci, batas_bawah, batas_atas, total, positif)
+                SELECT {columns}, COUNT(*), COALESCE(SUM(hasil_prediksi = 1), 0)
+                FROM prediksi
+                GROUP BY {key}
+            ''')
+        after = dict(
+            ((dimensi, kunci), (total, positif))
+            for dimensi, kunci, total, positif in conn.execute(
+                'SELECT dimensi, kunci, total, positif FROM prediksi_agregat WHERE total > 0'
+            )
+        )
+    changed = sum(1 for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+    return changed
+
+
+def move_to_archive(conn, where, params=()):
+    """
+    Tambahkan counter baris prediksi yang cocok dengan `where` ke tabel arsip.
+    Dipanggil di transaksi yang sama, tepat sebelum baris tersebut di-DELETE
+    (trigger delete lalu mengurangi counter tabel panas).
+    """
+    for name, columns in _columns('prediksi').items():
+        key = DIMENSIONS[name][0].format(row='prediksi')
+        conn.execute(f'''
+            INSERT INTO {ARCHIVE_TABLE} (dimensi, kunci, batas_bawah, batas_atas, total, positif)
+            SELECT {columns}, COUNT(*), COALESCE(SUM(hasil_prediksi = 1), 0)
+            FROM prediksi
+            WHERE {where}
+            GROUP BY {key}
+            ON CONFLICT (dimensi, kunci) DO UPDATE SET
+                total = total + excluded.total,
+                positif = positif + excluded.positif
+        ''', params)
+
+
+def read_summary(conn, days=30):
+    """Baca statistik dari tabel agregat (panas + arsip), tanpa menyentuh tabel prediksi"""
+    def rows(dimensi, order='kunci', limit=-1, key='kunci'):
+        return conn.execute(f'''
+            SELECT {key}, SUM(total) AS total, SUM(positif) AS positif FROM (
+                SELECT kunci, batas_bawah, batas_atas, total, positif FROM prediksi_agregat WHERE dimensi = ?
+                UNION ALL
+                SELECT kunci, batas_bawah, batas_atas, total, positif FROM {ARCHIVE_TABLE} WHERE dimensi = ?
+            )
+            GROUP BY kunci
+            HAVING SUM(total) > 0
+            ORDER BY {order}
+            LIMIT ?
+        ''', (dimensi, dimensi, limit)).fetchall()
+
+    overall = rows('semua')
+    total, positive = (overall[0][1], overall[0][2]) if overall else (0, 0)
+    return {
+        'total': total,
+        'positive': positive,
+        'models': [(kunci, count) for kunci, count, _ in rows('model')],
+        'days': rows('hari', order='kunci DESC', limit=days),
+        # (batas_bawah, batas_atas, total, positif); batas NULL = usia tidak diisi
+        'ages': rows('usia', order='MIN(batas_bawah)', key='MIN(batas_bawah), MIN(batas_atas)'),
+    }
+
+
+def summary_from_counters(counters, days=30):
+    """Format read_summary dari baris (dimensi, kunci, batas_bawah, batas_atas, total, positif) milik store lain"""
+    grouped = {}
+    ages = []
+    for dimensi, kunci, batas_bawah, batas_atas, total, positif in counters:
+        if total <= 0:
+            continue
+        if dimensi == 'usia':
+            ages.append((batas_bawah, batas_atas, total, positif))
+        else:
+            grouped.setdefault(dimensi, []).append((kunci, total, positif))
+    for rows in grouped.values():
+        rows.sort()
+    # Sama dengan ORDER BY di SQLite: usia tidak diisi (NULL) lebih dulu
+    ages.sort(key=lambda row: (row[0] is not None, row[0]))
+    overall = grouped.get('semua', [])
+    total, positive = (overall[0][1], overall[0][2]) if overall else (0, 0)
+    return {
+        'total': total,
+        'positive': positive,
+        'models': [(kunci, count) for kunci, count, _ in grouped.get('model', [])],
+        'days': grouped.get('hari', [])[::-1][:days],
+        'ages': ages,
+    }
+
+
+def main(argv=None):
+    import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args(argv)
+
+    db.init_db()
+    conn = db.connect()
+    changed = rebuild(conn)
+    summary = read_summary(conn)
+    conn.close()
+    print(f"✅ Agregat dihitung ulang: {summary['total']} prediksi, {changed} counter dikoreksi")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,104 +1,241 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from catboost import CatBoostClassifier
-import joblib
+from flask import Blueprint, Flask, Response, current_app, g, render_template, request, jsonify, send_from_directory
+import hmac
 import numpy as np
 import os
-import sqlite3
-from datetime import datetime
-import pandas as pd
+import time
+import signal
+import sys
+from datetime import datetime, timezone
 import warnings
+import db
+import metrics
+from db import init_db, prediksi_row
+from ensemble import DEFAULT_BATCH_TIMEOUT_MS, DEFAULT_TIMEOUT_MS, Ensemble
+from features import build_features, build_feature_matrix
+from inference import predict_one, predict_proba_batch
+from logging_setup import get_logger, request_logger, setup_logging
+from lookup_table import PredictionTable, lookup_table_path
+from merge import DEFAULT_MERGE_INTERVAL, MergeScheduler
+from model_registry import (
+    DEFAULT_MODELS, DEFAULT_WATCH_INTERVAL, MANIFEST_PATH, ModelRegistry, activate_version, load_manifest
+)
+from prediction_cache import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL, PredictionCache, cache_key
+from retention import RetentionScheduler
+from threshold import (
+    apply_threshold_adjustment, prediksi_fallback,
+    apply_threshold_adjustment_batch, prediksi_fallback_batch
+)
 
 # Suppress warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="sklearn")
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-app = Flask(__name__)
-
-# Load semua model
-models = {}
-try:
-    models['catboost'] = CatBoostClassifier()
-    models['catboost'].load_model('models/model_catboost.cbm')
-    print("✅ Model CatBoost dimuat")
-except Exception as e:
-    print(f"❌ Error model CatBoost: {e}")
-
-try:
-    models['knn'] = joblib.load('models/model_knn.joblib')
-    print("✅ Model KNN dimuat")
-except Exception as e:
-    print(f"❌ Error model KNN: {e}")
-
-try:
-    models['gb'] = joblib.load('models/model_gb.joblib')
-    print("✅ Model Gradient Boosting dimuat")
-except Exception as e:
-    print(f"❌ Error model GB: {e}")
-
-model = None
-model_name = "Tidak Ada"
-
-if 'gb' in models:
-    model = models['gb']
-    model_name = "Gradient Boosting"
-    print("✅ Menggunakan Gradient Boosting ")
-elif 'catboost' in models:
-    model = models['catboost']
-    model_name = "CatBoost"
-    print("✅ Menggunakan CatBoost")
-elif 'knn' in models:
-    model = models['knn']
-    model_name = "KNN"
-    print("⚠️  Menggunakan KNN ")
-
-print(f"🎯 Menggunakan model: {model_name}")
-
-# Initialize database
-def init_db():
-    try:
-        os.makedirs('database', exist_ok=True)
-        conn = sqlite3.connect('database/prediksi_diabetes.db')
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS prediksi (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usia INTEGER,
-                jenis_kelamin TEXT,
-                poliuria TEXT,
-                polidipsia TEXT,
-                penurunan_berat_badan TEXT,
-                kelemahan TEXT,
-                polifagia TEXT,
-                infeksi_jamur TEXT,
-                penglihatan_kabur TEXT,
-                gatal_gatal TEXT,
-                mudah_marah TEXT,
-                penyembuhan_lambat TEXT,
-                kelemahan_parsial TEXT,
-                kekakuan_otot TEXT,
-                kerontokan_rambut TEXT,
-                obesitas TEXT,
-                hasil_prediksi INTEGER,
-                probabilitas REAL,
-                model_digunakan TEXT,
-                waktu_prediksi DATETIME DEFAULT CURRENT_TIMESTAMP
+bp = Blueprint('diabetes', __name__)
+logger = get_logger('app')
+
+# Batas jumlah record per request batch
+DEFAULT_BATCH_MAX_RECORDS = 10000
+
+# model_digunakan untuk input mode tabel yang usianya di luar rentang tabel
+TABLE_FALLBACK_MODEL = "Fallback (usia di luar tabel)"
+
+# Endpoint yang direkam ke REQUEST_LOG (format yang dibaca benchmarks/loadtest.py)
+REPLAYABLE_ENDPOINTS = ('diabetes.prediksi', 'diabetes.predict_backup', 'diabetes.prediksi_batch')
+
+
+class PredictionService:
+    """State prediksi milik satu instance app: registry model, ensemble atau lookup table"""
+
+    def __init__(self, mode, registry, prediction_table=None, cache=None, ensemble=None):
+        self.mode = mode
+        self.registry = registry
+        self.prediction_table = prediction_table
+        self.ensemble = ensemble
+        self.cache = cache or PredictionCache(max_size=0)
+        # Hasil cache milik model lama tidak boleh dipakai lagi
+        registry.add_listener(lambda key, label: self.cache.clear())
+
+    @classmethod
+    def from_config(cls, config):
+        mode = config['PREDICTION_MODE']
+        registry = ModelRegistry(
+            config['MODELS'] if mode != 'table' else '',
+            manifest_path=config['MODEL_MANIFEST'],
+            watch_interval=config['MODEL_WATCH_INTERVAL'],
+        )
+        prediction_table = None
+        if mode == 'table':
+            # ✅ Mode tabel: sklearn/catboost tidak di-import sama sekali
+            try:
+                prediction_table = PredictionTable.load(config['LOOKUP_TABLE'])
+                logger.info("✅ Lookup table dimuat (%s, usia %s-%s)",
+                            prediction_table.model_name, prediction_table.age_min, prediction_table.age_max)
+            except Exception as e:
+                logger.error("❌ Error lookup table: %s", e)
+        ensemble = None
+        if mode == 'ensemble':
+            ensemble = Ensemble(
+                registry,
+                weights=config['ENSEMBLE_WEIGHTS'],
+                timeouts_ms=config['ENSEMBLE_TIMEOUT_MS'],
+                batch_timeouts_ms=config['ENSEMBLE_BATCH_TIMEOUT_MS'],
+                workers_per_model=config['ENSEMBLE_WORKERS'],
             )
-        ''')    
-        conn.commit()
-        conn.close()
-        print("✅ Database diinisialisasi dengan sukses")
-    except Exception as e:
-        print(f"❌ Error database: {e}")
+        cache = PredictionCache(
+            max_size=config['PREDICTION_CACHE_SIZE'], ttl=config['PREDICTION_CACHE_TTL']
+        )
+        return cls(mode, registry, prediction_table, cache, ensemble)
+
+    def start(self, wait=False):
+        # ✅ Load model terpilih di background, pod siap begitu model aktif siap
+        if self.mode != 'table':
+            self.registry.start(wait=wait)
+
+    def ready(self):
+        if self.mode == 'table':
+            # Tabel gagal dimuat: jangan terima traffic (tidak ada model untuk fallback)
+            return self.prediction_table is not None
+        return self.registry.is_ready()
+
+
+def services():
+    return current_app.extensions['prediksi']
+
+
+def create_app(config=None, wait_for_models=False):
+    """
+    App factory. wait_for_models=True dipakai server produksi (wsgi.py) supaya
+    model sudah di-load di master sebelum fork, lalu dibagi copy-on-write ke worker.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(
+        # Mode prediksi: "model" (default), "ensemble" (semua model di MODELS, lihat
+        # ensemble.py) atau "table" (lookup table hasil lookup_table.py)
+        PREDICTION_MODE=os.environ.get('PREDICTION_MODE', 'model'),
+        MODELS=os.environ.get('MODELS', DEFAULT_MODELS),
+        # Versi model (lihat model_registry.py); manifest dicek tiap N detik per worker
+        MODEL_MANIFEST=os.environ.get('MODEL_MANIFEST', MANIFEST_PATH),
+        MODEL_WATCH_INTERVAL=float(os.environ.get('MODEL_WATCH_INTERVAL', DEFAULT_WATCH_INTERVAL)),
+        # Token untuk endpoint /admin (header X-Admin-Token); kosong = endpoint admin ditolak
+        ADMIN_TOKEN=os.environ.get('ADMIN_TOKEN', ''),
+        LOOKUP_TABLE=os.environ.get('LOOKUP_TABLE', lookup_table_path(os.environ.get('TABLE_MODEL', 'gb'))),
+        BATCH_MAX_RECORDS=int(os.environ.get('BATCH_MAX_RECORDS', DEFAULT_BATCH_MAX_RECORDS)),
+        PREDICTION_CACHE_SIZE=int(os.environ.get('PREDICTION_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+        PREDICTION_CACHE_TTL=float(os.environ.get('PREDICTION_CACHE_TTL', DEFAULT_CACHE_TTL)),
+        ENSEMBLE_WEIGHTS=os.environ.get('ENSEMBLE_WEIGHTS', ''),
+        ENSEMBLE_TIMEOUT_MS=os.environ.get('ENSEMBLE_TIMEOUT_MS', str(DEFAULT_TIMEOUT_MS)),
+        ENSEMBLE_BATCH_TIMEOUT_MS=os.environ.get('ENSEMBLE_BATCH_TIMEOUT_MS', str(DEFAULT_BATCH_TIMEOUT_MS)),
+        ENSEMBLE_WORKERS=int(os.environ.get('ENSEMBLE_WORKERS', 0)) or None,
+        # Arsip + vacuum + backup database berkala (jam, 0 = mati; lihat retention.py)
+        RETENTION_INTERVAL_HOURS=float(os.environ.get('RETENTION_INTERVAL_HOURS', 0)),
+        # Dengan DATABASE_URL: pindahkan SQLite lokal ke store bersama tiap N detik (merge.py)
+        MERGE_INTERVAL=float(os.environ.get('MERGE_INTERVAL', DEFAULT_MERGE_INTERVAL)),
+        # Rekam request prediksi ke file JSONL untuk replay (kosong = mati)
+        REQUEST_LOG=os.environ.get('REQUEST_LOG', ''),
+        REQUEST_LOG_SAMPLE=float(os.environ.get('REQUEST_LOG_SAMPLE', 1.0)),
+    )
+    if config:
+        app.config.update(config)
 
-init_db()
+    # Logging async terstruktur (FLASK_DEBUG=1 → teks, level DEBUG, tanpa sampling)
+    setup_logging()
+
+    service = PredictionService.from_config(app.config)
+    service.start(wait=wait_for_models)
+    app.extensions['prediksi'] = service
+
+    # Initialize database
+    init_db()
+
+    app.register_blueprint(bp)
+    install_metrics(app)
+    # Pemantau manifest dimulai lazy per worker (thread tidak ikut ter-fork)
+    app.before_request(service.registry.ensure_watcher)
+    if db.store is db.local:
+        if app.config['RETENTION_INTERVAL_HOURS'] > 0:
+            app.before_request(RetentionScheduler(app.config['RETENTION_INTERVAL_HOURS']).ensure_started)
+    else:
+        if app.config['RETENTION_INTERVAL_HOURS'] > 0:
+            # retention.py hanya mengarsip SQLite lokal; tabel Postgres belum punya retensi
+            logger.warning("⚠️  RETENTION_INTERVAL_HOURS diabaikan: retensi belum tersedia untuk store %s", db.store.name)
+        if app.config['MERGE_INTERVAL'] > 0:
+            app.before_request(MergeScheduler(app.config['MERGE_INTERVAL']).ensure_started)
+    if app.config['REQUEST_LOG']:
+        install_request_log(app)
+    return app
+
+
+def record_stage(endpoint, stage, start):
+    """Catat durasi satu tahap ke histogram, return waktu sekarang untuk tahap berikutnya"""
+    now = time.perf_counter()
+    metrics.STAGE_LATENCY.observe(now - start, endpoint, stage)
+    return now
+
+
+def record_predictions(model_used, predictions):
+    """Counter per model/hasil + counter fallback per alasan"""
+    if model_used.startswith('Fallback (usia'):
+        metrics.FALLBACKS.inc('age_out_of_table', amount=len(predictions))
+    elif model_used.startswith('Fallback (ensemble'):
+        metrics.FALLBACKS.inc('ensemble_timeout', amount=len(predictions))
+    elif model_used.startswith('Fallback ('):
+        metrics.FALLBACKS.inc('model_error', amount=len(predictions))
+    elif model_used == 'Logika Fallback':
+        metrics.FALLBACKS.inc('no_model', amount=len(predictions))
+    positive = int(sum(int(p) for p in predictions))
+    if positive:
+        metrics.PREDICTIONS.inc(model_used, 'risk', amount=positive)
+    if len(predictions) - positive:
+        metrics.PREDICTIONS.inc(model_used, 'normal', amount=len(predictions) - positive)
+
+
+def install_metrics(app):
+    """Latency per endpoint + jumlah request in-flight"""
+    metrics.DB_QUEUE_DEPTH.set_function(db.writer.qsize)
+    # Mode multiproses: nilai worker ini disimpan berkala untuk dijumlahkan saat scrape
+    app.before_request(metrics.REGISTRY.ensure_sync)
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        metrics.IN_FLIGHT.inc()
+
+    @app.teardown_request
+    def stop_timer(exc=None):
+        start = g.pop('request_start', None)
+        if start is None:
+            return
+        metrics.IN_FLIGHT.dec()
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, request.endpoint or 'unknown')
+
+
+def install_request_log(app):
+    """Rekam body request prediksi (JSONL) supaya traffic produksi bisa di-replay"""
+    log = request_logger(app.config['REQUEST_LOG'], app.config['REQUEST_LOG_SAMPLE'])
+
+    @app.after_request
+    def record_request(response):
+        if request.method == 'POST' and request.endpoint in REPLAYABLE_ENDPOINTS:
+            # Dict di-serialize di thread listener, bukan di thread request
+            log.info({
+                'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                'path': request.path,
+                'status': response.status_code,
+                'body': request.get_json(silent=True),
+            })
+        return response
+
+
+def not_ready_response():
+    return jsonify({'success': False, 'error': 'Model belum siap, coba lagi sebentar'}), 503
 
 # ✅ ROUTE STATIC FILES
-@app.route('/static/<path:filename>')
+@bp.route('/static/<path:filename>')
 def serve_static(filename):
     return send_from_directory('static', filename)
 
 # ✅ ROUTE BACKEND SEDERHANA
-@app.route('/backend')
+@bp.route('/backend')
 def backend_info():
     return """
     ============================================
@@ -109,14 +246,40 @@ def backend_info():
     GET  /              → Frontend form (Diabetes prediction UI)
     GET  /backend       → This backend documentation
     POST /prediksi      → Predict diabetes (JSON API)
+    POST /prediksi/batch → Predict many patients in one call (JSON array)
+    GET  /health        → Liveness probe
+    GET  /ready         → Readiness probe (503 until active model loaded)
+    GET  /status/model  → Load time + resident memory per model
+    GET  /status/cache  → Prediction cache hit/miss/eviction counters
+    GET  /admin/model   → Model versions (manifest vs loaded)
+    POST /admin/model/reload → Load + warm up a model version in THIS pod (X-Admin-Token)
+                          rollout to every replica = new image + kubectl rollout
+    GET  /metrics       → Prometheus metrics (per-stage latency histograms)
     GET  /riwayat       → Prediction history
+    GET  /api/riwayat   → History JSON (cursor, dari, sampai, hasil, model)
+    GET  /riwayat/ekspor → Stream full history (format=csv|ndjson)
     GET  /statistik     → Statistics
     DELETE /hapus/<id>  → Delete prediction
     
+    🗄️ **RETENSI DATABASE:**
+    python retention.py run    → archive old rows (monthly .ndjson.gz), incremental vacuum, online backup
+    python retention.py query  → search archived history offline
+
+    🔗 **STORE BERSAMA (HPA):**
+    DATABASE_URL=postgresql://...  → all replicas read/write one PostgreSQL store
+    python merge.py run            → move per-pod SQLite rows into the shared store
+    
+    ⚡ **TABLE MODE:**
+    python lookup_table.py build --model gb  → precompute all inputs
+    PREDICTION_MODE=table                   → O(1) lookup, no sklearn
+
+    📄 **SCORING OFFLINE:**
+    python bulk_score.py data.csv hasil.csv --model gb  → score a Yes/No CSV extract without Flask
+
     🔧 **TECH STACK:**
     • Python Flask
     • Scikit-learn + CatBoost
-    • SQLite Database
+    • SQLite Database (PostgreSQL store for multiple replicas)
     • Docker Container
     • Kubernetes Deployment
     • Horizontal Pod Autoscaler (HPA)
@@ -139,346 +302,413 @@ def backend_info():
     """
 
 # ✅ ROUTE FRONTEND
-@app.route('/')
+@bp.route('/')
 def home():
     return render_template('prediction.html')
 
-def apply_threshold_adjustment(raw_prediction, raw_probability, features, model_name):
+@bp.route('/health')
+def health():
+    return jsonify({'status': 'ok'})
+
+@bp.route('/ready')
+def ready():
+    service = services()
+    status = {'ready': service.ready(), 'mode': service.mode}
+    return jsonify(status), (200 if status['ready'] else 503)
+
+@bp.route('/status/model')
+def status_model():
+    """Waktu load dan memori per model, untuk tuning minReplicas/limit memori"""
+    service = services()
+    status = service.registry.status()
+    if service.ensemble is not None:
+        status['ensemble'] = service.ensemble.status()
+    return jsonify(status)
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/status/cache')
+def status_cache():
+    return jsonify(services().cache.stats())
+
+def admin_denied():
+    token = current_app.config['ADMIN_TOKEN']
+    if not token:
+        # Tanpa token, endpoint admin (ganti versi model klinis) tidak boleh terbuka
+        return jsonify({'success': False, 'error': 'ADMIN_TOKEN belum diatur, endpoint admin nonaktif'}), 503
+    # compare_digest: waktu pembandingan tidak bergantung pada isi token
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode()):
+        return jsonify({'success': False, 'error': 'Token admin tidak valid'}), 403
+    return None
+
+@bp.route('/admin/model')
+def admin_model():
+    denied = admin_denied()
+    if denied:
+        return denied
+    registry = services().registry
+    try:
+        manifest = load_manifest(registry.manifest_path)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({
+        'success': True,
+        'loaded': registry.status()['versions'],
+        'active_model': registry.active()[1],
+        'manifest': manifest['models'],
+    })
+
+@bp.route('/admin/model/reload', methods=['POST'])
+def admin_model_reload():
     """
-    Adjust prediction threshold untuk hasil yang lebih konservatif
-    - Minimal 70% probability untuk prediksi diabetes
-    - Minimal 2 gejala utama atau 3+ gejala total
-    - Pertimbangan usia
+    Body: {"model": "gb", "version": "v2", "wait": false}
+    version diisi → versi aktif di manifest pod ini ikut diganti, sehingga
+    worker lain di pod yang sama menyusul lewat pemantau manifest. Tanpa
+    model → sinkronkan semua model dengan manifest.
+
+    Hanya untuk pod yang menerima request: models/ ada di image, bukan volume
+    bersama, jadi replika lain tetap di versi lamanya. Rollout ke semua
+    replika = publish versi di image lalu deploy ulang (lihat model_registry.py).
     """
-    # Hitung gejala utama (yang paling penting secara medis)
-    main_symptoms = features[2:4]  # Hanya Polyuria dan Polydipsia - gejala paling khas diabetes
-    secondary_symptoms = features[4:9]  # Gejala sekunder
-    other_symptoms = features[9:14]  # Gejala lainnya
-    
-    main_symptom_count = sum(main_symptoms)
-    secondary_symptom_count = sum(secondary_symptoms)
-    other_symptom_count = sum(other_symptoms)
-    total_symptoms = sum(features[2:14])  # Semua gejala kecuali age, gender, alopecia, obesity
-    
-    age = features[0]
-    
-    print(f"🔍 Threshold Check: main={main_symptom_count}, secondary={secondary_symptom_count}, other={other_symptom_count}, total={total_symptoms}, age={age}, raw_prob={raw_probability:.2f}")
-    
-    # ✅ KRITERIA KETAT UNTUK PREDIKSI DIABETES:
-    if raw_prediction == 1:
-        # 1. Probability harus > 65% (dinaikkan dari 50%)
-        if raw_probability < 0.65:
-            print(f"🔄 Adjust: Probability {raw_probability:.2f} < 65%, set to Normal")
-            return 0, raw_probability
-        
-        # 2. Harus punya minimal 2 gejala utama ATAU 1 gejala utama + 2 sekunder ATAU 4+ gejala total
-        if main_symptom_count < 2 and (main_symptom_count + secondary_symptom_count) < 3 and total_symptoms < 4:
-            print(f"🔄 Adjust: Gejala tidak cukup (main={main_symptom_count}, total={total_symptoms}), set to Normal")
-            return 0, raw_probability
-        
-        # 3. Jika usia muda (<30) butuh lebih banyak gejala
-        if age < 30 and total_symptoms < 4:
-            print(f"🔄 Adjust: Usia muda ({age}) dengan sedikit gejala ({total_symptoms}), set to Normal")
-            return 0, raw_probability
-            
-        # 4. Jika hanya 1-2 gejala total, terlalu sedikit
-        if total_symptoms <= 2:
-            print(f"🔄 Adjust: Hanya {total_symptoms} gejala total, set to Normal")
-            return 0, raw_probability
-            
-        # 5. Jika hanya gejala minor tanpa gejala utama, turunkan
-        if main_symptom_count == 0 and total_symptoms < 5:
-            print(f"🔄 Adjust: Tidak ada gejala utama dan hanya {total_symptoms} gejala, set to Normal")
-            return 0, raw_probability
-    
-    # ✅ JIKA NORMAL TAPI PROBABILITY TINGGI + GEJALA KUAT, CEK LAGI
-    elif raw_prediction == 0 and raw_probability > 0.60:
-        # Jika punya 2+ gejala utama, mungkin ada risiko
-        if main_symptom_count >= 2:
-            print(f"🔄 Adjust: {main_symptom_count} gejala utama dengan prob {raw_probability:.2f}, set to Risk")
-            return 1, raw_probability
-            
-        # Jika usia >45 dengan beberapa gejala
-        if age > 45 and total_symptoms >= 3:
-            print(f"🔄 Adjust: Usia {age} dengan {total_symptoms} gejala dan prob {raw_probability:.2f}, set to Risk")
-            return 1, raw_probability
-    
-    print(f"✅ Final: prediction={raw_prediction}, probability={raw_probability:.2f}")
-    return raw_prediction, raw_probability
-
-def prediksi_fallback(features):
-    """Improved fallback logic dengan threshold lebih tinggi"""
-    # Gejala utama diabetes
-    main_symptoms = features[2:4] 
-    secondary_symptoms = features[4:9] 
-    other_symptoms = features[9:14]
-    
-    main_symptom_count = sum(main_symptoms)
-    secondary_symptom_count = sum(secondary_symptoms)
-    other_symptom_count = sum(other_symptoms)
-    total_symptoms = sum(features[2:14])
-    age = features[0]
-    
-    print(f"🔍 Fallback Check: main={main_symptom_count}, secondary={secondary_symptom_count}, other={other_symptom_count}, total={total_symptoms}, age={age}")
-    
-    # ✅ KRITERIA KETAT UNTUK FALLBACK:
-    # 1. Dua gejala utama langsung = risiko tinggi
-    if main_symptom_count >= 2:
-        probability = min(0.85, 0.70 + (total_symptoms * 0.05))
-        return 1, probability
-        
-    # 2. Satu gejala utama + minimal 2 gejala lain
-    elif main_symptom_count >= 1 and total_symptoms >= 3:
-        probability = min(0.80, 0.65 + (total_symptoms * 0.04))
-        return 1, probability
-        
-    # 3. Usia >45 dengan beberapa gejala
-    elif age > 45 and total_symptoms >= 4:
-        return 1, 0.70
-        
-    # 4. Banyak gejala sekunder (5+)
-    elif total_symptoms >= 5:
-        return 1, 0.65
-        
-    # 5. Normal cases
-    else:
-        base_prob = 0.20 + (total_symptoms * 0.03)
-        return 0, min(0.45, base_prob)
+    denied = admin_denied()
+    if denied:
+        return denied
+    service = services()
+    registry = service.registry
+    if service.mode == 'table':
+        return jsonify({'success': False, 'error': 'Mode table tidak memakai registry model'}), 400
+    if not service.ready():
+        return not_ready_response()
+    body = request.get_json(silent=True) or {}
+    name, version = body.get('model'), body.get('version')
+    try:
+        if name is None:
+            return jsonify({'success': True, 'results': registry.sync()})
+        if name not in registry.names:
+            raise ValueError(f"Model {name} tidak dimuat di service ini")
+        if version:
+            activate_version(name, version, registry.manifest_path)
+        result = registry.reload(name, version, wait=bool(body.get('wait', False)))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("❌ Error reload model: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if result.get('state') == 'failed':
+        return jsonify({'success': False, **result}), 500
+    return jsonify({'success': True, **result}), (202 if result.get('state') == 'loading' else 200)
 
-@app.route('/prediksi', methods=['POST'])
+@bp.route('/prediksi', methods=['POST'])
 def prediksi():
-    conn = None
+    service = services()
+    if not service.ready():
+        return not_ready_response()
     try:
+        start = time.perf_counter()
         data = request.json
-        print(f"📥 Data received: {data}")
+        start = record_stage('prediksi', 'parse', start)
+        logger.debug("📥 Data received: %s", data)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'Body harus berupa object JSON'}), 400
 
         # Preprocess data untuk model - 16 features lengkap
-        features = [
-            int(data.get('age', 0)),                   
-            1 if data.get('gender') == 'Pria' else 0,   
-            1 if data.get('polyuria') == 'Ya' else 0,  
-            1 if data.get('polydipsia') == 'Ya' else 0, 
-            1 if data.get('weight_loss') == 'Ya' else 0,
-            1 if data.get('weakness') == 'Ya' else 0,   
-            1 if data.get('polyphagia') == 'Ya' else 0, 
-            1 if data.get('genital_thrush') == 'Ya' else 0, 
-            1 if data.get('visual_blurring') == 'Ya' else 0, 
-            1 if data.get('itching') == 'Ya' else 0,    
-            1 if data.get('irritability') == 'Ya' else 0, 
-            1 if data.get('delayed_healing') == 'Ya' else 0, 
-            1 if data.get('partial_paresis') == 'Ya' else 0, 
-            1 if data.get('muscle_stiffness') == 'Ya' else 0, 
-            1 if data.get('alopecia') == 'Ya' else 0,   
-            1 if data.get('obesity') == 'Ya' else 0    
-        ]
-
-        print(f"🔧 Features processed: {features}")
+        try:
+            features = build_features(data)
+        except ValueError as e:
+            # Input tidak valid tidak boleh sampai ke antrian database
+            return jsonify({'success': False, 'error': str(e)}), 400
+        start = record_stage('prediksi', 'features', start)
+
+        logger.debug("🔧 Features processed: %s", features)
         
-        current_model_name = model_name
+        _, current_model_name, model = service.registry.active()
+        prediction_table = service.prediction_table
+        if prediction_table is not None:
+            current_model_name = prediction_table.model_name
         raw_prediction = 0
         raw_probability = 0.0
+        model_scores = None
         
-        if model and current_model_name != "Tidak Ada":
-            try:
-                if current_model_name == "CatBoost":
-                    feature_names = [
-                        'Age', 'Gender_Male', 'Polyuria_Yes', 'Polydipsia_Yes', 
-                        'sudden weight loss_Yes', 'weakness_Yes', 'Polyphagia_Yes', 
-                        'Genital thrush_Yes', 'visual blurring_Yes', 'Itching_Yes', 
-                        'Irritability_Yes', 'delayed healing_Yes', 'partial paresis_Yes', 
-                        'muscle stiffness_Yes', 'Alopecia_Yes', 'Obesity_Yes'
-                    ]
-                    
-                    features_dict = {name: [value] for name, value in zip(feature_names, features)}
-                    features_df = pd.DataFrame(features_dict)
-                    
-                    raw_prediction = model.predict(features_df)[0]
-                    raw_probability = model.predict_proba(features_df)[0][1]
-                    
-                else:
-                    raw_prediction = model.predict([features])[0]
-                    raw_probability = model.predict_proba([features])[0][1]
-                
-                print(f"🤖 {current_model_name} raw prediction: {raw_prediction}, prob: {raw_probability:.2f}")
-                
-                # ✅ THRESHOLD ADJUSTMENT - Lebih konservatif
+        if prediction_table is not None:
+            # ✅ Mode tabel: hasil sudah termasuk threshold adjustment
+            result = prediction_table.lookup(features)
+            start = record_stage('prediksi', 'inference', start)
+            if result is not None:
+                prediction, probability = result
+            else:
+                prediction, probability = prediksi_fallback(features)
+                current_model_name = TABLE_FALLBACK_MODEL
+        elif service.ensemble is not None:
+            # ✅ Mode ensemble: semua model paralel, yang lewat budget tidak ikut voting
+            scored = service.ensemble.score_one(features)
+            start = record_stage('prediksi', 'inference', start)
+            if scored is not None:
+                raw_prediction, raw_probability, current_model_name, model_scores = scored
+                logger.debug("🤖 %s raw prediction: %s, prob: %.2f", current_model_name, raw_prediction, raw_probability)
                 prediction, probability = apply_threshold_adjustment(
                     raw_prediction, raw_probability, features, current_model_name
                 )
+                start = record_stage('prediksi', 'threshold', start)
+            else:
+                prediction, probability = prediksi_fallback(features)
+                current_model_name = "Fallback (ensemble timeout)"
+        elif model and current_model_name != "Tidak Ada":
+            key = cache_key(features, current_model_name)
+            cached = service.cache.get(key)
+            start = record_stage('prediksi', 'cache', start)
+            if cached is not None:
+                # ✅ Profil yang sama sudah pernah diprediksi, tanpa inference
+                metrics.CACHE_LOOKUPS.inc('hit')
+                prediction, probability, current_model_name = cached
+            else:
+                try:
+                    # Satu panggilan predict_proba → label + probabilitas sekaligus
+                    if service.cache.enabled:
+                        metrics.CACHE_LOOKUPS.inc('miss')
+                    raw_prediction, raw_probability = predict_one(model, current_model_name, features)
+                    start = record_stage('prediksi', 'inference', start)
+                
+                    logger.debug("🤖 %s raw prediction: %s, prob: %.2f", current_model_name, raw_prediction, raw_probability)
+                
+                    # ✅ THRESHOLD ADJUSTMENT - Lebih konservatif
+                    prediction, probability = apply_threshold_adjustment(
+                        raw_prediction, raw_probability, features, current_model_name
+                    )
+                    start = record_stage('prediksi', 'threshold', start)
                 
-                print(f"🎯 Final prediction: {prediction}, prob: {probability:.2f}")
+                    logger.debug("🎯 Final prediction: %s, prob: %.2f", prediction, probability)
+                    service.cache.put(key, (prediction, probability, current_model_name))
                     
-            except Exception as model_error:
-                print(f"❌ Model prediction failed: {model_error}")
-                prediction, probability = prediksi_fallback(features)
-                current_model_name = f"Fallback ({current_model_name} failed)"
+                except Exception as model_error:
+                    logger.warning("❌ Model prediction failed: %s", model_error)
+                    prediction, probability = prediksi_fallback(features)
+                    current_model_name = f"Fallback ({current_model_name} failed)"
         else:
             prediction, probability = prediksi_fallback(features)
             current_model_name = "Logika Fallback"
 
-        # Save to database dengan error handling - TANPA NAMA
-        try:
-            conn = sqlite3.connect('database/prediksi_diabetes.db')
-            c = conn.cursor()
-            c.execute('''
-                INSERT INTO prediksi (
-                    usia, jenis_kelamin, poliuria, polidipsia, 
-                    penurunan_berat_badan, kelemahan, polifagia, infeksi_jamur, 
-                    penglihatan_kabur, gatal_gatal, mudah_marah, penyembuhan_lambat, 
-                    kelemahan_parsial, kekakuan_otot, kerontokan_rambut, obesitas,
-                    hasil_prediksi, probabilitas, model_digunakan
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('age'), data.get('gender'),
-                data.get('polyuria'), data.get('polydipsia'), data.get('weight_loss'),
-                data.get('weakness'), data.get('polyphagia'), data.get('genital_thrush'),
-                data.get('visual_blurring'), data.get('itching'), data.get('irritability'),
-                data.get('delayed_healing'), data.get('partial_paresis'), data.get('muscle_stiffness'),
-                data.get('alopecia'), data.get('obesity'),
-                int(prediction), float(probability), current_model_name
-            ))
-            conn.commit()
-            print("💾 Data berhasil disimpan ke database")
-            
-        except sqlite3.Error as db_error:
-            print(f"❌ Database error: {db_error}")
-        finally:
-            if conn:
-                conn.close()
-
-        return jsonify({
+        # Save to database - diantrikan ke background writer (group commit)
+        db.writer.submit(prediksi_row(data, prediction, probability, current_model_name))
+        record_stage('prediksi', 'db_enqueue', start)
+        record_predictions(current_model_name, [prediction])
+
+        response = {
             'success': True,
             'prediction': int(prediction),
             'probability': float(probability),
             'model_used': current_model_name,
             'diagnosis': 'Berisiko Diabetes' if prediction == 1 else 'Normal'
-        })
+        }
+        if model_scores is not None:
+            # Probabilitas, bobot dan waktu per model anggota ensemble
+            response['models'] = model_scores
+        return jsonify(response)
         
     except Exception as e:
-        print(f"❌ Error prediksi: {e}")
-        if conn:
-            conn.close()
+        logger.exception("❌ Error prediksi: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/predict', methods=['POST'])
+@bp.route('/predict', methods=['POST'])
 def predict_backup():
-    print("⚠️  Menggunakan backup route /predict")
+    logger.info("⚠️  Menggunakan backup route /predict")
     return prediksi()
 
-@app.route('/riwayat')
-def riwayat():
+@bp.route('/prediksi/batch', methods=['POST'])
+def prediksi_batch():
+    service = services()
+    if not service.ready():
+        return not_ready_response()
     try:
-        conn = sqlite3.connect('database/prediksi_diabetes.db')
-        c = conn.cursor()
-        c.execute('''
-            SELECT id, usia, jenis_kelamin, hasil_prediksi, probabilitas, model_digunakan, waktu_prediksi
-            FROM prediksi 
-            ORDER BY waktu_prediksi DESC 
-            LIMIT 50
-        ''')
-        records = c.fetchall()
-        conn.close()
-        
-        riwayat_html = '''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Riwayat Prediksi Diabetes</title>
-            <link rel="stylesheet" href="/static/style.css">
-        </head>
-        <body>
-            <div class="container">
-                <h1>📊 Riwayat Prediksi Diabetes</h1>
-                <a href="/" class="home-btn">← Kembali ke Prediksi</a>
-                <br><br>
-        '''
-        
-        if records:
-            riwayat_html += '''
-            <table>
-                <tr>
-                    <th>ID</th><th>Usia</th><th>Jenis Kelamin</th><th>Hasil</th>
-                    <th>Probabilitas</th><th>Model</th><th>Waktu Prediksi</th><th>Aksi</th>
-                </tr>
-            '''
-            for record in records:
-                id, usia, gender, prediction, prob, model_used, timestamp = record
-                result_text = "Berisiko Diabetes" if prediction == 1 else "Normal"
-                row_class = "risk" if prediction == 1 else "normal"
-                
-                riwayat_html += f'''
-                <tr class="{row_class}">
-                    <td>{id}</td>
-                    <td>{usia}</td>
-                    <td>{gender}</td>
-                    <td><strong>{result_text}</strong></td>
-                    <td>{prob*100:.1f}%</td>
-                    <td>{model_used}</td>
-                    <td>{timestamp}</td>
-                    <td><button class="delete-btn" onclick="hapusPrediksi({id})">Hapus</button></td>
-                </tr>
-                '''
-            riwayat_html += '</table>'
-            
-            riwayat_html += '''
-            <script>
-                async function hapusPrediksi(id) {
-                    if (confirm('Yakin ingin menghapus data ini?')) {
-                        try {
-                            const response = await fetch(`/hapus/${id}`, {
-                                method: 'DELETE'
-                            });
-                            const result = await response.json();
-                            if (result.success) {
-                                alert('Data berhasil dihapus');
-                                location.reload();
-                            } else {
-                                alert('Error: ' + result.error);
-                            }
-                        } catch (error) {
-                            alert('Error: ' + error.message);
-                        }
-                    }
-                }
-            </script>
-            '''
+        start = time.perf_counter()
+        data = request.json
+        records = data.get('records') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return jsonify({'success': False, 'error': 'Body harus berupa array record pasien'}), 400
+        max_records = current_app.config['BATCH_MAX_RECORDS']
+        if len(records) > max_records:
+            return jsonify({
+                'success': False,
+                'error': f'Maksimal {max_records} record per batch'
+            }), 413
+
+        invalid = next((i for i, record in enumerate(records) if not isinstance(record, dict)), None)
+        if invalid is not None:
+            return jsonify({
+                'success': False,
+                'error': f'Record ke-{invalid} harus berupa object JSON'
+            }), 400
+
+        logger.debug("📥 Batch received: %d records", len(records))
+        start = record_stage('prediksi_batch', 'parse', start)
+
+        # Satu matrix (n, 16) untuk seluruh batch
+        try:
+            X = build_feature_matrix(records)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        start = record_stage('prediksi_batch', 'features', start)
+
+        _, current_model_name, model = service.registry.active()
+        prediction_table = service.prediction_table
+        model_scores = None
+        # Nama model per record; None = seluruh batch memakai current_model_name
+        model_names = None
+        if prediction_table is not None:
+            current_model_name = prediction_table.model_name
+            predictions, probabilities, in_table = prediction_table.lookup_batch(X)
+            start = record_stage('prediksi_batch', 'inference', start)
+            if not in_table.all():
+                # Usia di luar rentang tabel memakai logika fallback, dicatat seperti /prediksi
+                fallback_predictions, fallback_probabilities = prediksi_fallback_batch(X[~in_table])
+                predictions[~in_table] = fallback_predictions
+                probabilities[~in_table] = fallback_probabilities
+                model_names = np.where(in_table, current_model_name, TABLE_FALLBACK_MODEL).tolist()
+        elif service.ensemble is not None:
+            scored = service.ensemble.score_batch(X)
+            start = record_stage('prediksi_batch', 'inference', start)
+            if scored is not None:
+                raw_predictions, raw_probabilities, current_model_name, model_scores = scored
+                predictions, probabilities = apply_threshold_adjustment_batch(
+                    raw_predictions, raw_probabilities, X
+                )
+                start = record_stage('prediksi_batch', 'threshold', start)
+            else:
+                predictions, probabilities = prediksi_fallback_batch(X)
+                current_model_name = "Fallback (ensemble timeout)"
+        elif model and current_model_name != "Tidak Ada":
+            try:
+                raw_predictions, raw_probabilities = predict_proba_batch(model, current_model_name, X)
+                start = record_stage('prediksi_batch', 'inference', start)
+                predictions, probabilities = apply_threshold_adjustment_batch(
+                    raw_predictions, raw_probabilities, X
+                )
+                start = record_stage('prediksi_batch', 'threshold', start)
+            except Exception as model_error:
+                logger.warning("❌ Batch model prediction failed: %s", model_error)
+                predictions, probabilities = prediksi_fallback_batch(X)
+                current_model_name = f"Fallback ({current_model_name} failed)"
         else:
-            riwayat_html += '<p>Belum ada data prediksi.</p>'
-        
-        riwayat_html += '</div></body></html>'
-        return riwayat_html
+            predictions, probabilities = prediksi_fallback_batch(X)
+            current_model_name = "Logika Fallback"
+
+        logger.debug("🎯 Batch selesai: %d/%d berisiko diabetes", predictions.sum(), len(records))
+        if model_names is None:
+            model_names = [current_model_name] * len(records)
+
+        # Seluruh batch ditulis writer dalam satu transaksi
+        db.writer.submit_many([
+            prediksi_row(record, prediction, probability, model_name)
+            for record, prediction, probability, model_name in zip(records, predictions, probabilities, model_names)
+        ])
+        record_stage('prediksi_batch', 'db_enqueue', start)
+        names = np.array(model_names)
+        for model_name in dict.fromkeys(model_names):
+            record_predictions(model_name, predictions[names == model_name])
+
+        response = {
+            'success': True,
+            'count': len(records),
+            'model_used': current_model_name,
+            'results': [
+                {
+                    'prediction': int(prediction),
+                    'probability': float(probability),
+                    'diagnosis': 'Berisiko Diabetes' if prediction == 1 else 'Normal',
+                    'model_used': model_name,
+                }
+                for prediction, probability, model_name in zip(predictions, probabilities, model_names)
+            ]
+        }
+        if model_scores is not None:
+            response['models'] = model_scores
+        return jsonify(response)
+
+    except Exception as e:
+        logger.exception("❌ Error prediksi batch: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/riwayat')
+def riwayat():
+    try:
+        records = db.fetch_riwayat(limit=50)
+        return render_template('riwayat.html', records=records)
         
     except Exception as e:
         return f"Error: {e}"
 
-@app.route('/hapus/<int:prediction_id>', methods=['DELETE'])
+# Batas jumlah baris per halaman API riwayat
+HISTORY_MAX_LIMIT = 500
+
+def history_filters(args):
+    """Ambil filter riwayat dari query string: dari, sampai, hasil, model"""
+    hasil = args.get('hasil')
+    if hasil not in (None, '', '0', '1'):
+        raise ValueError("Parameter 'hasil' harus 0 atau 1")
+    return {
+        'dari': args.get('dari') or None,
+        'sampai': args.get('sampai') or None,
+        'hasil': int(hasil) if hasil else None,
+        'model': args.get('model') or None,
+    }
+
+def history_limit(args):
+    """Parameter limit halaman riwayat, dibatasi 1..HISTORY_MAX_LIMIT"""
+    try:
+        limit = int(args.get('limit', 50))
+    except ValueError:
+        raise ValueError("Parameter 'limit' harus bilangan bulat") from None
+    return min(max(limit, 1), HISTORY_MAX_LIMIT)
+
+@bp.route('/api/riwayat')
+def api_riwayat():
+    try:
+        filters = history_filters(request.args)
+        limit = history_limit(request.args)
+        records, next_cursor = db.fetch_history(
+            limit=limit, cursor=request.args.get('cursor'), **filters
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, 'data': records, 'next_cursor': next_cursor})
+
+@bp.route('/riwayat/ekspor')
+def ekspor_riwayat():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': "Format harus 'csv' atau 'ndjson'"}), 400
+    try:
+        filters = history_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if export_format == 'csv':
+        body, mimetype = db.export_csv(**filters), 'text/csv'
+    else:
+        body, mimetype = db.export_ndjson(**filters), 'application/x-ndjson'
+    # Generator → response di-stream per chunk, tabel tidak pernah dimuat penuh ke memori
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=riwayat_prediksi.{export_format}'
+    })
+
+@bp.route('/hapus/<int:prediction_id>', methods=['DELETE'])
 def hapus_prediksi(prediction_id):
     try:
-        conn = sqlite3.connect('database/prediksi_diabetes.db')
-        c = conn.cursor()
-        c.execute('DELETE FROM prediksi WHERE id = ?', (prediction_id,))
-        conn.commit()
-        conn.close()
+        db.delete_prediksi(prediction_id)
         return jsonify({'success': True, 'message': 'Data berhasil dihapus'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/statistik')
+@bp.route('/statistik')
 def statistik():
     try:
-        conn = sqlite3.connect('database/prediksi_diabetes.db')
-        c = conn.cursor()
-        
-        c.execute('SELECT COUNT(*) FROM prediksi')
-        total = c.fetchone()[0]
-        
-        c.execute('SELECT COUNT(*) FROM prediksi WHERE hasil_prediksi = 1')
-        positive = c.fetchone()[0]
-        
-        c.execute('SELECT model_digunakan, COUNT(*) FROM prediksi GROUP BY model_digunakan')
-        model_stats = c.fetchall()
-        
-        conn.close()
+        summary = db.fetch_statistik()
+        total = summary['total']
+        positive = summary['positive']
+        ratio = positive / total * 100 if total > 0 else 0
         
         stats_html = f'''
         <!DOCTYPE html>
@@ -497,16 +727,25 @@ def statistik():
                     <h3>Total Prediksi: {total}</h3>
                     <p>Berisiko Diabetes: {positive}</p>
                     <p>Normal: {total - positive}</p>
-                    <p>Rasio: {positive/total*100:.1f if total > 0 else 0}% berisiko diabetes</p>
+                    <p>Rasio: {ratio:.1f}% berisiko diabetes</p>
                 </div>
                 
                 <div class="stat-card">
                     <h3>Penggunaan Model:</h3>
         '''
         
-        for model_name, count in model_stats:
+        for model_name, count in summary['models']:
             stats_html += f'<p>{model_name}: {count} prediksi</p>'
         
+        stats_html += '</div><div class="stat-card"><h3>Per Hari (30 hari terakhir):</h3>'
+        for day, count, day_positive in summary['days']:
+            stats_html += f'<p>{day}: {count} prediksi, {day_positive} berisiko</p>'
+        
+        stats_html += '</div><div class="stat-card"><h3>Per Kelompok Usia:</h3>'
+        for lower, upper, count, bucket_positive in summary['ages']:
+            label = '-' if lower is None else f'{lower}-{upper}'
+            stats_html += f'<p>{label} tahun: {count} prediksi, {bucket_positive} berisiko</p>'
+        
         stats_html += '</div></div></body></html>'
         return stats_html
         
@@ -514,11 +753,16 @@ def statistik():
         return f"Error: {e}"
 
 if __name__ == '__main__':
+    # Server development Flask; produksi memakai gunicorn (lihat gunicorn.conf.py)
+    debug = os.environ.get('FLASK_DEBUG', '0') == '1'
+    app = create_app()
     print("🚀 Aplikasi Prediksi Diabetes Dimulai!")
     print("📡 Backend: http://localhost:5000/backend")
     print("🖥️  Frontend: http://localhost:5000/")
-    print(f"🎯 Model aktif: {model_name}")
+    print(f"🎯 Model dipilih: {app.config['MODELS']} (mode {app.config['PREDICTION_MODE']})")
     print("📊 Riwayat: http://localhost:5000/riwayat")
     print("📈 Statistik: http://localhost:5000/statistik")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # SIGTERM (docker stop / k8s) → exit normal supaya antrian DB di-flush
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    app.run(debug=debug, host='0.0.0.0', port=5000)
\ No newline at end of file
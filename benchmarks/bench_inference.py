@@ -0,0 +1,98 @@
+"""
+Microbenchmark latency inference per request: jalur lama vs jalur cepat.
+
+Jalur lama  : DataFrame (CatBoost) / list (sklearn) + predict + predict_proba
+Jalur cepat : inference.predict_one (satu predict_proba, tanpa DataFrame)
+Packed      : inference.predict_one dengan engine gb_engine.py / knn_engine.py
+
+Pemakaian (dari root repo):
+    python benchmarks/bench_inference.py --models gb,knn,catboost --iterations 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from features import FEATURE_NAMES  # noqa: E402
+from inference import MODEL_FILES, MODEL_LABELS, PACKED_ENGINES, load_model, predict_one  # noqa: E402
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def legacy_predict(model, model_name, features):
+    """Jalur /prediksi sebelum optimasi (dua kali inference)"""
+    if model_name == "CatBoost":
+        import pandas as pd
+        features_df = pd.DataFrame({name: [value] for name, value in zip(FEATURE_NAMES, features)})
+        return model.predict(features_df)[0], model.predict_proba(features_df)[0][1]
+    return model.predict([features])[0], model.predict_proba([features])[0][1]
+
+
+def sample_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.empty((n, len(FEATURE_NAMES)), dtype=np.int64)
+    rows[:, 0] = rng.integers(1, 121, size=n)
+    rows[:, 1:] = rng.integers(0, 2, size=(n, len(FEATURE_NAMES) - 1))
+    return [list(map(int, row)) for row in rows]
+
+
+def measure(fn, model, model_name, rows, iterations):
+    for features in rows[:20]:
+        fn(model, model_name, features)
+    timings = []
+    for i in range(iterations):
+        features = rows[i % len(rows)]
+        start = time.perf_counter()
+        fn(model, model_name, features)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        'mean': statistics.fmean(timings),
+        'p50': timings[len(timings) // 2],
+        'p99': timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', default='gb,knn,catboost')
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rows = sample_rows(500)
+    print(f"{'model':<20} {'jalur':<8} {'mean µs':>10} {'p50 µs':>10} {'p99 µs':>10}")
+    for key in args.models.split(','):
+        # Artifact asli (sklearn/catboost), bukan engine terpaket
+        model = load_model(key, MODEL_FILES[key])
+        model_name = MODEL_LABELS[key]
+
+        for features in rows:
+            old = legacy_predict(model, model_name, features)
+            new = predict_one(model, model_name, features)
+            assert (int(old[0]), float(old[1])) == new, f"Hasil berbeda untuk {features}"
+
+        results = {
+            'lama': measure(legacy_predict, model, model_name, rows, args.iterations),
+            'cepat': measure(predict_one, model, model_name, rows, args.iterations),
+        }
+        if key in PACKED_ENGINES:
+            packed = load_model(key)
+            if type(packed) is not type(model):
+                for features in rows:
+                    assert predict_one(packed, model_name, features) == predict_one(model, model_name, features)
+                results['packed'] = measure(predict_one, packed, model_name, rows, args.iterations)
+        for path, r in results.items():
+            print(f"{model_name:<20} {path:<8} {r['mean']:>10.1f} {r['p50']:>10.1f} {r['p99']:>10.1f}")
+        for path in list(results)[1:]:
+            print(f"{'':<20} speedup p50 {path}: {results['lama']['p50'] / results[path]['p50']:.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Benchmark KNN: sklearn KNeighborsClassifier vs knn_engine.PackedKNeighbors.
+
+Diukur pada ukuran data training sekarang (200 titik) dan pada ekspansi
+sintetis (default 100x): tiap titik disalin dengan usia (ter-scale) diberi
+noise kecil dan tiap flag biner dibalik dengan peluang kecil. Sebelum diukur,
+tetangga dan probabilitas kedua jalur dicek identik.
+
+Pemakaian (dari root repo):
+    python benchmarks/bench_knn.py --expansion 100 --iterations 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from features import N_FEATURES  # noqa: E402
+from inference import MODEL_FILES, load_model  # noqa: E402
+from knn_engine import PackedKNeighbors  # noqa: E402
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def expand(model, factor, seed=0, age_noise=0.05, flip_rate=0.05):
+    """KNN baru dengan parameter sama, dilatih ulang pada data training x factor"""
+    from sklearn.base import clone
+
+    rng = np.random.default_rng(seed)
+    X = np.repeat(model._fit_X, factor, axis=0)
+    y = np.repeat(model.classes_[model._y], factor)
+    X[:, 0] += rng.normal(0, age_noise, size=len(X))
+    flips = rng.random((len(X), N_FEATURES - 1)) < flip_rate
+    X[:, 1:] = np.where(flips, 1 - X[:, 1:], X[:, 1:])
+    return clone(model).fit(X, y)
+
+
+def query_rows(n, seed=1):
+    rng = np.random.default_rng(seed)
+    X = np.empty((n, N_FEATURES), dtype=np.int64)
+    X[:, 0] = rng.integers(1, 121, size=n)
+    X[:, 1:] = rng.integers(0, 2, size=(n, N_FEATURES - 1))
+    return X
+
+
+def check_equal(model, engine, X):
+    expected = np.sort(model.kneighbors(X, return_distance=False), axis=1)
+    actual = np.sort(engine.kneighbors(X, return_distance=False), axis=1)
+    assert np.array_equal(expected, actual), "Tetangga berbeda"
+    assert np.array_equal(model.predict_proba(X), engine.predict_proba(X)), "Probabilitas berbeda"
+    for row in X[:200]:
+        assert np.array_equal(model.predict_proba(row[None]), engine.predict_proba(row[None]))
+
+
+def measure_single(model, X, iterations):
+    for row in X[:20]:
+        model.predict_proba(row[None])
+    timings = []
+    for i in range(iterations):
+        row = X[i % len(X)][None]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return statistics.fmean(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.99) - 1]
+
+
+def measure_batch(model, X):
+    start = time.perf_counter()
+    model.predict_proba(X)
+    return len(X) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expansion', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=10000, help='Jumlah baris untuk throughput batch')
+    args = parser.parse_args(argv)
+
+    base = load_model('knn', MODEL_FILES['knn'])
+    X = query_rows(max(args.batch, args.iterations))
+
+    print(f"{'training':>9} {'jalur':<8} {'mean µs':>10} {'p50 µs':>10} {'p99 µs':>10} {'batch baris/s':>14}")
+    for factor in (1, args.expansion):
+        model = base if factor == 1 else expand(base, factor)
+        engine = PackedKNeighbors.from_model(model)
+        check_equal(model, engine, X[:5000])
+        for name, candidate in (('sklearn', model), ('engine', engine)):
+            mean, p50, p99 = measure_single(candidate, X, args.iterations)
+            throughput = measure_batch(candidate, X[:args.batch])
+            print(f"{engine.n_train:>9} {name:<8} {mean:>10.1f} {p50:>10.1f} {p99:>10.1f} {throughput:>14.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
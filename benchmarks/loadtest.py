@@ -0,0 +1,433 @@
+"""
+Load test service prediksi: in-process (Flask test client) atau lewat HTTP.
+
+Payload dibuat dari models/diabetes_data_upload.csv (dataset asli, dipetakan
+ke format JSON form: Pria/Wanita, Ya/Tidak), atau di-replay dari request log
+JSONL yang direkam service dengan REQUEST_LOG=<path>.
+
+Yang dilaporkan per model / persistence / concurrency:
+    p50, p95, p99 latency (ms), throughput (req/s), rata-rata per tahap (ms)
+    dari histogram prediksi_stage_duration_seconds.
+
+Hasil disimpan ke benchmarks/results/<git-sha>-<waktu>.json supaya bisa
+dibandingkan antar commit dengan subcommand compare.
+
+Pemakaian (dari root repo):
+    # in-process, semua model, dengan dan tanpa SQLite
+    python benchmarks/loadtest.py run --models gb,knn,catboost --requests 2000 --concurrency 1,8
+
+    # server yang sedang jalan (gunicorn / k8s port-forward)
+    python benchmarks/loadtest.py run --url http://localhost:5000 --concurrency 1,16,64
+
+    # replay traffic produksi yang direkam dengan REQUEST_LOG=logs/requests.jsonl
+    python benchmarks/loadtest.py run --replay logs/requests.jsonl --models gb
+
+    # bandingkan dua hasil; exit code 1 jika ada regresi > --threshold persen
+    python benchmarks/loadtest.py compare benchmarks/results/a.json benchmarks/results/b.json
+
+Catatan: dengan beberapa worker gunicorn, /metrics menjumlahkan semua worker
+tetapi worker lain bisa tertinggal METRICS_SYNC_INTERVAL detik (metrics.py),
+jadi timing per tahap mode HTTP adalah perkiraan.
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from features import SYMPTOM_FIELDS  # noqa: E402
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+DATASET = os.path.join(REPO_ROOT, 'models', 'diabetes_data_upload.csv')
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+WARMUP_REQUESTS = 50
+
+# Metrik yang dibandingkan oleh compare (semakin kecil semakin baik, kecuali throughput)
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+
+
+# ✅ Payload
+
+def dataset_payloads(path=DATASET):
+    """Satu payload JSON /prediksi per baris dataset"""
+    payloads = []
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            payload = {'age': int(row[0]), 'gender': 'Pria' if row[1] == 'Male' else 'Wanita'}
+            for field, value in zip(SYMPTOM_FIELDS, row[2:16]):
+                payload[field] = 'Ya' if value == 'Yes' else 'Tidak'
+            payloads.append(payload)
+    return payloads
+
+
+def replay_payloads(path):
+    """(path endpoint, body) dari request log JSONL yang direkam service"""
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if entry.get('body') is not None:
+                    requests.append((entry['path'], entry['body']))
+    return requests
+
+
+def build_requests(args):
+    if args.replay:
+        requests = replay_payloads(args.replay)
+        if not requests:
+            raise SystemExit(f"Request log kosong: {args.replay}")
+        # Urutan asli dipertahankan, diulang sampai jumlah yang diminta
+        return [requests[i % len(requests)] for i in range(args.requests)]
+    payloads = dataset_payloads()
+    rng = random.Random(args.seed)
+    return [('/prediksi', rng.choice(payloads)) for _ in range(args.requests)]
+
+
+# ✅ Statistik
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile dari list yang sudah diurutkan"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, wall_seconds, errors):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'throughput_rps': round(len(latencies) / wall_seconds, 1) if wall_seconds else 0.0,
+    }
+
+
+def stage_delta(before, after):
+    """Rata-rata ms per (endpoint, tahap) dari dua snapshot {(endpoint, stage): (count, sum)}"""
+    stages = {}
+    for key, (count, total) in after.items():
+        count0, total0 = before.get(key, (0, 0.0))
+        if count > count0:
+            stages['/'.join(key)] = round((total - total0) / (count - count0) * 1000, 4)
+    return stages
+
+
+def replay(send, requests, concurrency):
+    """Kirim semua request dengan N thread, return (latencies, wall detik, jumlah error)"""
+    latencies = [None] * len(requests)
+    errors = []
+
+    def worker(i):
+        path, body = requests[i]
+        start = time.perf_counter()
+        ok = send(path, body)
+        latencies[i] = time.perf_counter() - start
+        if not ok:
+            errors.append(i)
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        for i in range(len(requests)):
+            worker(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(len(requests))))
+    return latencies, time.perf_counter() - start, len(errors)
+
+
+# ✅ Target in-process
+
+class NullWriter:
+    """Pengganti db.writer untuk run tanpa persistence"""
+
+    def submit(self, row):
+        pass
+
+    def submit_many(self, rows):
+        pass
+
+    def qsize(self):
+        return 0
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+
+def run_inprocess(args, requests):
+    # DB_PATH dibaca saat db di-import, jadi env di-set sebelum import app
+    tmpdir = tempfile.mkdtemp(prefix='loadtest-')
+    os.environ['DB_PATH'] = os.path.join(tmpdir, 'prediksi.db')
+    import app as app_module
+    import db
+    import metrics
+
+    real_writer = db.writer
+    results = []
+    for model_key in args.models.split(','):
+        for persist in args.persist:
+            db.writer = real_writer if persist else NullWriter()
+            app = app_module.create_app({
+                'MODELS': model_key,
+                'PREDICTION_CACHE_SIZE': args.cache_size,
+                'REQUEST_LOG': '',
+            }, wait_for_models=True)
+            local = threading.local()
+
+            def send(path, body):
+                client = getattr(local, 'client', None)
+                if client is None:
+                    client = local.client = app.test_client()
+                response = client.post(path, json=body)
+                return response.status_code == 200 and response.get_json().get('success', False)
+
+            model_used = app.extensions['prediksi'].registry.active()[1]
+            replay(send, requests[:WARMUP_REQUESTS], 1)
+            for concurrency in args.concurrency:
+                before = metrics.STAGE_LATENCY.snapshot()
+                latencies, wall, errors = replay(send, requests, concurrency)
+                flush_start = time.perf_counter()
+                db.writer.flush()
+                result = summarize(latencies, wall, errors)
+                result.update({
+                    'target': 'inprocess',
+                    'model': model_key,
+                    'model_used': model_used,
+                    'persist': persist,
+                    'concurrency': concurrency,
+                    'db_flush_ms': round((time.perf_counter() - flush_start) * 1000, 3),
+                    'stages_ms': stage_delta(before, metrics.STAGE_LATENCY.snapshot()),
+                })
+                print_result(result)
+                results.append(result)
+    db.writer = real_writer
+    return results
+
+
+# ✅ Target HTTP
+
+def parse_stage_metrics(text):
+    """{(endpoint, stage): (count, sum)} dari output /metrics"""
+    values = {}
+    prefix = 'prediksi_stage_duration_seconds_'
+    for line in text.splitlines():
+        if not line.startswith(prefix):
+            continue
+        name, _, rest = line[len(prefix):].partition('{')
+        if name not in ('sum', 'count'):
+            continue
+        labels, _, value = rest.rpartition('} ')
+        parts = dict(pair.split('=', 1) for pair in labels.split(','))
+        key = (parts['endpoint'].strip('"'), parts['stage'].strip('"'))
+        count, total = values.get(key, (0, 0.0))
+        if name == 'sum':
+            values[key] = (count, float(value))
+        else:
+            values[key] = (int(float(value)), total)
+    return values
+
+
+def run_http(args, requests):
+    url = urlsplit(args.url)
+    local = threading.local()
+
+    def connection():
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=args.timeout)
+        return conn
+
+    def request(method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        for attempt in range(2):
+            conn = connection()
+            try:
+                conn.request(method, url.path.rstrip('/') + path, payload, headers)
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, OSError):
+                # Koneksi keep-alive ditutup server, buka ulang sekali
+                conn.close()
+                local.conn = None
+                if attempt:
+                    return None, b''
+
+    def send(path, body):
+        status, _ = request('POST', path, body)
+        return status == 200
+
+    def stage_snapshot():
+        status, text = request('GET', '/metrics')
+        return parse_stage_metrics(text.decode()) if status == 200 else {}
+
+    status, body = request('GET', '/status/model')
+    model_used = json.loads(body).get('active_model') if status == 200 else 'unknown'
+    replay(send, requests[:WARMUP_REQUESTS], 1)
+
+    results = []
+    for concurrency in args.concurrency:
+        before = stage_snapshot()
+        latencies, wall, errors = replay(send, requests, concurrency)
+        result = summarize(latencies, wall, errors)
+        result.update({
+            'target': args.url,
+            'model': model_used,
+            'model_used': model_used,
+            'persist': 'server',
+            'concurrency': concurrency,
+            'stages_ms': stage_delta(before, stage_snapshot()),
+        })
+        print_result(result)
+        results.append(result)
+    return results
+
+
+# ✅ Simpan & bandingkan hasil
+
+def git_revision():
+    try:
+        sha = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{sha}-dirty' if dirty else sha
+
+
+def result_key(result):
+    return f"{result['target']}|{result['model']}|persist={result['persist']}|c={result['concurrency']}"
+
+
+def print_result(result):
+    print(
+        f"{result['model']:<10} persist={str(result['persist']):<6} c={result['concurrency']:<4} "
+        f"p50={result['p50_ms']:>8.2f}ms p95={result['p95_ms']:>8.2f}ms p99={result['p99_ms']:>8.2f}ms "
+        f"{result['throughput_rps']:>9.1f} req/s errors={result['errors']}"
+    )
+    for stage, ms in sorted(result['stages_ms'].items()):
+        print(f"{'':<12}{stage:<28} {ms:>8.3f}ms")
+
+
+def save_results(args, results):
+    revision = git_revision()
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(args.output_dir, f'{revision}-{stamp}.json')
+    report = {
+        'git': revision,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'requests': args.requests,
+            'replay': args.replay,
+            'seed': args.seed,
+            'cache_size': args.cache_size,
+        },
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Hasil disimpan: {path}")
+    return path
+
+
+def compare(old_path, new_path, threshold):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old_results = {result_key(r): r for r in old['results']}
+    regressions = 0
+    print(f"{old['git']} → {new['git']} (regresi jika > {threshold:.0f}%)")
+    for result in new['results']:
+        key = result_key(result)
+        base = old_results.get(key)
+        if base is None:
+            print(f"{key}: tidak ada pembanding")
+            continue
+        cells = []
+        for metric in COMPARED:
+            if not base[metric]:
+                continue
+            change = (result[metric] - base[metric]) / base[metric] * 100
+            worse = -change if metric == 'throughput_rps' else change
+            flag = ''
+            if worse > threshold:
+                flag = ' ⚠️'
+                regressions += 1
+            cells.append(f"{metric}={result[metric]} ({change:+.1f}%){flag}")
+        print(f"{key}: " + ', '.join(cells))
+    print(f"{'❌' if regressions else '✅'} {regressions} regresi")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Jalankan load test')
+    run.add_argument('--url', help='Base URL server; tanpa ini berjalan in-process')
+    run.add_argument('--models', default='gb,knn,catboost', help='Model untuk mode in-process')
+    run.add_argument('--requests', type=int, default=2000)
+    run.add_argument('--concurrency', default='1,8', help='Daftar jumlah thread, contoh 1,8,32')
+    run.add_argument('--persist', default='on,off', help='on,off / on / off (SQLite, mode in-process)')
+    run.add_argument('--cache-size', type=int, default=0,
+                     help='PREDICTION_CACHE_SIZE (default 0 supaya inference model yang terukur)')
+    run.add_argument('--replay', help='Request log JSONL (REQUEST_LOG) sebagai sumber payload')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--timeout', type=float, default=30.0)
+    run.add_argument('--output-dir', default=RESULTS_DIR)
+    run.add_argument('--no-save', action='store_true')
+
+    cmp_parser = sub.add_parser('compare', help='Bandingkan dua file hasil')
+    cmp_parser.add_argument('old')
+    cmp_parser.add_argument('new')
+    cmp_parser.add_argument('--threshold', type=float, default=10.0, help='Batas regresi dalam persen')
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return compare(args.old, args.new, args.threshold)
+
+    args.concurrency = [int(value) for value in args.concurrency.split(',')]
+    args.persist = [value.strip() == 'on' for value in args.persist.split(',')]
+    requests = build_requests(args)
+    results = run_http(args, requests) if args.url else run_inprocess(args, requests)
+    if not args.no_save:
+        save_results(args, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
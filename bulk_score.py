@@ -0,0 +1,292 @@
+"""
+Scoring offline file CSV besar tanpa Flask, dengan hasil yang sama seperti service.
+
+Input berformat models/diabetes_data_upload.csv: header dengan kolom Age, Gender
+(Male/Female) dan 14 gejala (Yes/No); kolom lain (misalnya class) dibiarkan.
+Setiap baris input ditulis ulang apa adanya + kolom prediction, probability,
+diagnosis, urutan baris sama dengan input.
+
+Alur:
+- proses utama membaca file per --chunk-rows baris (teks mentah, belum di-parse),
+- worker (ProcessPool, model di-load sekali per worker lewat initializer)
+  mem-parse chunk, membangun matrix 16 fitur seperti prediksi(), menjalankan
+  predict_proba_batch + apply_threshold_adjustment_batch (identik dengan
+  apply_threshold_adjustment per baris) hanya untuk kombinasi input yang belum
+  pernah di-skor worker itu (ScoreMemo), lalu memformat baris output,
+- proses utama menulis hasil berurutan; paling banyak 2 × --workers chunk
+  di memori pada satu waktu, jadi memori tidak bergantung ukuran file.
+
+Model = versi aktif di models/manifest.json (sama seperti service), atau --version.
+Satu baris file = satu record (field dengan newline di dalam quote tidak didukung).
+
+Pemakaian:
+    python bulk_score.py data.csv hasil.csv
+    python bulk_score.py data.csv.gz hasil.csv --model knn --version v1 --workers 8
+    zcat data.csv.gz | python bulk_score.py - - > hasil.csv   # progress ke stderr
+"""
+import argparse
+import contextlib
+import csv
+import gzip
+import io
+import itertools
+import os
+import sys
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from features import AGE_MAX, UPLOAD_COLUMNS, build_feature_matrix_upload
+from inference import MODEL_FILES, predict_proba_batch
+from lookup_table import N_FLAGS
+from model_registry import MANIFEST_PATH, active_version, load_manifest, load_version, model_label, version_paths
+from threshold import apply_threshold_adjustment_batch
+
+DEFAULT_CHUNK_ROWS = 20000
+PROGRESS_INTERVAL = 1.0
+OUTPUT_COLUMNS = ['prediction', 'probability', 'diagnosis']
+DIAGNOSIS = {0: b'Normal', 1: b'Berisiko Diabetes'}
+
+# Diisi initializer di setiap proses worker
+_worker = {}
+
+
+class ScoreMemo:
+    """
+    Hasil akhir (prediction, probability float64) per kombinasi input yang sudah
+    pernah di-skor worker ini. Ruang input diskrit (usia x 2^15 flag) dan hasil
+    hanya bergantung pada baris itu sendiri, jadi baris yang sama dengan baris
+    sebelumnya tidak perlu masuk model lagi; hasilnya identik.
+    Array dialokasikan dengan np.zeros, memori baru terpakai untuk sel yang diisi.
+    """
+
+    def __init__(self, model, label, age_max=AGE_MAX):
+        self.model = model
+        self.label = label
+        self.age_max = age_max
+        size = (age_max + 1) << N_FLAGS
+        self.known = np.zeros(size, dtype=bool)
+        self.prediction = np.zeros(size, dtype=np.int64)
+        self.probability = np.zeros(size)
+        self._weights = (1 << np.arange(N_FLAGS)).astype(np.int64)
+        self.model_rows = 0
+
+    def _score(self, X):
+        self.model_rows += len(X)
+        raw_predictions, raw_probabilities = predict_proba_batch(self.model, self.label, X)
+        return apply_threshold_adjustment_batch(raw_predictions, raw_probabilities, X)
+
+    def score(self, X):
+        """Return (predictions, probabilities) untuk matrix fitur (n, 16), usia 0..age_max"""
+        keys = (X[:, 0] << N_FLAGS) | (X[:, 1:] @ self._weights)
+        new = ~self.known[keys]
+        if new.any():
+            new_keys, first = np.unique(keys[new], return_index=True)
+            predictions, probabilities = self._score(X[new][first])
+            self.prediction[new_keys] = predictions
+            self.probability[new_keys] = probabilities
+            self.known[new_keys] = True
+        return self.prediction[keys], self.probability[keys]
+
+
+def _init_worker(key, version, manifest_path, columns):
+    """Load model sekali per proses worker"""
+    warnings.filterwarnings("ignore", category=UserWarning)
+    manifest = load_manifest(manifest_path)
+    _worker['memo'] = ScoreMemo(load_version(key, version, manifest, manifest_path), model_label(key, version))
+    _worker['columns'] = columns
+
+
+def score_chunk(chunk):
+    """
+    Scoring satu chunk teks CSV (tanpa header).
+    Return (bytes output, jumlah baris, jumlah berisiko, jumlah nilai kategori tidak dikenal).
+    """
+    import pandas as pd
+    lines = list(filter(None, chunk.splitlines()))
+    if not lines:
+        return b'', 0, 0, 0
+    # Baris kosong dilewati read_csv juga, jadi urutan frame = urutan lines
+    frame = pd.read_csv(
+        io.BytesIO(chunk), header=None, names=_worker['columns'], usecols=UPLOAD_COLUMNS,
+        dtype='category', keep_default_na=False, skipinitialspace=True,
+    )
+    if len(frame) != len(lines):
+        raise ValueError(f"{len(lines)} baris teks menjadi {len(frame)} record CSV (newline di dalam quote?)")
+    # Baris dengan kolom kurang dari header dilengkapi supaya kolom hasil tetap sejajar
+    separators = len(_worker['columns']) - 1
+    lines = [line if line.count(b',') >= separators else line + b',' * (separators - line.count(b','))
+             for line in lines]
+    X, unknown = build_feature_matrix_upload(frame)
+    predictions, probabilities = _worker['memo'].score(X)
+    # Kolom tambahan diformat sekali per hasil unik di chunk; repr float = angka
+    # yang sama dengan field probability di response JSON service.
+    # Kunci hasil: bit float64 probabilitas (0 ≤ p ≤ 1, < 2^62) digeser + prediction
+    results, inverse = np.unique((probabilities.view(np.int64) << 1) | predictions, return_inverse=True)
+    suffixes = [
+        b',%d,%s,%s\n' % (prediction, repr(probability).encode(), DIAGNOSIS[prediction])
+        for prediction, probability in zip((results & 1).tolist(), (results >> 1).view(np.float64).tolist())
+    ]
+    out = b''.join(itertools.chain.from_iterable(zip(lines, map(suffixes.__getitem__, inverse.tolist()))))
+    return out, len(lines), int(predictions.sum()), unknown
+
+
+def _read_chunks(f, chunk_rows):
+    """(nomor baris pertama, terakhir, teks) per chunk; baris 1 = header"""
+    first = 2
+    while True:
+        lines = list(itertools.islice(f, chunk_rows))
+        if not lines:
+            return
+        yield first, first + len(lines) - 1, b''.join(lines)
+        first += len(lines)
+
+
+def _chunk_result(first, last, get):
+    try:
+        return get()
+    except ValueError as e:
+        raise ValueError(f"Baris {first}-{last}: {e}") from e
+
+
+def _open_input(path):
+    if path == '-':
+        return sys.stdin.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _input_size(path):
+    # Ukuran file untuk persen progress; .gz dan stdin tidak diketahui
+    if path == '-' or path.endswith('.gz'):
+        return None
+    return os.path.getsize(path)
+
+
+class Progress:
+    """Laporan baris/detik dan MB/detik ke stderr, paling sering sekali per interval"""
+
+    def __init__(self, total_bytes=None, interval=PROGRESS_INTERVAL, stream=sys.stderr):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.rows = 0
+        self.bytes = 0
+
+    def update(self, rows, n_bytes, force=False):
+        self.rows += rows
+        self.bytes += n_bytes
+        now = time.perf_counter()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        elapsed = max(now - self.start, 1e-9)
+        percent = f" {100 * self.bytes / self.total_bytes:5.1f}%" if self.total_bytes else ''
+        self.stream.write(f"\r⏳{percent} {self.rows:,} baris  {self.rows / elapsed:,.0f} baris/s  "
+                          f"{self.bytes / elapsed / 1e6:.1f} MB/s")
+        self.stream.flush()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+def score_file(input_path, output_path, key, version=None, workers=None, chunk_rows=DEFAULT_CHUNK_ROWS,
+               manifest_path=MANIFEST_PATH, progress=True):
+    """Scoring seluruh file; return dict ringkasan (rows, positives, unknown, seconds, model)"""
+    manifest = load_manifest(manifest_path)
+    version = version or active_version(manifest, key)
+    # Versi yang salah ditolak sebelum output dibuat dan worker dijalankan
+    version_paths(manifest, key, version, manifest_path)
+    workers = workers or os.cpu_count() or 1
+
+    report = None
+    totals = {'rows': 0, 'positives': 0, 'unknown': 0}
+    with contextlib.ExitStack() as stack:
+        source = _open_input(input_path)
+        if source is not sys.stdin.buffer:
+            stack.enter_context(source)
+        header = source.readline()
+        columns = next(csv.reader([header.decode('utf-8-sig')]), [])
+        missing = [column for column in UPLOAD_COLUMNS if column not in columns]
+        if missing:
+            raise ValueError(f"Kolom tidak ada di {input_path}: {', '.join(missing)}")
+
+        sink = sys.stdout.buffer if output_path == '-' else stack.enter_context(open(output_path, 'wb'))
+        sink.write(header.rstrip(b'\r\n') + (',' + ','.join(OUTPUT_COLUMNS) + '\n').encode())
+        if progress:
+            report = Progress(_input_size(input_path))
+            report.bytes = len(header)
+
+        def collect(result, n_bytes):
+            out, rows, positives, unknown = result
+            sink.write(out)
+            totals['rows'] += rows
+            totals['positives'] += positives
+            totals['unknown'] += unknown
+            if report:
+                report.update(rows, n_bytes)
+
+        initargs = (key, version, manifest_path, columns)
+        if workers == 1:
+            _init_worker(*initargs)
+            for first, last, chunk in _read_chunks(source, chunk_rows):
+                collect(_chunk_result(first, last, lambda: score_chunk(chunk)), len(chunk))
+        else:
+            pool = stack.enter_context(ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs))
+            # Chunk yang sedang diproses dibatasi; hasil ditulis sesuai urutan input
+            pending = deque()
+            for first, last, chunk in _read_chunks(source, chunk_rows):
+                if len(pending) >= 2 * workers:
+                    collect(*_pop(pending))
+                pending.append((first, last, pool.submit(score_chunk, chunk), len(chunk)))
+            while pending:
+                collect(*_pop(pending))
+
+    if report:
+        report.update(0, 0, force=True)
+        report.stream.write('\n')
+    return {**totals, 'seconds': report.elapsed() if report else None, 'model': model_label(key, version)}
+
+
+def _pop(pending):
+    first, last, future, n_bytes = pending.popleft()
+    return _chunk_result(first, last, future.result), n_bytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='File CSV input (.csv / .csv.gz, - = stdin)')
+    parser.add_argument('output', help='File CSV output (- = stdout)')
+    parser.add_argument('--model', choices=sorted(MODEL_FILES), default='gb')
+    parser.add_argument('--version', help='Versi model di manifest (default: versi aktif)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Jumlah proses worker')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    parser.add_argument('--quiet', action='store_true', help='Tanpa laporan progress')
+    args = parser.parse_args(argv)
+
+    try:
+        result = score_file(args.input, args.output, args.model, args.version, args.workers,
+                            args.chunk_rows, args.manifest, progress=not args.quiet)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    summary = f"✅ {result['rows']:,} baris di-scoring dengan {result['model']}, {result['positives']:,} berisiko diabetes"
+    if result['seconds']:
+        summary += f" ({result['seconds']:.1f}s, {result['rows'] / max(result['seconds'], 1e-9):,.0f} baris/s)"
+    print(summary, file=sys.stderr)
+    if result['unknown']:
+        print(f"⚠️  {result['unknown']:,} nilai Gender/gejala bukan Male/Female/Yes/No (dihitung 0, sama seperti service)",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,451 @@
+"""
+Lapisan persistence untuk tabel prediksi.
+
+Backend dipilih dengan DATABASE_URL:
+- kosong (default): SQLite lokal di DB_PATH, satu file per pod (SQLiteStore)
+- postgresql://...: store bersama untuk semua replika (postgres_store.py), jadi
+  /riwayat dan /statistik sama di pod mana pun. File SQLite lokal tetap dipakai
+  sebagai buffer saat store tidak bisa dihubungi; merge.py memindahkannya.
+
+- Koneksi SQLite di-pool per thread (dan per proses) dengan WAL + pragma yang
+  di-tuning, sehingga pembaca /riwayat dan /statistik tidak menunggu insert.
+- Insert prediksi masuk ke antrian dan ditulis oleh satu background writer
+  yang melakukan group commit setiap DB_BATCH_INTERVAL_MS milidetik atau
+  DB_BATCH_MAX_ROWS baris, mana yang lebih dulu. Antrian di-flush saat shutdown.
+- Baris disimpan dalam skema ringkas (bitmask fitur + tabel model, lihat
+  schema.py) dan di-decode kembali ke kolom lama saat dibaca.
+"""
+import atexit
+import base64
+import csv
+import io
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import metrics
+from aggregates import init_aggregates, read_summary
+from features import parse_age
+from schema import (
+    INSERT_MODEL_SQL, INSERT_PREDIKSI_SQL, PREDIKSI_COLUMNS, STORED_COLUMNS,
+    ModelNames, create_schema, decode_row, encode_row, migrate, schema_version
+)
+
+logger = logging.getLogger('diabetes.db')
+
+DB_PATH = os.environ.get('DB_PATH', 'database/prediksi_diabetes.db')
+# Store bersama antar replika (kosong = SQLite lokal saja)
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+
+# Group commit: tulis setiap N milidetik atau M baris
+DB_BATCH_INTERVAL_MS = int(os.environ.get('DB_BATCH_INTERVAL_MS', 50))
+DB_BATCH_MAX_ROWS = int(os.environ.get('DB_BATCH_MAX_ROWS', 500))
+
+PRAGMAS = (
+    # Harus sebelum journal_mode dan hanya berlaku untuk database baru;
+    # database lama: python retention.py enable-vacuum (sekali)
+    'PRAGMA auto_vacuum=INCREMENTAL',
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',     # aman dengan WAL, fsync hanya saat checkpoint
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-16000',      # ~16 MB page cache per koneksi
+    'PRAGMA temp_store=MEMORY',
+)
+
+# Kolom fisik skema ringkas; decode_rows mengubahnya ke PREDIKSI_COLUMNS
+STORED_SELECT = f"SELECT {', '.join(STORED_COLUMNS)} FROM prediksi"
+
+
+def _timestamp():
+    """Format sama dengan CURRENT_TIMESTAMP SQLite (UTC)"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def prediksi_row(data, prediction, probability, used_model_name):
+    """Susun satu baris tabel prediksi dari payload asli + hasil prediksi"""
+    flags = (
+        data.get('gender'),
+        data.get('polyuria'), data.get('polydipsia'), data.get('weight_loss'),
+        data.get('weakness'), data.get('polyphagia'), data.get('genital_thrush'),
+        data.get('visual_blurring'), data.get('itching'), data.get('irritability'),
+        data.get('delayed_healing'), data.get('partial_paresis'), data.get('muscle_stiffness'),
+        data.get('alopecia'), data.get('obesity'),
+    )
+    # Usia divalidasi lagi (0..120) supaya nilai di luar rentang tidak pernah tersimpan
+    age = data.get('age')
+    age = None if age is None else parse_age(age)
+    return encode_row(age, flags, int(prediction), float(probability), used_model_name, _timestamp())
+
+
+def connect(path=None):
+    """Buka koneksi baru dengan pragma standar"""
+    conn = sqlite3.connect(path or DB_PATH, timeout=5.0)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+_local = threading.local()
+
+# Nama model per model_id untuk decode (tabel model hanya bertambah)
+model_names = ModelNames()
+
+
+def decode_rows(conn, rows):
+    """Baris STORED_SELECT → tuple PREDIKSI_COLUMNS, nilainya sama dengan skema lama"""
+    return [decode_row(row, model_names.get(conn, row[7])) for row in rows]
+
+
+def get_connection():
+    """Koneksi milik thread ini; dibuat ulang setelah fork"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+class SQLiteStore:
+    """
+    Backend default: file SQLite lokal (DB_PATH). Backend lain (postgres_store.py)
+    punya method yang sama; baris yang dikembalikan berupa tuple PREDIKSI_COLUMNS.
+    """
+    name = 'sqlite'
+    Error = sqlite3.Error
+    DataError = sqlite3.DataError
+
+    def init(self):
+        os.makedirs(os.path.dirname(DB_PATH) or '.', exist_ok=True)
+        conn = connect()
+        try:
+            if schema_version(conn) == 1:
+                # Database lama (kolom TEXT) → skema ringkas, in-place per chunk
+                start = time.perf_counter()
+                rows = migrate(conn)
+                logger.info("✅ %s baris dimigrasi ke skema ringkas (%.1fs)", rows, time.perf_counter() - start)
+            with conn:
+                create_schema(conn)
+            init_aggregates(conn)
+        finally:
+            conn.close()
+
+    def write(self, rows):
+        """Satu batch baris encode_row dalam satu transaksi"""
+        conn = get_connection()
+        with conn:
+            # Nama model baru didaftarkan dulu; INSERT mencari model_id dari nama
+            conn.executemany(INSERT_MODEL_SQL, {(row[6],) for row in rows if row[6] is not None})
+            conn.executemany(INSERT_PREDIKSI_SQL, rows)
+
+    def fetch_page(self, limit, after, filters):
+        """Baris terbaru → terlama; after = kunci (waktu, id) halaman sebelumnya"""
+        clauses, params = _history_where(**filters)
+        if after:
+            clauses.append('(waktu_prediksi, id) < (?, ?)')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = get_connection()
+        return decode_rows(conn, conn.execute(f'''
+            {STORED_SELECT}
+            {where}
+            ORDER BY waktu_prediksi DESC, id DESC
+            LIMIT ?
+        ''', (*params, limit)).fetchall())
+
+    def iter_rows(self, chunk_size, filters):
+        """Generator semua baris (urut id) yang dibaca per chunk dari koneksi tersendiri"""
+        clauses, params = _history_where(**filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = connect()
+        try:
+            c = conn.execute(f'{STORED_SELECT} {where} ORDER BY id', params)
+            while True:
+                rows = c.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from decode_rows(conn, rows)
+        finally:
+            conn.close()
+
+    def delete(self, prediction_id):
+        conn = get_connection()
+        with conn:
+            conn.execute('DELETE FROM prediksi WHERE id = ?', (prediction_id,))
+
+    def summary(self):
+        """Statistik dari counter agregat (lihat aggregates.py), O(1) terhadap jumlah baris"""
+        return read_summary(get_connection())
+
+
+def create_store(url=DATABASE_URL):
+    """Store sesuai DATABASE_URL; kosong = SQLite lokal"""
+    if not url:
+        return local
+    if url.startswith(('postgres://', 'postgresql://')):
+        from postgres_store import PostgresStore
+        return PostgresStore(url)
+    raise ValueError(f"DATABASE_URL tidak didukung: {url.split(':', 1)[0]}")
+
+
+local = SQLiteStore()
+store = create_store()
+
+
+def init_db():
+    try:
+        # SQLite lokal selalu disiapkan: backend default, atau buffer untuk store bersama
+        local.init()
+        if store is not local:
+            store.init()
+        logger.info("✅ Database diinisialisasi dengan sukses (%s)", store.name)
+    except Exception as e:
+        logger.error("❌ Error database: %s", e)
+
+
+class PredictionWriter:
+    """Background writer dengan group commit untuk insert prediksi"""
+
+    def __init__(self, interval_ms=DB_BATCH_INTERVAL_MS, max_rows=DB_BATCH_MAX_ROWS):
+        self.interval = interval_ms / 1000.0
+        self.max_rows = max_rows
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        # Thread tidak ikut ter-copy saat fork, jadi dicek per proses
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._stopping = False
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='prediksi-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        self.submit_many([row])
+
+    def submit_many(self, rows):
+        """Antrikan baris; satu panggilan selalu ditulis dalam transaksi yang sama"""
+        if not rows:
+            return
+        self._ensure_started()
+        self._queue.put(list(rows))
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                if self._stopping:
+                    break
+                continue
+            if first is None:
+                self._queue.task_done()
+                break
+
+            batches = [first]
+            n_rows = len(first)
+            stop = False
+            deadline = time.monotonic() + self.interval
+            while n_rows < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batches.append(item)
+                n_rows += len(item)
+
+            try:
+                self._write(batches, n_rows)
+            except Exception as e:
+                # Satu batch yang gagal tidak boleh menghentikan writer thread
+                logger.exception("❌ Writer error (%d baris tidak tersimpan): %s", n_rows, e)
+                metrics.DB_ROWS_WRITTEN.inc('lost', amount=n_rows)
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                break
+
+    def _write(self, batches, n_rows):
+        rows = [row for batch in batches for row in batch]
+        try:
+            store.write(rows)
+            metrics.DB_ROWS_WRITTEN.inc(store.name, amount=n_rows)
+            return
+        except store.Error as db_error:
+            if store is local:
+                logger.error("❌ Database error (%d baris tidak tersimpan): %s", n_rows, db_error)
+                metrics.DB_ROWS_WRITTEN.inc('lost', amount=n_rows)
+                return
+            logger.warning("⚠️  Store %s gagal, %d baris ditulis ke SQLite lokal: %s", store.name, n_rows, db_error)
+        # Store bersama tidak bisa dihubungi: buffer lokal, dipindahkan oleh merge.py
+        try:
+            local.write(rows)
+            metrics.DB_ROWS_WRITTEN.inc('spill', amount=n_rows)
+        except Exception as db_error:
+            logger.error("❌ Database error (%d baris tidak tersimpan): %s", n_rows, db_error)
+            metrics.DB_ROWS_WRITTEN.inc('lost', amount=n_rows)
+
+    def flush(self, timeout=None):
+        """Tunggu sampai semua baris di antrian tertulis"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        # Polling (bukan queue.join) supaya tidak menggantung jika writer thread mati
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks and self._thread.is_alive():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.01)
+
+    def close(self, timeout=10.0):
+        """Flush antrian lalu hentikan writer thread"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+writer = PredictionWriter()
+atexit.register(writer.close)
+
+
+def fetch_riwayat(limit=50):
+    # (id, usia, jenis_kelamin, hasil_prediksi, probabilitas, model_digunakan, waktu_prediksi)
+    return [row[:3] + row[17:] for row in store.fetch_page(limit, None, {})]
+
+
+def encode_cursor(waktu, row_id):
+    return base64.urlsafe_b64encode(json.dumps([waktu, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        waktu, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        datetime.fromisoformat(waktu)
+        return str(waktu), int(row_id)
+    except Exception:
+        raise ValueError('Cursor tidak valid')
+
+
+def check_filters(dari=None, sampai=None, hasil=None, model=None):
+    """Validasi filter riwayat (ValueError jika tanggal tidak valid), return dict untuk store"""
+    if dari:
+        datetime.fromisoformat(dari)
+    if sampai:
+        datetime.fromisoformat(sampai)
+    return {'dari': dari, 'sampai': sampai, 'hasil': hasil, 'model': model}
+
+
+def _history_where(dari=None, sampai=None, hasil=None, model=None):
+    """Klausa WHERE + parameter SQLite untuk filter riwayat"""
+    clauses, params = [], []
+    if dari:
+        clauses.append('waktu_prediksi >= ?')
+        params.append(dari)
+    if sampai:
+        if len(sampai) == 10:
+            # Tanggal saja → inklusif sampai akhir hari
+            clauses.append("waktu_prediksi < date(?, '+1 day')")
+        else:
+            clauses.append('waktu_prediksi <= ?')
+        params.append(sampai)
+    if hasil is not None:
+        clauses.append('hasil_prediksi = ?')
+        params.append(hasil)
+    if model:
+        clauses.append('model_id = (SELECT id FROM model WHERE nama = ?)')
+        params.append(model)
+    return clauses, params
+
+
+def fetch_history(limit=50, cursor=None, **filters):
+    """
+    Satu halaman riwayat terbaru → terlama dengan keyset pagination.
+    Return (list of dict, next_cursor atau None).
+    """
+    filters = check_filters(**filters)
+    after = decode_cursor(cursor) if cursor else None
+    rows = store.fetch_page(limit + 1, after, filters)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[-1], last[0])
+    return [dict(zip(PREDIKSI_COLUMNS, row)) for row in rows], next_cursor
+
+
+def iter_history(chunk_size=1000, **filters):
+    """Generator semua baris (urut id), dibaca per chunk"""
+    return store.iter_rows(chunk_size, check_filters(**filters))
+
+
+def export_csv(chunk_size=1000, **filters):
+    """Generator teks CSV (header + baris), satu chunk per yield"""
+    check_filters(**filters)  # validasi filter sebelum response dimulai
+    buffer = io.StringIO()
+    out = csv.writer(buffer)
+
+    def take():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    def generate():
+        out.writerow(PREDIKSI_COLUMNS)
+        for i, row in enumerate(iter_history(chunk_size=chunk_size, **filters), 1):
+            out.writerow(row)
+            if i % chunk_size == 0:
+                yield take()
+        yield take()
+    return generate()
+
+
+def export_ndjson(chunk_size=1000, **filters):
+    """Generator NDJSON, satu objek JSON per baris"""
+    check_filters(**filters)
+
+    def generate():
+        lines = []
+        for row in iter_history(chunk_size=chunk_size, **filters):
+            lines.append(json.dumps(dict(zip(PREDIKSI_COLUMNS, row)), ensure_ascii=False))
+            if len(lines) >= chunk_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+    return generate()
+
+
+def delete_prediksi(prediction_id):
+    store.delete(prediction_id)
+
+
+def fetch_statistik():
+    """Statistik dari counter agregat, tanpa scan tabel prediksi"""
+    return store.summary()
@@ -0,0 +1,192 @@
+"""
+Ensemble scoring: satu request di-skor oleh semua model yang sudah dimuat,
+paralel di thread pool, lalu probabilitasnya digabung dengan bobot.
+
+Setiap model punya budget latency. Model yang belum selesai saat deadline-nya
+lewat (atau error) dikeluarkan dari voting request itu, sehingga latency
+total ≈ model paling lambat yang masih dalam budget, bukan jumlah semuanya.
+
+Task yang sudah berjalan tidak bisa dibatalkan, jadi tiap model punya thread
+pool sendiri dengan ENSEMBLE_WORKERS slot. Jika semua slot satu model masih
+dipakai task yang lambat, model itu dilewati (status "busy") tanpa task baru
+diantrikan; model lain tidak ikut menunggu di belakangnya.
+
+Konfigurasi (env, lihat create_app):
+    PREDICTION_MODE=ensemble
+    MODELS=gb,knn,catboost              model yang di-load & ikut voting
+    ENSEMBLE_WEIGHTS=gb=2,knn=1,catboost=1   default bobot 1
+    ENSEMBLE_TIMEOUT_MS=100 atau "100,knn=30"  budget per model (/prediksi)
+    ENSEMBLE_BATCH_TIMEOUT_MS=5000      budget per model (/prediksi/batch)
+    ENSEMBLE_WORKERS                    thread per model (default GUNICORN_THREADS)
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+import metrics
+from inference import MODEL_FILES, predict_one, predict_proba_batch
+
+DEFAULT_TIMEOUT_MS = 100
+DEFAULT_BATCH_TIMEOUT_MS = 5000
+# Satu slot per thread request gunicorn: model yang sehat selalu punya slot kosong
+DEFAULT_WORKERS_PER_MODEL = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def parse_model_values(value, default):
+    """
+    'gb=2,knn=1' → {'gb': 2.0, 'knn': 1.0}; angka tanpa nama jadi default
+    untuk semua model, contoh '100,knn=30'.
+    """
+    values = {}
+    for part in filter(None, (p.strip() for p in str(value).split(','))):
+        name, sep, number = part.rpartition('=')
+        if not sep:
+            default = float(number)
+            continue
+        name = name.strip()
+        if name not in MODEL_FILES:
+            raise ValueError(f"Model tidak dikenal: {name} (pilihan: {', '.join(MODEL_FILES)})")
+        values[name] = float(number)
+    return {name: values.get(name, default) for name in MODEL_FILES}
+
+
+class ModelSlots:
+    """Thread pool satu model + jumlah task yang sedang berjalan (maksimal workers)"""
+
+    def __init__(self, key, workers):
+        self.workers = workers
+        self.in_flight = 0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix=f'ensemble-{key}')
+        self._lock = threading.Lock()
+
+    def try_submit(self, fn, *args):
+        """Future, atau None jika semua thread model ini sibuk (task tidak diantrikan)"""
+        with self._lock:
+            if self.in_flight >= self.workers:
+                return None
+            self.in_flight += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class Ensemble:
+    def __init__(self, registry, weights='', timeouts_ms=DEFAULT_TIMEOUT_MS,
+                 batch_timeouts_ms=DEFAULT_BATCH_TIMEOUT_MS, workers_per_model=None):
+        self.registry = registry
+        self.weights = parse_model_values(weights, 1.0)
+        self.timeouts = {k: v / 1000 for k, v in parse_model_values(timeouts_ms, DEFAULT_TIMEOUT_MS).items()}
+        self.batch_timeouts = {
+            k: v / 1000 for k, v in parse_model_values(batch_timeouts_ms, DEFAULT_BATCH_TIMEOUT_MS).items()
+        }
+        self.workers_per_model = workers_per_model or DEFAULT_WORKERS_PER_MODEL
+        self._slots = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _model_slots(self, key):
+        # Pool dibuat per proses: thread dari master tidak ikut ter-fork ke worker
+        if self._pid != os.getpid() or key not in self._slots:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._slots = {}
+                    self._pid = os.getpid()
+                if key not in self._slots:
+                    self._slots[key] = ModelSlots(key, self.workers_per_model)
+        return self._slots[key]
+
+    def _run(self, score, budgets, report_probability):
+        """
+        Jalankan score(key, label, model) untuk tiap model paralel.
+        Return (hasil per key yang selesai, info per model untuk response).
+        """
+        members = [m for m in self.registry.loaded() if self.weights[m[0]] > 0]
+        start = time.perf_counter()
+
+        def timed(key, label, model):
+            t0 = time.perf_counter()
+            result = score(key, label, model)
+            return result, time.perf_counter() - t0
+
+        futures = [
+            (key, label, self._model_slots(key).try_submit(timed, key, label, model))
+            for key, label, model in members
+        ]
+        results = {}
+        info = {label: {'weight': self.weights[key]} for key, label, _ in members}
+        # Tunggu berurutan dari deadline terdekat; deadline dihitung dari awal request
+        for key, label, future in sorted(futures, key=lambda f: budgets[f[0]]):
+            entry = info[label]
+            if future is None:
+                entry.update(status='busy')
+                metrics.ENSEMBLE_DROPPED.inc(label, 'busy')
+                continue
+            try:
+                remaining = max(0.0, start + budgets[key] - time.perf_counter())
+                result, seconds = future.result(timeout=remaining)
+            except FutureTimeout:
+                # Task tetap berjalan sampai selesai dan memakai slot model ini saja
+                entry.update(status='timeout', ms=round((time.perf_counter() - start) * 1000, 3))
+                metrics.ENSEMBLE_DROPPED.inc(label, 'timeout')
+            except Exception as e:
+                entry.update(status='error', error=str(e))
+                metrics.ENSEMBLE_DROPPED.inc(label, 'error')
+            else:
+                entry.update(status='ok', ms=round(seconds * 1000, 3))
+                if report_probability:
+                    entry['probability'] = result
+                metrics.MODEL_LATENCY.observe(seconds, label)
+                results[key] = result
+        return results, info
+
+    def _combine(self, probabilities):
+        total = sum(self.weights[key] for key in probabilities)
+        return sum(self.weights[key] * p for key, p in probabilities.items()) / total
+
+    @staticmethod
+    def model_name(info):
+        labels = [label for label, entry in info.items() if entry['status'] == 'ok']
+        return f"Ensemble ({', '.join(labels)})"
+
+    def score_one(self, features):
+        """
+        Return (raw_prediction, probabilitas gabungan, nama model, info per model),
+        atau None jika tidak ada model yang selesai dalam budget.
+        """
+        results, info = self._run(
+            lambda key, label, model: predict_one(model, label, features)[1], self.timeouts, True
+        )
+        if not results:
+            return None
+        probability = self._combine(results)
+        # Sama dengan predict tiap model: kelas 1 jika probabilitasnya lebih besar
+        return int(probability > 0.5), probability, self.model_name(info), info
+
+    def score_batch(self, X):
+        """Versi batch: (raw_predictions, probabilitas (n,), nama model, info) atau None"""
+        results, info = self._run(
+            lambda key, label, model: predict_proba_batch(model, label, X)[1], self.batch_timeouts, False
+        )
+        if not results:
+            return None
+        probabilities = self._combine(results)
+        return (probabilities > 0.5).astype(np.int64), probabilities, self.model_name(info), info
+
+    def status(self):
+        members = [key for key, _, _ in self.registry.loaded()]
+        slots = self._slots if self._pid == os.getpid() else {}
+        return {
+            'members': members,
+            'workers_per_model': self.workers_per_model,
+            'in_flight': {key: slots[key].in_flight if key in slots else 0 for key in members},
+            'weights': {key: self.weights[key] for key in members},
+            'timeout_ms': {key: self.timeouts[key] * 1000 for key in members},
+            'batch_timeout_ms': {key: self.batch_timeouts[key] * 1000 for key in members},
+        }
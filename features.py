@@ -0,0 +1,88 @@
+import numpy as np
+
+# Urutan 16 fitur sesuai data training (models/data_clean.csv)
+FEATURE_NAMES = [
+    'Age', 'Gender_Male', 'Polyuria_Yes', 'Polydipsia_Yes',
+    'sudden weight loss_Yes', 'weakness_Yes', 'Polyphagia_Yes',
+    'Genital thrush_Yes', 'visual blurring_Yes', 'Itching_Yes',
+    'Irritability_Yes', 'delayed healing_Yes', 'partial paresis_Yes',
+    'muscle stiffness_Yes', 'Alopecia_Yes', 'Obesity_Yes'
+]
+
+# Field form/JSON untuk 14 gejala, urutannya sama dengan FEATURE_NAMES[2:]
+SYMPTOM_FIELDS = [
+    'polyuria', 'polydipsia', 'weight_loss', 'weakness', 'polyphagia',
+    'genital_thrush', 'visual_blurring', 'itching', 'irritability',
+    'delayed_healing', 'partial_paresis', 'muscle_stiffness',
+    'alopecia', 'obesity'
+]
+
+N_FEATURES = len(FEATURE_NAMES)
+
+# Kolom file mentah seperti models/diabetes_data_upload.csv (Age, Gender=Male/Female,
+# gejala Yes/No), urutannya sama dengan FEATURE_NAMES
+UPLOAD_COLUMNS = [name.rsplit('_', 1)[0] for name in FEATURE_NAMES]
+
+# Usia yang diterima: sama dengan input form (1-120), 0 = usia tidak diisi
+AGE_MAX = 120
+
+
+def parse_age(value):
+    """Usia integer 0..AGE_MAX dari payload (int, float bulat atau string angka), ValueError jika tidak valid"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"Usia harus bilangan bulat, bukan {value!r}")
+    try:
+        age = int(value)
+    except ValueError:
+        raise ValueError(f"Usia harus bilangan bulat, bukan {value!r}") from None
+    if not 0 <= age <= AGE_MAX:
+        raise ValueError(f"Usia harus antara 0 dan {AGE_MAX}, bukan {age}")
+    return age
+
+
+def build_features(data):
+    """Ubah satu payload JSON menjadi list 16 fitur integer (ValueError jika usia tidak valid)"""
+    features = [
+        parse_age(data.get('age', 0)),
+        1 if data.get('gender') == 'Pria' else 0,
+    ]
+    features.extend(1 if data.get(field) == 'Ya' else 0 for field in SYMPTOM_FIELDS)
+    return features
+
+
+def build_feature_matrix(records):
+    """Ubah list payload JSON menjadi satu matrix NumPy (n, 16)"""
+    X = np.zeros((len(records), N_FEATURES), dtype=np.int64)
+    for i, data in enumerate(records):
+        try:
+            X[i] = build_features(data)
+        except ValueError as e:
+            raise ValueError(f"Record ke-{i}: {e}") from None
+    return X
+
+
+def build_feature_matrix_upload(frame):
+    """
+    Ubah DataFrame berkolom UPLOAD_COLUMNS (nilai string) menjadi matrix (n, 16),
+    dengan aturan yang sama seperti build_features: Male/Yes → 1, nilai lain → 0,
+    usia kosong → 0, usia tidak valid → ValueError. Return (X, jumlah sel kategori yang bukan Male/Female/Yes/No).
+    """
+    X = np.zeros((len(frame), N_FEATURES), dtype=np.int64)
+    unknown = 0
+    for i, column in enumerate(UPLOAD_COLUMNS):
+        # Lewat categorical: nilai unik per kolom hanya sedikit, jadi
+        # mapping dihitung per kategori lalu di-take dengan kode baris
+        values = frame[column].astype('category')
+        categories = [str(category) for category in values.cat.categories] + ['']  # kode -1 = kosong
+        codes = values.cat.codes.to_numpy()
+        if i == 0:
+            mapping = np.array([parse_age(category or 0) for category in categories], dtype=np.int64)
+        else:
+            positive, negative = ('Male', 'Female') if i == 1 else ('Yes', 'No')
+            mapping = np.array([category == positive for category in categories], dtype=np.int64)
+            known = np.array([category in (positive, negative) for category in categories])
+            unknown += int(np.count_nonzero(~known.take(codes)))
+        X[:, i] = mapping.take(codes)
+    return X, unknown
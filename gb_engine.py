@@ -0,0 +1,254 @@
+"""
+Engine inference ringan untuk model Gradient Boosting (model_gb.joblib).
+
+`export` meratakan 300 pohon sklearn menjadi array NumPy terpaket
+(fitur, threshold, anak kiri/kanan, nilai daun) di models/model_gb_packed.npz.
+`PackedGradientBoosting` mengevaluasi satu baris atau satu batch dari array
+tersebut tanpa sklearn: tanpa validasi input dan tanpa dispatch per pohon.
+
+Karena 15 dari 16 input biner, ribuan node hanya memakai sedikit pasangan
+(fitur, threshold) yang berbeda. Setiap pasangan dievaluasi sekali per baris,
+lalu arah tiap node diambil dari vektor test kecil tersebut, dan seluruh
+pohon ditelusuri bersamaan per level (kedalaman maksimal 4).
+
+Hasilnya identik bit-per-bit dengan sklearn:
+- input di-cast ke float32 lalu dibandingkan `x <= threshold` (float64)
+- skor mentah = init + lr*daun, dijumlahkan berurutan per stage (cumsum)
+- probabilitas = expit via math.exp (libm, sama dengan scipy.special.expit)
+
+Pemakaian:
+    python gb_engine.py export
+    python gb_engine.py verify              # seluruh ruang input form
+    python gb_engine.py verify --samples 20000
+"""
+import argparse
+import hashlib
+import math
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from features import N_FEATURES
+
+SOURCE_PATH = 'models/model_gb.joblib'
+PACKED_PATH = 'models/model_gb_packed.npz'
+
+# Versi format file .npz; naikkan jika susunan array berubah
+FORMAT_VERSION = 1
+
+# Batch dipotong per chunk supaya matrix index (baris x pohon) tetap kecil
+BATCH_CHUNK_ROWS = 256
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export(model, path=PACKED_PATH, source_path=SOURCE_PATH):
+    """Ratakan GradientBoostingClassifier biner menjadi array terpaket (.npz)"""
+    if model.estimators_.shape[1] != 1:
+        raise ValueError('Hanya GradientBoostingClassifier biner yang didukung')
+
+    trees = [estimator[0].tree_ for estimator in model.estimators_]
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+    n_nodes = int(offsets[-1])
+
+    feature = np.zeros(n_nodes, dtype=np.int32)
+    threshold = np.zeros(n_nodes, dtype=np.float64)
+    left = np.zeros(n_nodes, dtype=np.int32)
+    right = np.zeros(n_nodes, dtype=np.int32)
+    value = np.zeros(n_nodes, dtype=np.float64)
+    for tree, offset in zip(trees, offsets):
+        nodes = np.arange(tree.node_count) + offset
+        is_leaf = tree.children_left == -1
+        feature[nodes] = np.where(is_leaf, 0, tree.feature)
+        threshold[nodes] = tree.threshold
+        # Daun menunjuk ke dirinya sendiri: penelusuran per level boleh
+        # berjalan max_depth kali untuk semua pohon tanpa cabang
+        left[nodes] = np.where(is_leaf, nodes, tree.children_left + offset)
+        right[nodes] = np.where(is_leaf, nodes, tree.children_right + offset)
+        # Sama dengan sklearn: out += learning_rate * value
+        value[nodes] = model.learning_rate * tree.value[:, 0, 0]
+
+    # Pasangan (fitur, threshold) unik; node daun memakai test 0 (tidak berpengaruh)
+    is_split = left != np.arange(n_nodes)
+    pairs = sorted(set(zip(feature[is_split].tolist(), threshold[is_split].tolist())))
+    test_index = {pair: i for i, pair in enumerate(pairs)}
+    node_test = np.array(
+        [test_index[(f, t)] if split else 0 for f, t, split in zip(feature.tolist(), threshold.tolist(), is_split)],
+        dtype=np.int32,
+    )
+
+    init_raw = model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0, 0]
+    np.savez(
+        path,
+        format_version=FORMAT_VERSION,
+        source_sha256=file_sha256(source_path),
+        classes=np.asarray(model.classes_),
+        n_features=model.n_features_in_,
+        max_depth=max(tree.max_depth for tree in trees),
+        init_raw=np.float64(init_raw),
+        roots=offsets[:-1].astype(np.int32),
+        left=left,
+        right=right,
+        value=value,
+        node_test=node_test,
+        test_feature=np.array([f for f, _ in pairs], dtype=np.int32),
+        test_threshold=np.array([t for _, t in pairs], dtype=np.float64),
+    )
+    return path
+
+
+def _expit(raw):
+    # math.exp (libm) memberi hasil yang sama dengan scipy.special.expit;
+    # np.exp memakai implementasi SIMD sendiri yang bisa beda 1 ulp
+    return 1.0 / (1.0 + math.exp(-raw))
+
+
+class PackedGradientBoosting:
+    """Pengganti GradientBoostingClassifier untuk predict/predict_proba"""
+
+    def __init__(self, arrays):
+        self.classes_ = arrays['classes']
+        self.n_features_in_ = int(arrays['n_features'])
+        self.source_sha256 = str(arrays['source_sha256'])
+        self.max_depth = int(arrays['max_depth'])
+        self.init_raw = float(arrays['init_raw'])
+        self.roots = arrays['roots'].astype(np.int32)
+        self.value = arrays['value']
+        self.node_test = arrays['node_test'].astype(np.int32)
+        self.test_feature = arrays['test_feature']
+        self.test_threshold = arrays['test_threshold']
+        self.n_trees = len(self.roots)
+        self.n_tests = len(self.test_feature)
+        # children[2*node] = kiri, children[2*node + 1] = kanan, sehingga
+        # node berikutnya = children[2*node + ke_kanan] tanpa np.where
+        self.children = np.empty(2 * len(self.value), dtype=np.int32)
+        self.children[0::2] = arrays['left']
+        self.children[1::2] = arrays['right']
+
+    @classmethod
+    def load(cls, path=PACKED_PATH):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        if int(arrays['format_version']) != FORMAT_VERSION:
+            raise ValueError(f'Format {path} tidak didukung, jalankan ulang: python gb_engine.py export')
+        return cls(arrays)
+
+    def _go_right(self, X):
+        # ~(x <= t), bukan x > t: sama dengan sklearn juga untuk NaN (ke kanan)
+        return ~(X[..., self.test_feature] <= self.test_threshold)
+
+    def raw_predict_row(self, features):
+        """Skor mentah (log-odds) satu baris"""
+        go_right = self._go_right(np.asarray(features, dtype=np.float32))
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            nodes = self.children.take(2 * nodes + go_right.take(self.node_test.take(nodes)))
+        stages = np.empty(self.n_trees + 1)
+        stages[0] = self.init_raw
+        self.value.take(nodes, out=stages[1:])
+        # cumsum = penjumlahan berurutan per stage (np.sum memakai pairwise sum)
+        return float(np.cumsum(stages)[-1])
+
+    def raw_predict(self, X):
+        """Skor mentah (n,) untuk matrix (n, 16)"""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.n_features_in_)
+        raw = np.empty(len(X))
+        for start in range(0, len(X), BATCH_CHUNK_ROWS):
+            chunk = X[start:start + BATCH_CHUNK_ROWS]
+            go_right = self._go_right(chunk).ravel()
+            # Offset baris di go_right yang sudah diratakan (n * n_tests)
+            row_offset = (np.arange(len(chunk), dtype=np.int32) * self.n_tests)[:, None]
+            nodes = np.broadcast_to(self.roots, (len(chunk), self.n_trees))
+            for _ in range(self.max_depth):
+                nodes = self.children.take(2 * nodes + go_right.take(row_offset + self.node_test.take(nodes)))
+            stages = np.empty((len(chunk), self.n_trees + 1))
+            stages[:, 0] = self.init_raw
+            self.value.take(nodes, out=stages[:, 1:])
+            raw[start:start + len(chunk)] = np.cumsum(stages, axis=1)[:, -1]
+        return raw
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if X.ndim == 2 and len(X) == 1:
+            raw = [self.raw_predict_row(X[0])]
+        else:
+            raw = self.raw_predict(X)
+        proba = np.empty((len(raw), 2))
+        proba[:, 1] = [_expit(value) for value in raw]
+        proba[:, 0] = 1 - proba[:, 1]
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+def verify(engine, model, samples=None, seed=0):
+    """
+    Bandingkan engine dengan sklearn. samples=None → seluruh ruang input form
+    (usia 0-120 x 2^15 flag); selain itu sampel acak. Return jumlah baris berbeda.
+    """
+    from lookup_table import AGE_MAX, AGE_MIN, flag_grid
+
+    if samples is None:
+        flags = flag_grid()
+        X = np.concatenate([
+            np.column_stack([np.full(len(flags), age), flags]) for age in range(AGE_MIN, AGE_MAX + 1)
+        ])
+    else:
+        rng = np.random.default_rng(seed)
+        X = np.empty((samples, N_FEATURES), dtype=np.int64)
+        X[:, 0] = rng.integers(AGE_MIN, AGE_MAX + 1, size=samples)
+        X[:, 1:] = rng.integers(0, 2, size=(samples, N_FEATURES - 1))
+
+    expected = model.predict_proba(X)
+    actual = engine.predict_proba(X)
+    mismatches = int(np.any(expected != actual, axis=1).sum())
+
+    # Jalur satu baris (dipakai /prediksi) dicek pada sebagian baris
+    rng = np.random.default_rng(seed + 1)
+    for i in rng.choice(len(X), size=min(len(X), 5000), replace=False):
+        if not np.array_equal(engine.predict_proba(X[i:i + 1]), expected[i:i + 1]):
+            mismatches += 1
+    return mismatches, len(X)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export', 'verify'])
+    parser.add_argument('--output', default=PACKED_PATH)
+    parser.add_argument('--samples', type=int, help='Jumlah sampel acak (default: seluruh ruang input)')
+    args = parser.parse_args(argv)
+
+    import joblib
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(SOURCE_PATH)
+
+    if args.command == 'export':
+        start = time.perf_counter()
+        export(model, args.output)
+        engine = PackedGradientBoosting.load(args.output)
+        print(f"✅ {engine.n_trees} pohon, {len(engine.value)} node, {len(engine.test_feature)} test unik "
+              f"→ {args.output} ({time.perf_counter() - start:.2f}s)")
+        return 0
+
+    engine = PackedGradientBoosting.load(args.output)
+    if engine.source_sha256 != file_sha256(SOURCE_PATH):
+        print(f"❌ {args.output} dibuat dari versi {SOURCE_PATH} yang lain, jalankan export ulang")
+        return 1
+    start = time.perf_counter()
+    mismatches, total = verify(engine, model, args.samples)
+    print(f"{'✅' if mismatches == 0 else '❌'} {total} baris diverifikasi, {mismatches} berbeda "
+          f"({time.perf_counter() - start:.1f}s)")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Konfigurasi gunicorn untuk container produksi.
+
+Semua nilai bisa diatur lewat env:
+    WEB_CONCURRENCY   jumlah worker proses (default 2)
+    GUNICORN_THREADS  thread per worker (default 4)
+    PORT              port (default 5000)
+    PROMETHEUS_MULTIPROC_DIR  file metrik per worker untuk /metrics gabungan
+                      (default /tmp/prediksi-metrics, lihat metrics.py)
+"""
+import os
+
+# Harus sebelum app (dan metrics.py) di-import oleh preload
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prediksi-metrics')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Load model di master sebelum fork (copy-on-write ke worker)
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 20))
+keepalive = 5
+
+accesslog = None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """Buang file metrik dari run sebelumnya sebelum worker pertama dibuat"""
+    import metrics
+    metrics.REGISTRY.clear()
+
+
+def worker_exit(server, worker):
+    """Drain antrian insert prediksi dan antrian log sebelum worker berhenti"""
+    import db
+    import logging_setup
+    import metrics
+    pending = db.writer.qsize()
+    db.writer.close(timeout=graceful_timeout)
+    server.log.info("Worker %s: antrian DB di-flush (%s batch tertunda)", worker.pid, pending)
+    # Nilai terakhir worker (termasuk baris yang baru di-flush) untuk mark_process_dead
+    metrics.REGISTRY.sync()
+    logging_setup.stop_logging()
+
+
+def child_exit(server, worker):
+    """Counter/histogram worker yang berhenti tetap dihitung di /metrics, gauge-nya dibuang"""
+    import metrics
+    metrics.REGISTRY.mark_process_dead(worker.pid)
@@ -0,0 +1,95 @@
+import logging
+import os
+
+import numpy as np
+from features import FEATURE_NAMES
+
+logger = logging.getLogger('diabetes.inference')
+
+# Lokasi artifact dan nama tampilan tiap model
+MODEL_FILES = {
+    'gb': 'models/model_gb.joblib',
+    'catboost': 'models/model_catboost.cbm',
+    'knn': 'models/model_knn.joblib',
+}
+
+MODEL_LABELS = {
+    'gb': 'Gradient Boosting',
+    'catboost': 'CatBoost',
+    'knn': 'KNN',
+}
+
+
+# MODEL_ENGINE=packed (default): gb dan knn memakai engine tanpa sklearn
+# (gb_engine.py / knn_engine.py) jika file .npz-nya ada dan dibuat dari
+# artifact yang sama; MODEL_ENGINE=sklearn memaksa artifact asli
+MODEL_ENGINE = os.environ.get('MODEL_ENGINE', 'packed')
+
+PACKED_ENGINES = {
+    'gb': ('gb_engine', 'PackedGradientBoosting'),
+    'knn': ('knn_engine', 'PackedKNeighbors'),
+}
+
+
+def _load_packed(key, source_path, packed_path=None):
+    import importlib
+    module_name, class_name = PACKED_ENGINES[key]
+    module = importlib.import_module(module_name)
+    packed_path = packed_path or module.PACKED_PATH
+    if MODEL_ENGINE != 'packed' or not os.path.exists(packed_path):
+        return None
+    engine = getattr(module, class_name).load(packed_path)
+    if engine.source_sha256 != module.file_sha256(source_path):
+        logger.warning("⚠️  %s tidak cocok dengan %s, memakai sklearn (jalankan: python %s.py export)",
+                       packed_path, source_path, module_name)
+        return None
+    return engine
+
+
+def load_model(key, path=None, packed_path=None):
+    """
+    Load satu model; library berat (catboost/sklearn) baru di-import di sini.
+    Tanpa path, gb/knn memakai engine terpaket (tanpa sklearn) jika tersedia;
+    dengan path + packed_path (versi dari manifest), engine dari packed_path.
+    """
+    if key in PACKED_ENGINES and (path is None or packed_path is not None):
+        engine = _load_packed(key, path or MODEL_FILES[key], packed_path)
+        if engine is not None:
+            return engine
+    path = path or MODEL_FILES[key]
+    if key == 'catboost':
+        from catboost import CatBoostClassifier
+        model = CatBoostClassifier()
+        model.load_model(path)
+        # predict_proba menerima matrix numpy berdasarkan posisi kolom, jadi urutannya dicek sekali di sini
+        if list(model.feature_names_) != list(FEATURE_NAMES):
+            raise ValueError(f"Urutan fitur {path} berbeda dengan features.FEATURE_NAMES")
+        return model
+    import joblib
+    return joblib.load(path)
+
+
+def _proba(model, X):
+    # CatBoost: matrix numpy langsung tanpa catboost.Pool per request (urutan
+    # kolom dicek di load_model). dtype input dipertahankan (int64 dari fitur):
+    # KNN sklearn memilih jalur pencarian tetangga berdasarkan dtype, dan
+    # tie-break-nya bisa berbeda
+    return model.predict_proba(np.asarray(X))
+
+
+def predict_one(model, model_name, features):
+    """
+    Prediksi satu input dengan satu panggilan predict_proba.
+    Return (label, probabilitas kelas 1); label = kelas dengan probabilitas
+    tertinggi, sama dengan hasil model.predict.
+    """
+    proba = _proba(model, [features])[0]
+    return int(model.classes_[int(proba[1] > proba[0])]), float(proba[1])
+
+
+def predict_proba_batch(model, model_name, X):
+    """Satu panggilan predict_proba untuk seluruh batch, return (label, probabilitas kelas 1)"""
+    proba = _proba(model, X)
+    # Sama seperti model.predict: kelas dengan probabilitas tertinggi
+    raw_predictions = np.asarray(model.classes_).take(np.argmax(proba, axis=1)).astype(np.int64)
+    return raw_predictions, proba[:, 1]
@@ -0,0 +1,311 @@
+"""
+Engine nearest-neighbour terindeks untuk model KNN (model_knn.joblib).
+
+`export` menyimpan titik training ke models/model_knn_packed.npz: usia, 15 flag
+biner yang dipaket jadi bitmask 15-bit, dan label. `PackedKNeighbors` menjawab
+query satu baris atau batch dari array tersebut tanpa sklearn, dan
+label + probabilitas keluar dari satu pencarian.
+
+Jarak euclidean kuadrat = (usia_q - usia)^2 + popcount(mask_q XOR mask).
+Usia query tidak di-scale (sama dengan service), sehingga suku usia yang
+dominan; indeksnya karena itu diurutkan per usia (kunci utama), dengan
+jarak Hamming bitmask dihitung hanya di dalam rentang usia kandidat:
+1. ambil k+1 titik terdekat usianya → batas jarak B
+2. semua tetangga pasti ada di |usia_q - usia| <= sqrt(B) (dua searchsorted)
+3. jarak tepat dihitung untuk rentang itu saja, lalu pilih k terkecil
+
+Kecocokan dengan sklearn:
+- Himpunan tetangga unik (tanpa seri di batas ke-k) → identik dengan sklearn.
+- Jika jarak ke-k dan ke-(k+1) seri (atau hampir seri), sklearn memilih lewat
+  np.argpartition atas jarak hasil rumus -2xy + x^2 + y^2. Baris seperti itu
+  (±0.05% ruang input form) dihitung ulang dengan rumus dan argpartition yang
+  sama persis, sehingga tetangga dan probabilitas tetap identik.
+
+Pemakaian:
+    python knn_engine.py export
+    python knn_engine.py verify              # seluruh ruang input form
+    python knn_engine.py verify --samples 20000
+"""
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from features import N_FEATURES
+from gb_engine import file_sha256
+
+SOURCE_PATH = 'models/model_knn.joblib'
+PACKED_PATH = 'models/model_knn_packed.npz'
+
+FORMAT_VERSION = 1
+
+N_FLAGS = N_FEATURES - 1
+FLAG_WEIGHTS = 1 << np.arange(N_FLAGS, dtype=np.int32)
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(1 << N_FLAGS)], dtype=np.int32)
+
+# Selisih jarak ke-k dan ke-(k+1) di bawah ini dianggap seri (rounding rumus sklearn)
+TIE_RTOL = 1e-9
+
+# Batch brute-force (baris x titik training) per chunk; training lebih besar
+# dari BRUTE_MAX_TRAIN memakai indeks per baris
+BRUTE_CHUNK_CELLS = 1 << 20
+BRUTE_MAX_TRAIN = 4096
+
+VERIFY_CHUNK_ROWS = 1 << 16
+
+
+def pack_flags(X):
+    """Kolom 1..15 (biner) → bitmask int32; bit i = fitur ke-(i+1)"""
+    return (np.asarray(X)[..., 1:].astype(np.int32) * FLAG_WEIGHTS).sum(axis=-1)
+
+
+def export(model, path=PACKED_PATH, source_path=SOURCE_PATH):
+    """Simpan titik training KNeighborsClassifier ke .npz"""
+    check_supported(model)
+    np.savez(
+        path,
+        format_version=FORMAT_VERSION,
+        source_sha256=file_sha256(source_path),
+        classes=np.asarray(model.classes_),
+        n_neighbors=model.n_neighbors,
+        fit_X=np.asarray(model._fit_X, dtype=np.float64),
+        y=np.asarray(model._y, dtype=np.int64),
+    )
+    return path
+
+
+def check_supported(model):
+    if model.weights != 'uniform' or model.effective_metric_ != 'euclidean':
+        raise ValueError('Hanya KNN euclidean dengan weights=uniform yang didukung')
+    if model._fit_method != 'brute':
+        raise ValueError('Hanya KNN brute-force yang didukung (tie-break mengikuti jalur brute sklearn)')
+    if np.asarray(model._y).ndim != 1:
+        raise ValueError('Hanya KNN satu output yang didukung')
+    flags = np.asarray(model._fit_X)[:, 1:]
+    if not np.isin(flags, (0, 1)).all():
+        raise ValueError('Kolom 1..15 data training harus biner')
+
+
+class PackedKNeighbors:
+    """Pengganti KNeighborsClassifier untuk predict/predict_proba/kneighbors"""
+
+    def __init__(self, classes, n_neighbors, fit_X, y, source_sha256=''):
+        self.classes_ = np.asarray(classes)
+        self.n_neighbors = int(n_neighbors)
+        self.n_features_in_ = fit_X.shape[1]
+        self.source_sha256 = source_sha256
+        self.fit_X = np.ascontiguousarray(fit_X, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.int64)
+        self.n_train = len(self.fit_X)
+        if self.n_train <= self.n_neighbors:
+            raise ValueError('Data training harus lebih banyak dari n_neighbors')
+
+        # Indeks: titik training diurutkan per usia (seri → index asli)
+        order = np.lexsort((np.arange(self.n_train), self.fit_X[:, 0]))
+        self.order = order
+        self.ages = self.fit_X[order, 0]
+        self.masks = pack_flags(self.fit_X)[order]
+        self.labels = self.y[order]
+        self.train_masks = pack_flags(self.fit_X)
+        # ||y||^2 per titik, untuk rumus jarak sklearn di jalur seri
+        self.fit_norms = np.einsum('ij,ij->i', self.fit_X, self.fit_X)
+
+    @classmethod
+    def from_model(cls, model, source_sha256=''):
+        check_supported(model)
+        return cls(model.classes_, model.n_neighbors, model._fit_X, model._y, source_sha256)
+
+    @classmethod
+    def load(cls, path=PACKED_PATH):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        if int(arrays['format_version']) != FORMAT_VERSION:
+            raise ValueError(f'Format {path} tidak didukung, jalankan ulang: python knn_engine.py export')
+        return cls(arrays['classes'], arrays['n_neighbors'], arrays['fit_X'], arrays['y'],
+                   str(arrays['source_sha256']))
+
+    # ✅ Pencarian
+
+    def _ambiguous(self, d2, labels, kth, exact_neighbors):
+        """
+        Apakah pilihan tetangga ke-k bergantung pada tie-break (jarak seri di batas).
+        Tanpa exact_neighbors, seri hanya dihitung jika labelnya berbeda
+        (probabilitas tidak berubah siapa pun yang terpilih).
+        """
+        kth = np.asarray(kth)[..., None]
+        tol = TIE_RTOL * np.maximum(1.0, kth)
+        ambiguous = (d2 <= kth + tol).sum(axis=-1) > self.n_neighbors
+        if not exact_neighbors:
+            near = np.abs(d2 - kth) <= tol
+            n_classes = len(self.classes_)
+            mixed = np.where(near, labels, n_classes).min(axis=-1) != np.where(near, labels, -1).max(axis=-1)
+            ambiguous &= mixed
+        return ambiguous
+
+    def _search_row(self, age, mask, exact_neighbors):
+        """Query satu baris lewat indeks usia; return (d2 (k,), index (k,), ambigu)"""
+        k = self.n_neighbors
+        pos = int(np.searchsorted(self.ages, age))
+        lo, hi = max(0, pos - k - 1), min(self.n_train, pos + k + 1)
+        d2 = (age - self.ages[lo:hi]) ** 2 + POPCOUNT[mask ^ self.masks[lo:hi]]
+        bound = np.partition(d2, k)[k]
+        # Rentang usia yang bisa memuat titik dengan jarak <= bound (+ margin rounding)
+        radius = np.sqrt(bound) * (1 + TIE_RTOL) + TIE_RTOL
+        lo = int(np.searchsorted(self.ages, age - radius, 'left'))
+        hi = int(np.searchsorted(self.ages, age + radius, 'right'))
+        d2 = (age - self.ages[lo:hi]) ** 2 + POPCOUNT[mask ^ self.masks[lo:hi]]
+
+        top = np.argpartition(d2, k - 1)[:k]
+        if exact_neighbors:
+            top = top[np.lexsort((self.order[lo:hi][top], d2[top]))]
+        ambiguous = self._ambiguous(d2, self.labels[lo:hi], d2[top].max(), exact_neighbors)
+        return d2[top], self.order[lo:hi][top], bool(ambiguous)
+
+    def _search_brute(self, ages, masks, exact_neighbors):
+        """Query batch: jarak tepat ke semua titik training, per chunk"""
+        k = self.n_neighbors
+        chunk = max(1, BRUTE_CHUNK_CELLS // self.n_train)
+        out_d2 = np.empty((len(ages), k))
+        out_ind = np.empty((len(ages), k), dtype=np.int64)
+        out_ambiguous = np.empty(len(ages), dtype=bool)
+        for start in range(0, len(ages), chunk):
+            stop = min(start + chunk, len(ages))
+            d2 = (ages[start:stop, None] - self.fit_X[:, 0]) ** 2
+            d2 += POPCOUNT[masks[start:stop, None] ^ self.train_masks]
+            top = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            top_d2 = np.take_along_axis(d2, top, axis=1)
+            if exact_neighbors:
+                order = np.lexsort((top, top_d2), axis=1)
+                top = np.take_along_axis(top, order, axis=1)
+                top_d2 = np.take_along_axis(top_d2, order, axis=1)
+            out_d2[start:stop], out_ind[start:stop] = top_d2, top
+            out_ambiguous[start:stop] = self._ambiguous(d2, self.y, top_d2.max(axis=1), exact_neighbors)
+        return out_d2, out_ind, out_ambiguous
+
+    def _sklearn_neighbors(self, X):
+        """
+        Tetangga persis seperti KNeighborsClassifier brute untuk baris seri:
+        jarak -2xy + x^2 + y^2 (euclidean_distances) lalu np.argpartition.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        dist = -2 * (X @ self.fit_X.T)
+        dist += np.einsum('ij,ij->i', X, X)[:, None]
+        dist += self.fit_norms[None, :]
+        np.maximum(dist, 0, out=dist)
+        rows = np.arange(len(X))[:, None]
+        ind = np.argpartition(dist, self.n_neighbors - 1, axis=1)[:, :self.n_neighbors]
+        ind = ind[rows, np.argsort(dist[rows, ind])]
+        return dist[rows, ind], ind
+
+    def _neighbors(self, X, exact_neighbors=False):
+        """(d2 (n, k), index (n, k)) untuk matrix fitur (n, 16)"""
+        X = np.asarray(X).reshape(-1, self.n_features_in_)
+        ages = X[:, 0].astype(np.float64)
+        # Popcount hanya berlaku untuk flag 0/1; baris lain lewat rumus sklearn
+        binary = ((X[:, 1:] == 0) | (X[:, 1:] == 1)).all(axis=1)
+        masks = pack_flags(np.where(binary[:, None], X, 0))
+
+        if len(X) == 1 or self.n_train > BRUTE_MAX_TRAIN:
+            results = [self._search_row(age, mask, exact_neighbors) for age, mask in zip(ages, masks)]
+            d2 = np.array([r[0] for r in results])
+            ind = np.array([r[1] for r in results])
+            ambiguous = np.array([r[2] for r in results])
+        else:
+            d2, ind, ambiguous = self._search_brute(ages, masks, exact_neighbors)
+
+        redo = ambiguous | ~binary
+        if redo.any():
+            d2[redo], ind[redo] = self._sklearn_neighbors(X[redo])
+        return d2, ind
+
+    def kneighbors(self, X, return_distance=True):
+        # Identitas tetangga harus sama dengan sklearn, termasuk saat seri
+        d2, ind = self._neighbors(X, exact_neighbors=True)
+        return (np.sqrt(d2), ind) if return_distance else ind
+
+    def predict_proba(self, X):
+        _, ind = self._neighbors(X)
+        # weights=uniform: sama dengan sklearn, jumlah suara / total suara
+        votes = self.y[ind]
+        proba = np.zeros((len(ind), len(self.classes_)))
+        for label in range(len(self.classes_)):
+            proba[:, label] = (votes == label).sum(axis=1)
+        proba /= proba.sum(axis=1)[:, None]
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+def form_space():
+    """Seluruh ruang input form: usia 0-120 x 2^15 kombinasi flag"""
+    from lookup_table import AGE_MAX, AGE_MIN, flag_grid
+
+    flags = flag_grid()
+    return np.concatenate([
+        np.column_stack([np.full(len(flags), age), flags]) for age in range(AGE_MIN, AGE_MAX + 1)
+    ])
+
+
+def verify(engine, model, samples=None, seed=0):
+    """
+    Bandingkan himpunan tetangga dan probabilitas engine dengan sklearn.
+    samples=None → seluruh ruang input form. Return (baris berbeda, total).
+    """
+    if samples is None:
+        X = form_space()
+    else:
+        rng = np.random.default_rng(seed)
+        X = np.empty((samples, N_FEATURES), dtype=np.int64)
+        X[:, 0] = rng.integers(1, 121, size=samples)
+        X[:, 1:] = rng.integers(0, 2, size=(samples, N_FEATURES - 1))
+
+    mismatches = 0
+    for start in range(0, len(X), VERIFY_CHUNK_ROWS):
+        chunk = X[start:start + VERIFY_CHUNK_ROWS]
+        expected_ind = np.sort(model.kneighbors(chunk, return_distance=False), axis=1)
+        actual_ind = np.sort(engine.kneighbors(chunk, return_distance=False), axis=1)
+        different = (expected_ind != actual_ind).any(axis=1)
+        different |= (model.predict_proba(chunk) != engine.predict_proba(chunk)).any(axis=1)
+        mismatches += int(different.sum())
+
+    # Jalur satu baris (dipakai /prediksi) dicek pada sebagian baris
+    rng = np.random.default_rng(seed + 1)
+    for i in rng.choice(len(X), size=min(len(X), 5000), replace=False):
+        if not np.array_equal(engine.predict_proba(X[i:i + 1]), model.predict_proba(X[i:i + 1])):
+            mismatches += 1
+    return mismatches, len(X)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export', 'verify'])
+    parser.add_argument('--output', default=PACKED_PATH)
+    parser.add_argument('--samples', type=int, help='Jumlah sampel acak (default: seluruh ruang input)')
+    args = parser.parse_args(argv)
+
+    import joblib
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(SOURCE_PATH)
+
+    if args.command == 'export':
+        export(model, args.output)
+        engine = PackedKNeighbors.load(args.output)
+        print(f"✅ {engine.n_train} titik training, k={engine.n_neighbors} → {args.output}")
+        return 0
+
+    engine = PackedKNeighbors.load(args.output)
+    if engine.source_sha256 != file_sha256(SOURCE_PATH):
+        print(f"❌ {args.output} dibuat dari versi {SOURCE_PATH} yang lain, jalankan export ulang")
+        return 1
+    start = time.perf_counter()
+    mismatches, total = verify(engine, model, args.samples)
+    print(f"{'✅' if mismatches == 0 else '❌'} {total} baris diverifikasi, {mismatches} berbeda "
+          f"({time.perf_counter() - start:.1f}s)")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Logging terstruktur, asinkron dan ter-sampling untuk service prediksi.
+
+- Thread request hanya memasukkan LogRecord ke antrian (tidak pernah blok);
+  formatting dan tulis ke stdout dilakukan satu thread listener per proses.
+  Jika antrian penuh, record dibuang dan dihitung di `dropped`.
+- Output JSON satu baris per record (LOG_FORMAT=json, default) atau teks biasa.
+- Sampling per level, mis. LOG_SAMPLE_RATES="DEBUG=0.01" hanya meneruskan 1%
+  record DEBUG (detail threshold check, payload, dst).
+- Pesan memakai argumen gaya %, jadi string debug tidak pernah dibangun
+  jika levelnya tidak aktif.
+
+Mode development: FLASK_DEBUG=1 → level DEBUG, format teks, tanpa sampling.
+
+Env:
+    LOG_LEVEL          default INFO
+    LOG_FORMAT         json | text
+    LOG_SAMPLE_RATES   default "DEBUG=0.01"
+    LOG_QUEUE_SIZE     default 10000
+
+request_logger() memakai mekanisme antrian yang sama untuk merekam request
+prediksi ke file JSONL (lihat REQUEST_LOG di app.py), yang bisa di-replay
+oleh benchmarks/loadtest.py.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOGGER_NAME = 'diabetes'
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def get_logger(name=None):
+    return logging.getLogger(f'{LOGGER_NAME}.{name}' if name else LOGGER_NAME)
+
+
+def parse_sample_rates(value):
+    """'DEBUG=0.01,INFO=0.5' → {10: 0.01, 20: 0.5}"""
+    rates = {}
+    for part in filter(None, (p.strip() for p in value.split(','))):
+        level_name, _, rate = part.partition('=')
+        level = logging.getLevelName(level_name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f'Level log tidak dikenal: {level_name}')
+        rates[level] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        # Field tambahan dari logger.info(..., extra={...})
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class JsonLineFormatter(logging.Formatter):
+    """record.msg berupa dict → satu baris JSON apa adanya (untuk request log)"""
+
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Teruskan record dengan probabilitas sesuai level-nya"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler non-blocking dengan listener per proses.
+    Listener dibuat ulang otomatis setelah fork (worker gunicorn).
+    """
+
+    def __init__(self, target, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._listener is None or self._pid != os.getpid():
+                self.queue = queue.Queue(self.queue.maxsize)
+                self._listener = logging.handlers.QueueListener(
+                    self.queue, self.target, respect_handler_level=True
+                )
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Formatting ditunda ke thread listener (QueueHandler bawaan memformat di sini)
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+
+
+_handler = None
+_request_handlers = {}
+
+
+def setup_logging(level=None, fmt=None, sample_rates=None, debug=None):
+    """Konfigurasi logger 'diabetes' sekali per proses; aman dipanggil berulang"""
+    global _handler
+    if _handler is not None:
+        return _handler
+
+    if debug is None:
+        debug = os.environ.get('FLASK_DEBUG', '0') == '1'
+    if debug:
+        level, fmt, sample_rates = level or 'DEBUG', fmt or 'text', sample_rates or {}
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    fmt = fmt or os.environ.get('LOG_FORMAT', 'json')
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', 'DEBUG=0.01'))
+
+    stream = logging.StreamHandler(sys.stdout)
+    if fmt == 'json':
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    _handler = AsyncQueueHandler(stream, maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    if sample_rates:
+        _handler.addFilter(SamplingFilter(sample_rates))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+    atexit.register(stop_logging)
+    return _handler
+
+
+def stop_logging():
+    """Tulis sisa record di antrian lalu hentikan listener proses ini"""
+    if _handler is not None:
+        _handler.stop()
+    for handler in _request_handlers.values():
+        handler.stop()
+
+
+def request_logger(path, sample_rate=1.0):
+    """Logger 'diabetes.requests' yang menulis dict per request ke file JSONL"""
+    logger = logging.getLogger(f'{LOGGER_NAME}.requests')
+    if path in _request_handlers:
+        return logger
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    target = logging.FileHandler(path, encoding='utf-8')
+    target.setFormatter(JsonLineFormatter())
+    handler = AsyncQueueHandler(target, maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    if sample_rate < 1.0:
+        handler.addFilter(SamplingFilter({logging.INFO: sample_rate}))
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    logger.propagate = False
+    _request_handlers[path] = handler
+    atexit.register(handler.stop)
+    return logger
@@ -0,0 +1,219 @@
+"""
+Lookup table prediksi untuk seluruh ruang input /prediksi.
+
+Input /prediksi hanya 15 flag biner (gender + 14 gejala) dan usia integer,
+jadi semua kombinasi bisa di-skor sekali secara offline:
+2^15 kombinasi flag x semua usia yang diterima features.parse_age (0-120,
+0 = usia tidak diisi), jadi mode tabel tidak pernah berbeda dari mode model.
+
+Setiap sel menyimpan keputusan akhir (uint8, sudah melalui
+apply_threshold_adjustment) dan probabilitas mentah model (float16).
+Tabel disimpan sebagai file .npy yang di-memory-map, sehingga saat request
+model cukup diganti dengan satu index lookup.
+
+Pemakaian:
+    python lookup_table.py build --model gb               # versi aktif di models/manifest.json
+    python lookup_table.py build --model gb --version v2
+    python lookup_table.py verify --model gb
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from features import AGE_MAX, N_FEATURES
+from inference import MODEL_FILES, predict_one, predict_proba_batch
+from model_registry import active_version, load_manifest, load_version, model_label, version_paths
+from threshold import POLICY_VERSION, apply_threshold_adjustment, apply_threshold_adjustment_batch
+
+# Rentang usia sama dengan features.parse_age (0 = default jika usia tidak diisi);
+# AGE_MAX dari features
+AGE_MIN = 0
+N_FLAGS = N_FEATURES - 1
+N_COMBINATIONS = 1 << N_FLAGS
+
+TABLE_DTYPE = np.dtype([('decision', 'u1'), ('probability', '<f2')])
+
+
+def lookup_table_path(model_key):
+    return f'models/lookup_{model_key}.npy'
+
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def flag_grid():
+    """Matrix (32768, 15) berisi semua kombinasi flag; bit i = fitur ke-(i+1)"""
+    codes = np.arange(N_COMBINATIONS, dtype=np.int64)
+    return ((codes[:, None] >> np.arange(N_FLAGS)) & 1).astype(np.int64)
+
+
+class PredictionTable:
+    """Tabel hasil prediksi yang di-memory-map, lookup O(1) per input"""
+
+    def __init__(self, table, meta):
+        self.table = table
+        self.meta = meta
+        self.model_name = meta['model_name']
+        self.age_min = meta['age_min']
+        self.age_max = meta['age_max']
+        self._weights = (1 << np.arange(N_FLAGS)).astype(np.int64)
+
+    @classmethod
+    def load(cls, path):
+        with open(_meta_path(path)) as f:
+            meta = json.load(f)
+        if meta.get('policy_version') != POLICY_VERSION:
+            raise ValueError(
+                f"Lookup table dibuat dengan policy versi {meta.get('policy_version')}, "
+                f"sekarang versi {POLICY_VERSION}; jalankan ulang lookup_table.py build"
+            )
+        table = np.load(path, mmap_mode='r')
+        return cls(table, meta)
+
+    def lookup(self, features):
+        """Return (prediction, probability) atau None jika usia di luar tabel"""
+        age = features[0]
+        if age < self.age_min or age > self.age_max:
+            return None
+        code = 0
+        for bit, flag in enumerate(features[1:]):
+            if flag:
+                code |= 1 << bit
+        cell = self.table[((age - self.age_min) << N_FLAGS) | code]
+        return int(cell['decision']), float(cell['probability'])
+
+    def lookup_batch(self, X):
+        """Return (predictions, probabilities, in_table) untuk matrix fitur (n, 16)"""
+        X = np.asarray(X, dtype=np.int64)
+        ages = X[:, 0]
+        in_table = (ages >= self.age_min) & (ages <= self.age_max)
+        codes = X[:, 1:] @ self._weights
+        index = ((np.clip(ages, self.age_min, self.age_max) - self.age_min) << N_FLAGS) | codes
+        cells = self.table[index]
+        predictions = cells['decision'].astype(np.int64)
+        probabilities = cells['probability'].astype(np.float64)
+        return predictions, probabilities, in_table
+
+
+def build_table(model, model_key, version, artifact, path, age_min=AGE_MIN, age_max=AGE_MAX):
+    """Skor seluruh grid dan tulis ke file .npy + metadata .json"""
+    # Nama sama dengan jalur model (model_registry), jadi riwayat/statistik mencatat versinya
+    model_name = model_label(model_key, version)
+    flags = flag_grid()
+    n_ages = age_max - age_min + 1
+    table = np.lib.format.open_memmap(
+        path, mode='w+', dtype=TABLE_DTYPE, shape=(n_ages * N_COMBINATIONS,)
+    )
+
+    start = time.perf_counter()
+    X = np.empty((N_COMBINATIONS, N_FEATURES), dtype=np.int64)
+    X[:, 1:] = flags
+    for offset, age in enumerate(range(age_min, age_max + 1)):
+        X[:, 0] = age
+        raw_predictions, raw_probabilities = predict_proba_batch(model, model_name, X)
+        predictions, probabilities = apply_threshold_adjustment_batch(
+            raw_predictions, raw_probabilities, X
+        )
+        block = table[offset * N_COMBINATIONS:(offset + 1) * N_COMBINATIONS]
+        block['decision'] = predictions
+        block['probability'] = probabilities
+        print(f"\r🔧 Usia {age}/{age_max}", end='', file=sys.stderr)
+    table.flush()
+    print(file=sys.stderr)
+
+    meta = {
+        'model_key': model_key,
+        'model_name': model_name,
+        'model_version': version,
+        'model_sha256': _file_sha256(artifact),
+        'age_min': age_min,
+        'age_max': age_max,
+        'policy_version': POLICY_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    with open(_meta_path(path), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"✅ Tabel {path} ditulis: {table.size} sel, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB, {time.perf_counter() - start:.1f}s")
+    return PredictionTable(np.load(path, mmap_mode='r'), meta)
+
+
+def _live_prediction(model, model_name, features):
+    """Prediksi satu input persis seperti jalur model di /prediksi"""
+    raw_prediction, raw_probability = predict_one(model, model_name, features)
+    return apply_threshold_adjustment(raw_prediction, raw_probability, features, model_name)
+
+
+def verify_table(table, model, samples=2000, seed=0):
+    """Bandingkan tabel dengan output model live untuk sampel acak dari grid"""
+    rng = np.random.default_rng(seed)
+    ages = rng.integers(table.age_min, table.age_max + 1, size=samples)
+    codes = rng.integers(0, N_COMBINATIONS, size=samples)
+    # Probabilitas float16 punya presisi relatif ~1e-3
+    tolerance = float(np.finfo(np.float16).eps)
+
+    mismatches = 0
+    worst = 0.0
+    for age, code in zip(ages, codes):
+        features = [int(age)] + [int((code >> bit) & 1) for bit in range(N_FLAGS)]
+        expected_prediction, expected_probability = _live_prediction(model, table.model_name, features)
+        prediction, probability = table.lookup(features)
+        error = abs(probability - float(expected_probability))
+        worst = max(worst, error)
+        if prediction != int(expected_prediction) or error > tolerance:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"❌ Mismatch {features}: tabel=({prediction}, {probability:.4f}) "
+                      f"model=({int(expected_prediction)}, {float(expected_probability):.4f})")
+
+    print(f"🔍 Verifikasi {samples} sampel: {mismatches} mismatch, "
+          f"selisih probabilitas maksimum {worst:.2e}")
+    return mismatches == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['build', 'verify'])
+    parser.add_argument('--model', choices=sorted(MODEL_FILES), default='gb')
+    parser.add_argument('--version', help='Versi model di manifest (build: default versi aktif)')
+    parser.add_argument('--output', help='Path file .npy (default: models/lookup_<model>.npy)')
+    parser.add_argument('--samples', type=int, default=2000, help='Jumlah sampel verifikasi')
+    args = parser.parse_args(argv)
+
+    path = args.output or lookup_table_path(args.model)
+    manifest = load_manifest()
+    if args.command == 'build':
+        version = args.version or active_version(manifest, args.model)
+    else:
+        table = PredictionTable.load(path)
+        # Tabel lama (tanpa model_version) dibuat dari artifact versi awal
+        version = args.version or table.meta.get('model_version', 'v1')
+    artifact = version_paths(manifest, args.model, version)[0]
+    model = load_version(args.model, version, manifest)
+
+    if args.command == 'build':
+        table = build_table(model, args.model, version, artifact, path)
+    elif table.meta['model_sha256'] != _file_sha256(artifact):
+        print("⚠️  Artifact model berubah sejak tabel dibuat")
+
+    return 0 if verify_table(table, model, samples=args.samples) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Pindahkan riwayat prediksi dari file SQLite per pod ke store bersama (DATABASE_URL).
+
+Sumber baris di SQLite lokal saat store bersama aktif:
+- riwayat lama tiap pod dari sebelum DATABASE_URL diisi,
+- batch yang ditulis writer ke SQLite lokal saat store tidak bisa dihubungi.
+
+Baris dibaca per MERGE_BATCH_ROWS (urut id), dikirim ke store dengan
+sumber = id unik file (tabel merge_sumber) dan sumber_id = id lokal, lalu
+dihapus dari file lokal. Jika proses berhenti di antaranya, batch yang sama
+dikirim ulang dan dilewati store (unik per (sumber, sumber_id)), jadi tidak
+ada baris ganda atau hilang. File arsip retensi (.ndjson.gz) tidak ikut.
+
+Batch yang ditolak store karena nilainya (DataError, mis. usia di luar
+INTEGER Postgres) dikirim ulang per baris; baris yang tetap ditolak
+dipindah ke tabel merge_karantina di file yang sama beserta alasannya,
+jadi satu baris rusak tidak menahan merge selamanya.
+
+Pemakaian:
+    python merge.py run                        # DB_PATH pod ini → DATABASE_URL
+    python merge.py run pod-a.db pod-b.db      # salinan file dari volume pod lain
+    python merge.py status [file ...]
+Di service: jika DATABASE_URL diisi, MERGE_INTERVAL (detik, default 60)
+menjalankan `run` untuk DB_PATH berkala di background.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+import db
+from aggregates import init_aggregates
+from schema import ModelNames, migrate, schema_version
+
+logger = logging.getLogger('diabetes.merge')
+
+DEFAULT_MERGE_INTERVAL = 60
+MERGE_BATCH_ROWS = int(os.environ.get('MERGE_BATCH_ROWS', 1000))
+MERGE_PAUSE_MS = int(os.environ.get('MERGE_PAUSE_MS', 20))
+
+
+def source_id(conn):
+    """Id acak yang disimpan di file itu sendiri, tetap sama walau nama pod berganti"""
+    with conn:
+        conn.execute('CREATE TABLE IF NOT EXISTS merge_sumber (id TEXT NOT NULL)')
+        row = conn.execute('SELECT id FROM merge_sumber').fetchone()
+        if row is None:
+            row = (uuid.uuid4().hex,)
+            conn.execute('INSERT INTO merge_sumber (id) VALUES (?)', row)
+    return row[0]
+
+
+QUARANTINE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS merge_karantina (
+        id INTEGER PRIMARY KEY,
+        usia INTEGER,
+        fitur INTEGER,
+        fitur_null INTEGER,
+        fitur_lain TEXT,
+        hasil_prediksi INTEGER,
+        probabilitas REAL,
+        model_id INTEGER,
+        waktu_prediksi DATETIME,
+        alasan TEXT,
+        waktu_karantina DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def pending(conn):
+    return conn.execute('SELECT COUNT(*) FROM prediksi').fetchone()[0]
+
+
+def quarantined(conn):
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'merge_karantina'").fetchone() is None:
+        return 0
+    return conn.execute('SELECT COUNT(*) FROM merge_karantina').fetchone()[0]
+
+
+def _write_rows(store, rows, values, sumber):
+    """Batch ditolak store: kirim per baris; return [(id, alasan)] baris yang tetap ditolak"""
+    rejected = []
+    for row, value in zip(rows, values):
+        try:
+            store.write([value], sumber=sumber, sumber_ids=[row[0]])
+        except store.DataError as e:
+            rejected.append((row[0], str(e).strip()))
+    return rejected
+
+
+def merge_file(conn, store, batch_rows=MERGE_BATCH_ROWS, pause_ms=MERGE_PAUSE_MS):
+    """Kirim semua baris prediksi di conn ke store lalu hapus dari conn; return jumlah baris"""
+    if schema_version(conn) == 1:
+        # File lama dari pod lain: ke skema ringkas dulu (in-place)
+        migrate(conn)
+    # Trigger agregat lokal harus ada karena baris dihapus setelah dikirim
+    init_aggregates(conn)
+    sumber = source_id(conn)
+    # Cache per file: model_id lokal tiap file berbeda
+    names = ModelNames()
+    merged = 0
+    while True:
+        rows = conn.execute(f'{db.STORED_SELECT} ORDER BY id LIMIT ?', (batch_rows,)).fetchall()
+        if not rows:
+            break
+        values = [(*row[1:7], names.get(conn, row[7]), row[8]) for row in rows]
+        rejected = []
+        try:
+            store.write(values, sumber=sumber, sumber_ids=[row[0] for row in rows])
+        except store.DataError as e:
+            logger.warning("⚠️  Batch id %d-%d ditolak %s (%s), dikirim per baris",
+                           rows[0][0], rows[-1][0], store.name, str(e).strip())
+            rejected = _write_rows(store, rows, values, sumber)
+        # Baru dihapus setelah store commit; writer lokal hanya menambah id yang lebih besar
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if rejected:
+                conn.execute(QUARANTINE_TABLE_SQL)
+                conn.executemany(f'''
+                    INSERT OR REPLACE INTO merge_karantina ({', '.join(db.STORED_COLUMNS)}, alasan)
+                    SELECT {', '.join(db.STORED_COLUMNS)}, ? FROM prediksi WHERE id = ?
+                ''', [(alasan, row_id) for row_id, alasan in rejected])
+            conn.execute('DELETE FROM prediksi WHERE id <= ?', (rows[-1][0],))
+        for row_id, alasan in rejected:
+            logger.error("❌ Baris id %d ditolak %s, dipindah ke merge_karantina: %s", row_id, store.name, alasan)
+        merged += len(rows) - len(rejected)
+        if len(rows) < batch_rows:
+            break
+        time.sleep(pause_ms / 1000)
+    return merged
+
+
+@contextlib.contextmanager
+def _run_lock():
+    """Lock antar worker: hanya satu proses per pod yang menjalankan merge pada satu waktu"""
+    import fcntl
+    with open(db.DB_PATH + '.merge.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class MergeScheduler:
+    """Merge DB_PATH ke db.store setiap interval detik di thread background (per proses, lazy)"""
+
+    def __init__(self, interval=DEFAULT_MERGE_INTERVAL):
+        self.interval = interval
+        self.merged = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self.interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            # Thread tidak ikut ter-copy saat fork, jadi dicek per proses
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name='merge', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with _run_lock() as acquired:
+                    if acquired:
+                        self.run_once()
+            except Exception as e:
+                logger.error("❌ Error merge ke %s: %s", db.store.name, e)
+
+    def run_once(self):
+        conn = db.connect()
+        try:
+            if pending(conn):
+                count = merge_file(conn, db.store)
+                self.merged += count
+                logger.info("✅ %d baris SQLite lokal dipindah ke %s", count, db.store.name)
+        finally:
+            conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['run', 'status'])
+    parser.add_argument('files', nargs='*', help='File SQLite sumber (default: DB_PATH)')
+    parser.add_argument('--batch-rows', type=int, default=MERGE_BATCH_ROWS)
+    args = parser.parse_args(argv)
+
+    paths = args.files or [db.DB_PATH]
+    if args.command == 'status':
+        for path in paths:
+            conn = db.connect(path)
+            print(f"📦 {path}: {pending(conn)} baris menunggu merge, {quarantined(conn)} di karantina")
+            conn.close()
+        return 0
+
+    if db.store is db.local:
+        print("❌ DATABASE_URL belum diisi: tidak ada store bersama tujuan merge")
+        return 1
+    db.store.init()
+    failed = 0
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"❌ {path} tidak ditemukan")
+            failed += 1
+            continue
+        conn = db.connect(path)
+        try:
+            with _run_lock() if path == db.DB_PATH else contextlib.nullcontext(True) as acquired:
+                if not acquired:
+                    print(f"⚠️  {path}: merge sedang berjalan di proses lain")
+                    continue
+                start, before = time.perf_counter(), quarantined(conn)
+                count = merge_file(conn, db.store, args.batch_rows)
+                print(f"✅ {path}: {count} baris → {db.store.name} ({time.perf_counter() - start:.1f}s)")
+                if quarantined(conn) > before:
+                    print(f"⚠️  {path}: {quarantined(conn) - before} baris ditolak {db.store.name}, lihat tabel merge_karantina")
+        finally:
+            conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""
+Registry metrik in-process dengan format text exposition Prometheus.
+
+Sengaja tanpa dependency tambahan: satu lock per metrik dan bucket histogram
+dicari dengan bisect, sehingga overhead per observasi hanya beberapa mikrodetik.
+Endpoint /metrics merender semua metrik yang terdaftar di REGISTRY.
+
+Beberapa worker gunicorn: jika PROMETHEUS_MULTIPROC_DIR diisi (default di
+gunicorn.conf.py), tiap proses menyimpan nilainya ke <dir>/<pid>.json setiap
+METRICS_SYNC_INTERVAL detik, dan /metrics menjumlahkan semua file saat scrape,
+jadi worker mana pun yang menjawab memberi angka yang sama (worker lain paling
+lambat METRICS_SYNC_INTERVAL detik). Counter/histogram worker yang berhenti
+digabung ke dead.json oleh master (mark_process_dead di child_exit), gauge-nya
+dibuang. Tanpa PROMETHEUS_MULTIPROC_DIR registry hanya per proses.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('diabetes.metrics')
+
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+SYNC_INTERVAL = float(os.environ.get('METRICS_SYNC_INTERVAL', 1))
+DEAD_FILE = 'dead.json'
+
+# Bucket default (detik) untuk latency per request / per tahap
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _dump(path, data):
+    """Tulis atomik: pembaca file tidak pernah melihat JSON setengah jadi"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def _merge(target, metric, items):
+    """Tambah pasangan [label, nilai] dari file ke state {label: nilai} milik metric"""
+    for key, value in items:
+        key = tuple(key)
+        target[key] = metric._combine(target[key], value) if key in target else value
+
+
+class Registry:
+    def __init__(self, directory=MULTIPROC_DIR):
+        self._metrics = []
+        self.directory = directory
+        self._sync_pid = None
+        self._sync_lock = threading.Lock()
+        if directory:
+            # Master (preload) menyimpan nilainya sebelum fork; worker mulai dari nol
+            os.register_at_fork(before=self.sync, after_in_child=self._reset)
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        states = self._collect() if self.directory else {m.name: m._state() for m in self._metrics}
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric._render(states.get(metric.name, {})))
+        return '\n'.join(lines) + '\n'
+
+    def _snapshot(self):
+        return {m.name: [[list(key), value] for key, value in m._state().items()] for m in self._metrics}
+
+    def _reset(self):
+        for metric in self._metrics:
+            metric._reset()
+
+    def sync(self):
+        """Simpan nilai proses ini ke <dir>/<pid>.json"""
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            _dump(os.path.join(self.directory, f'{os.getpid()}.json'), self._snapshot())
+
+    def _collect(self):
+        """Jumlahkan file semua proses (termasuk dead.json) → {nama metrik: state}"""
+        self.sync()
+        states = {m.name: {} for m in self._metrics}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                data = _load(path)
+            except FileNotFoundError:
+                # Worker baru saja digabung ke dead.json oleh master
+                continue
+            for metric in self._metrics:
+                _merge(states[metric.name], metric, data.get(metric.name, ()))
+        return states
+
+    def ensure_sync(self):
+        """Thread sync per proses, dimulai lazy (thread tidak ikut ter-fork)"""
+        if not self.directory or self._sync_pid == os.getpid():
+            return
+        with self._sync_lock:
+            if self._sync_pid != os.getpid():
+                self._sync_pid = os.getpid()
+                threading.Thread(target=self._sync_loop, name='metrics-sync', daemon=True).start()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(SYNC_INTERVAL)
+            try:
+                self.sync()
+            except OSError as e:
+                logger.error("❌ Gagal menyimpan metrik ke %s: %s", self.directory, e)
+
+    def clear(self):
+        """Hapus file dari run sebelumnya (master, sebelum worker pertama dibuat)"""
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            for path in glob.glob(os.path.join(self.directory, '*.json*')):
+                os.remove(path)
+
+    def mark_process_dead(self, pid):
+        """Gabung counter/histogram proses pid ke dead.json dan buang gauge-nya (master saja)"""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'{pid}.json')
+        dead_path = os.path.join(self.directory, DEAD_FILE)
+        try:
+            data = _load(path)
+        except FileNotFoundError:
+            return
+        dead = _load(dead_path) if os.path.exists(dead_path) else {}
+        for metric in self._metrics:
+            if metric.kind == 'gauge':
+                continue
+            state = {tuple(key): value for key, value in dead.get(metric.name, ())}
+            _merge(state, metric, data.get(metric.name, ()))
+            dead[metric.name] = [[list(key), value] for key, value in state.items()]
+        # dead.json ditulis dulu: jika mati di antaranya, file pid ikut dihitung dua kali (bukan hilang)
+        _dump(dead_path, dead)
+        os.remove(path)
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} butuh label {self.labelnames}')
+        return tuple(str(value) for value in labels)
+
+    def samples(self):
+        return self._render(self._state())
+
+    @staticmethod
+    def _combine(a, b):
+        return a + b
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _state(self):
+        with self._lock:
+            return dict(self._values)
+
+    def _reset(self):
+        with self._lock:
+            self._values = {}
+
+    def _render(self, state):
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in sorted(state.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Gauge biasa, atau dibaca dari fungsi saat scrape lewat set_function()"""
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._value = 0
+        self._function = None
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def _state(self):
+        return {(): self._function() if self._function is not None else self._value}
+
+    def _reset(self):
+        with self._lock:
+            self._value = 0
+
+    def _render(self, state):
+        return [f'{self.name} {_format_value(state.get((), 0))}']
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [count per bucket (+Inf terakhir), sum]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        """{labels: (count, sum)} — dipakai benchmark untuk timing per tahap"""
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._series.items()}
+
+    def _state(self):
+        # [count per bucket, sum] — list supaya sama persis setelah lewat JSON
+        with self._lock:
+            return {key: [list(counts), total] for key, (counts, total) in self._series.items()}
+
+    def _reset(self):
+        with self._lock:
+            self._series = {}
+
+    @staticmethod
+    def _combine(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+    def _render(self, state):
+        lines = []
+        for key, (counts, total) in sorted(state.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+# ✅ Metrik aplikasi prediksi
+REQUEST_LATENCY = Histogram(
+    'prediksi_request_duration_seconds', 'Latency request per endpoint', labelnames=('endpoint',)
+)
+STAGE_LATENCY = Histogram(
+    'prediksi_stage_duration_seconds',
+    'Latency per tahap prediksi (parse, features, cache, inference, threshold, db_enqueue)',
+    labelnames=('endpoint', 'stage'),
+)
+PREDICTIONS = Counter(
+    'prediksi_predictions_total', 'Jumlah prediksi per model dan hasil', labelnames=('model', 'result')
+)
+FALLBACKS = Counter(
+    'prediksi_fallback_total', 'Jumlah prediksi yang memakai logika fallback', labelnames=('reason',)
+)
+CACHE_LOOKUPS = Counter(
+    'prediksi_cache_lookups_total', 'Lookup cache prediksi (hit/miss)', labelnames=('result',)
+)
+MODEL_LATENCY = Histogram(
+    'prediksi_model_duration_seconds', 'Latency inference per model anggota ensemble', labelnames=('model',)
+)
+ENSEMBLE_DROPPED = Counter(
+    'prediksi_ensemble_dropped_total', 'Model yang dikeluarkan dari voting ensemble (timeout/busy/error)',
+    labelnames=('model', 'reason'),
+)
+MODEL_RELOADS = Counter(
+    'prediksi_model_reloads_total', 'Reload versi model (ok/failed)', labelnames=('model', 'result')
+)
+IN_FLIGHT = Gauge('prediksi_requests_in_flight', 'Request yang sedang diproses')
+DB_QUEUE_DEPTH = Gauge('prediksi_db_queue_depth', 'Batch insert yang menunggu di antrian writer')
+DB_ROWS_WRITTEN = Counter(
+    'prediksi_db_rows_written_total',
+    'Baris prediksi yang ditulis writer per tujuan (sqlite/postgres, spill = buffer lokal, lost = gagal)',
+    labelnames=('target',),
+)
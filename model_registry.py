@@ -0,0 +1,550 @@
+"""
+Registry model dengan lazy + parallel loading dan versi model.
+
+Hanya model yang dipilih lewat env MODELS (default "gb") yang di-load;
+library berat (sklearn/catboost) baru di-import saat model tersebut di-load.
+Beberapa model di-load paralel di thread terpisah, dan registry langsung
+"ready" begitu model dengan prioritas tertinggi yang berhasil dimuat tersedia,
+tanpa menunggu model lain selesai.
+
+Urutan di MODELS sekaligus urutan prioritas, contoh:
+    MODELS=gb                → hanya Gradient Boosting
+    MODELS=gb,catboost       → GB aktif, CatBoost cadangan jika GB gagal dimuat
+
+Versi artifact dicatat di models/manifest.json (env MODEL_MANIFEST): versi
+aktif per model + daftar versi (file artifact, engine terpaket, sha256).
+Versi baru di-load di thread samping, di-warm-up dengan baris contoh dari
+models/data_clean.csv, lalu referensi model ditukar atomik; request yang
+sedang berjalan tetap memakai snapshot model lama. Nama model yang disimpan
+di model_digunakan berisi versi, contoh "Gradient Boosting v2".
+
+Ganti versi tanpa restart pod:
+    python model_registry.py publish gb model_baru.joblib --activate
+    python model_registry.py activate gb v1          # rollback
+    python model_registry.py list
+Setiap worker memantau manifest (MODEL_WATCH_INTERVAL detik), atau panggil
+POST /admin/model/reload untuk reload langsung.
+
+Manifest dibaca dari filesystem pod sendiri: di k8s/be.yaml models/ berasal
+dari image (tanpa volume bersama), jadi activate/reload hanya mengganti versi
+di pod itu dan replika lain tetap di versi lama. Rollout ke semua replika:
+publish + activate sebelum docker build, lalu
+    kubectl set image deployment/diabetes-be diabetes-app=<image baru>
+(rollback = kubectl rollout undo deployment/diabetes-be).
+"""
+import argparse
+import contextlib
+import csv
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+
+import metrics
+from features import FEATURE_NAMES
+from gb_engine import file_sha256
+from inference import MODEL_FILES, MODEL_LABELS, PACKED_ENGINES, load_model, predict_one, predict_proba_batch
+
+DEFAULT_MODELS = 'gb'
+
+MANIFEST_PATH = os.environ.get('MODEL_MANIFEST', 'models/manifest.json')
+MANIFEST_FORMAT_VERSION = 1
+
+# Interval cek perubahan manifest per worker (detik, 0 = mati)
+DEFAULT_WATCH_INTERVAL = 5.0
+
+# Warm-up: baris contoh dari data training, dijalankan lewat jalur /prediksi
+# dan /prediksi/batch sebelum versi baru menerima traffic
+WARMUP_DATA = 'models/data_clean.csv'
+WARMUP_ROWS = 64
+# Age di data_clean.csv sudah distandarisasi; dikembalikan ke tahun dengan
+# statistik usia dataset asli (diabetes_data_upload.csv) karena form mengirim usia mentah
+WARMUP_AGE_MEAN = 48.0
+WARMUP_AGE_STD = 12.1
+
+logger = logging.getLogger('diabetes.models')
+
+
+def parse_model_names(value):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in MODEL_FILES]
+    if unknown:
+        raise ValueError(f"Model tidak dikenal: {', '.join(unknown)} (pilihan: {', '.join(MODEL_FILES)})")
+    return list(dict.fromkeys(names))
+
+
+def rss_mb():
+    """Resident memory proses ini dalam MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss adalah puncak (KB di Linux), cukup sebagai perkiraan
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ✅ MANIFEST VERSI MODEL
+
+def default_manifest():
+    """Manifest untuk artifact bawaan (models/*) jika manifest.json tidak ada"""
+    import importlib
+    models = {}
+    for key, path in MODEL_FILES.items():
+        version = {'artifact': os.path.basename(path)}
+        if key in PACKED_ENGINES:
+            version['packed'] = os.path.basename(importlib.import_module(PACKED_ENGINES[key][0]).PACKED_PATH)
+        models[key] = {'active': 'v1', 'versions': {'v1': version}}
+    return {'format_version': MANIFEST_FORMAT_VERSION, 'models': models}
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return default_manifest()
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != MANIFEST_FORMAT_VERSION:
+        raise ValueError(f"Format manifest {path} tidak didukung")
+    return manifest
+
+
+def manifest_stamp(path=MANIFEST_PATH):
+    """Penanda perubahan manifest yang murah (tanpa membaca isi file)"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def active_version(manifest, key):
+    return manifest['models'][key]['active']
+
+
+def version_paths(manifest, key, version, manifest_path=MANIFEST_PATH):
+    """(path artifact, path engine terpaket atau None, sha256 atau None) dari satu versi"""
+    versions = manifest['models'][key]['versions']
+    if version not in versions:
+        raise ValueError(f"Versi {version} untuk model {key} tidak ada di manifest (pilihan: {', '.join(versions)})")
+    entry = versions[version]
+    base = os.path.dirname(manifest_path)
+    packed = os.path.join(base, entry['packed']) if entry.get('packed') else None
+    return os.path.join(base, entry['artifact']), packed, entry.get('sha256')
+
+
+@contextlib.contextmanager
+def _manifest_lock(path):
+    """Lock antar proses/pod untuk read-modify-write manifest"""
+    import fcntl
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _write_manifest(manifest, path):
+    # Tulis ke file sementara lalu os.replace: watcher tidak pernah membaca file setengah jadi
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def update_manifest(change, path=MANIFEST_PATH):
+    """Jalankan change(manifest) di bawah lock lalu simpan atomik; return manifest baru"""
+    with _manifest_lock(path):
+        manifest = load_manifest(path)
+        change(manifest)
+        _write_manifest(manifest, path)
+    return manifest
+
+
+def activate_version(key, version, path=MANIFEST_PATH):
+    """Jadikan versi yang sudah terdaftar sebagai versi aktif di manifest"""
+    def change(manifest):
+        version_paths(manifest, key, version, path)
+        manifest['models'][key]['active'] = version
+    return update_manifest(change, path)
+
+
+def load_version(key, version, manifest=None, manifest_path=MANIFEST_PATH):
+    """Load artifact satu versi; sha256 dicek supaya file yang belum selesai disalin ditolak"""
+    manifest = manifest or load_manifest(manifest_path)
+    artifact, packed, sha256 = version_paths(manifest, key, version, manifest_path)
+    if sha256 and file_sha256(artifact) != sha256:
+        raise ValueError(f"sha256 {artifact} tidak cocok dengan manifest")
+    return load_model(key, artifact, packed)
+
+
+@lru_cache(maxsize=1)
+def warmup_matrix(path=WARMUP_DATA, rows=WARMUP_ROWS):
+    """Baris contoh dari data_clean.csv dalam bentuk input service (usia integer, flag 0/1)"""
+    X = []
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            age = round(WARMUP_AGE_MEAN + float(row['Age']) * WARMUP_AGE_STD)
+            X.append([min(max(age, 1), 120)] + [int(row[name] == 'True') for name in FEATURE_NAMES[1:]])
+            if len(X) == rows:
+                break
+    return np.array(X, dtype=np.int64)
+
+
+def warm_up(label, model, X=None):
+    """
+    Jalankan model pada baris contoh lewat jalur satu baris dan jalur batch
+    (import lazy, cache internal, alokasi pertama). Return durasi (detik);
+    raise jika probabilitas tidak valid.
+    """
+    X = warmup_matrix() if X is None else X
+    start = time.perf_counter()
+    for row in X:
+        predict_one(model, label, row.tolist())
+    _, probabilities = predict_proba_batch(model, label, X)
+    if not np.all((probabilities >= 0) & (probabilities <= 1)):
+        raise ValueError(f"Warm-up {label}: probabilitas di luar [0, 1]")
+    return time.perf_counter() - start
+
+
+def model_label(key, version):
+    """Nama tampilan + versi, disimpan di model_digunakan"""
+    return f"{MODEL_LABELS[key]} {version}"
+
+
+class ModelRegistry:
+    def __init__(self, names=None, manifest_path=MANIFEST_PATH, watch_interval=DEFAULT_WATCH_INTERVAL):
+        self.names = parse_model_names(os.environ.get('MODELS', DEFAULT_MODELS) if names is None else names)
+        self.manifest_path = manifest_path
+        self.watch_interval = watch_interval
+        self.models = {}
+        self.versions = {}
+        self.stats = {name: {'state': 'pending'} for name in self.names}
+        self.state = 'idle'
+        self.started_at = None
+        self.ready_seconds = None
+        self._active = (None, "Tidak Ada", None)
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        # Reload (admin endpoint / watcher) dijalankan satu per satu
+        self._reload_lock = threading.Lock()
+        self._thread = None
+        self._watcher = None
+        self._watcher_pid = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """callback(key, nama) dipanggil setiap kali model aktif berganti"""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        key, label, _ = self._active
+        for callback in self._listeners:
+            callback(key, label)
+
+    def start(self, wait=False):
+        """Mulai load semua model terpilih di background"""
+        if self._thread is None:
+            self.started_at = time.perf_counter()
+            self.state = 'loading'
+            self._thread = threading.Thread(target=self._load_all, name='model-loader', daemon=True)
+            self._thread.start()
+        if wait:
+            self._thread.join()
+        return self
+
+    def _load_all(self):
+        if not self.names:
+            self._select()
+            return
+        try:
+            manifest = load_manifest(self.manifest_path)
+        except Exception as e:
+            logger.error("❌ Error manifest %s: %s", self.manifest_path, e)
+            manifest = default_manifest()
+        with ThreadPoolExecutor(max_workers=len(self.names), thread_name_prefix='model-load') as pool:
+            for name in self.names:
+                pool.submit(self._load_one, name, manifest)
+
+    def _load_version(self, name, version, manifest):
+        """Load + warm-up satu versi; return (model, stats)"""
+        start = time.perf_counter()
+        rss_before = rss_mb()
+        model = load_version(name, version, manifest, self.manifest_path)
+        load_seconds = time.perf_counter() - start
+        warmup_seconds = warm_up(model_label(name, version), model)
+        return model, {
+            'state': 'loaded',
+            'version': version,
+            'load_seconds': round(load_seconds, 3),
+            'warmup_seconds': round(warmup_seconds, 3),
+            # Dengan load paralel, delta RSS per model hanya perkiraan
+            'rss_delta_mb': round(rss_mb() - rss_before, 1),
+        }
+
+    def _load_one(self, name, manifest):
+        start = time.perf_counter()
+        version = active_version(manifest, name)
+        try:
+            model, stats = self._load_version(name, version, manifest)
+        except Exception as e:
+            logger.error("❌ Error model %s: %s", model_label(name, version), e)
+            stats = {'state': 'failed', 'version': version, 'error': str(e),
+                     'load_seconds': round(time.perf_counter() - start, 3)}
+        else:
+            logger.info("✅ Model %s dimuat (%.2fs)", model_label(name, version), time.perf_counter() - start)
+        with self._lock:
+            if stats['state'] == 'loaded':
+                self.models[name] = model
+                self.versions[name] = version
+            self.stats[name] = stats
+        self._select()
+
+    def _label(self, name):
+        return model_label(name, self.versions[name])
+
+    def _select(self):
+        """Aktifkan model prioritas tertinggi begitu statusnya sudah pasti"""
+        with self._lock:
+            if self._ready.is_set():
+                return
+            for name in self.names:
+                state = self.stats[name]['state']
+                if state == 'pending':
+                    return
+                if state == 'loaded':
+                    self._active = (name, self._label(name), self.models[name])
+                    self.state = 'ready'
+                    break
+            else:
+                self.state = 'fallback'
+            self.ready_seconds = round(time.perf_counter() - self.started_at, 3)
+            self._ready.set()
+        logger.info("🎯 Menggunakan model: %s (siap dalam %.2fs)", self._active[1], self.ready_seconds)
+        self._notify()
+
+    # ✅ HOT RELOAD
+
+    def reload(self, name, version=None, wait=False):
+        """
+        Load versi model (default: versi aktif di manifest) di thread samping,
+        warm-up, lalu tukar atomik. wait=True → tunggu dan return hasilnya.
+        """
+        if name not in self.names:
+            raise ValueError(f"Model {name} tidak dimuat di service ini (MODELS={','.join(self.names)})")
+        if not self.is_ready():
+            raise RuntimeError("Model awal belum selesai di-load")
+        result = {}
+        thread = threading.Thread(
+            target=lambda: result.update(self._reload_one(name, version)), name=f'model-reload-{name}', daemon=True
+        )
+        thread.start()
+        if wait:
+            thread.join()
+            return result
+        return {'model': name, 'version': version, 'state': 'loading'}
+
+    def _reload_one(self, name, version=None):
+        with self._reload_lock:
+            start = time.perf_counter()
+            try:
+                manifest = load_manifest(self.manifest_path)
+                version = version or active_version(manifest, name)
+                if version == self.versions.get(name):
+                    return {'model': name, 'version': version, 'state': 'unchanged'}
+                model, stats = self._load_version(name, version, manifest)
+            except Exception as e:
+                logger.error("❌ Reload %s versi %s gagal, tetap memakai versi lama: %s", name, version, e)
+                metrics.MODEL_RELOADS.inc(name, 'failed')
+                result = {'model': name, 'version': version, 'state': 'failed', 'error': str(e)}
+                with self._lock:
+                    self.stats[name]['last_reload'] = result
+                return result
+            previous = self._swap(name, version, model, stats)
+            metrics.MODEL_RELOADS.inc(name, 'ok')
+            result = {'model': name, 'version': version, 'previous_version': previous, 'state': 'ok',
+                      'seconds': round(time.perf_counter() - start, 3)}
+            with self._lock:
+                self.stats[name]['last_reload'] = result
+            logger.info("🔄 Model %s diganti: %s → %s (%.2fs)", MODEL_LABELS[name], previous, version, result['seconds'])
+            return result
+
+    def _swap(self, name, version, model, stats):
+        """Tukar referensi model; request berikutnya memakai versi baru"""
+        with self._lock:
+            previous = self.versions.get(name)
+            self.models[name] = model
+            self.versions[name] = version
+            self.stats[name] = stats
+            active_before = self._active
+            best = next(n for n in self.names if n in self.models)
+            # Satu assignment tuple: request yang membaca active() tidak pernah melihat
+            # kombinasi nama/model yang setengah diganti
+            self._active = (best, self._label(best), self.models[best])
+            self.state = 'ready'
+        if self._active[1] != active_before[1]:
+            self._notify()
+        return previous
+
+    def sync(self):
+        """Reload setiap model yang versi aktifnya di manifest berbeda dengan yang dimuat"""
+        manifest = load_manifest(self.manifest_path)
+        return [
+            self._reload_one(name, active_version(manifest, name))
+            for name in self.names
+            if active_version(manifest, name) != self.versions.get(name)
+        ]
+
+    def ensure_watcher(self):
+        """Mulai thread pemantau manifest di proses ini (dipanggil per request, murah)"""
+        if self.watch_interval <= 0 or not self.names:
+            return
+        if self._watcher is not None and self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            # Thread tidak ikut ter-copy saat fork, jadi dicek per proses
+            if self._watcher is None or self._watcher_pid != os.getpid():
+                self._watcher_pid = os.getpid()
+                self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        last_stamp = None
+        while True:
+            time.sleep(self.watch_interval)
+            if not self.is_ready():
+                continue
+            try:
+                stamp = manifest_stamp(self.manifest_path)
+                if stamp != last_stamp:
+                    last_stamp = stamp
+                    self.sync()
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.error("❌ Error memantau manifest %s: %s", self.manifest_path, e)
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def active(self):
+        """Snapshot (key, nama tampilan + versi, model) yang sedang aktif"""
+        return self._active
+
+    def loaded(self):
+        """Semua model yang berhasil dimuat, urut prioritas: [(key, nama tampilan + versi, model)]"""
+        with self._lock:
+            return [(name, self._label(name), self.models[name]) for name in self.names if name in self.models]
+
+    def status(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'active_model': self._active[1],
+                'selected_models': list(self.names),
+                'versions': dict(self.versions),
+                'manifest': self.manifest_path,
+                'ready_seconds': self.ready_seconds,
+                'rss_mb': round(rss_mb(), 1),
+                'models': {name: dict(stats) for name, stats in self.stats.items()},
+            }
+
+
+# ✅ CLI: publish / activate / list versi
+
+def next_version(manifest, key):
+    numbers = [int(v[1:]) for v in manifest['models'][key]['versions'] if v[1:].isdigit()]
+    return f'v{max(numbers, default=0) + 1}'
+
+
+def publish(key, source, version=None, note='', activate=False, manifest_path=MANIFEST_PATH):
+    """
+    Salin artifact ke models/<key>/<versi>/, export engine terpaket (gb/knn),
+    cek load + warm-up, lalu daftarkan di manifest. Return versi.
+    """
+    import importlib
+
+    manifest = load_manifest(manifest_path)
+    version = version or next_version(manifest, key)
+    if version in manifest['models'][key]['versions']:
+        raise ValueError(f"Versi {version} untuk model {key} sudah ada")
+
+    base = os.path.dirname(manifest_path)
+    relative_dir = os.path.join(key, version)
+    os.makedirs(os.path.join(base, relative_dir), exist_ok=True)
+    entry = {'artifact': os.path.join(relative_dir, os.path.basename(MODEL_FILES[key]))}
+    artifact = os.path.join(base, entry['artifact'])
+    shutil.copyfile(source, artifact)
+    entry['sha256'] = file_sha256(artifact)
+
+    if key in PACKED_ENGINES:
+        module = importlib.import_module(PACKED_ENGINES[key][0])
+        entry['packed'] = os.path.join(relative_dir, os.path.basename(module.PACKED_PATH))
+        module.export(load_model(key, artifact), os.path.join(base, entry['packed']), artifact)
+
+    # Versi yang tidak bisa di-load atau gagal warm-up tidak pernah masuk manifest
+    model = load_model(key, artifact, os.path.join(base, entry['packed']) if 'packed' in entry else None)
+    warm_up(model_label(key, version), model)
+
+    entry['created_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    if note:
+        entry['note'] = note
+
+    def change(manifest):
+        manifest['models'][key]['versions'][version] = entry
+        if activate:
+            manifest['models'][key]['active'] = version
+    update_manifest(change, manifest_path)
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('publish', help='Daftarkan artifact model sebagai versi baru')
+    p.add_argument('model', choices=list(MODEL_FILES))
+    p.add_argument('source', help='File artifact (.joblib / .cbm)')
+    p.add_argument('--version', help='Nama versi (default: vN berikutnya)')
+    p.add_argument('--note', default='')
+    p.add_argument('--activate', action='store_true', help='Langsung jadikan versi aktif')
+    p = sub.add_parser('activate', help='Ganti versi aktif (juga untuk rollback)')
+    p.add_argument('model', choices=list(MODEL_FILES))
+    p.add_argument('version')
+    sub.add_parser('list', help='Tampilkan semua versi di manifest')
+    args = parser.parse_args(argv)
+
+    import warnings
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    if args.command == 'publish':
+        version = publish(args.model, args.source, args.version, args.note, args.activate, args.manifest)
+        print(f"✅ {model_label(args.model, version)} terdaftar di {args.manifest}"
+              f"{' dan aktif' if args.activate else ''}")
+    elif args.command == 'activate':
+        activate_version(args.model, args.version, args.manifest)
+        print(f"✅ Versi aktif {args.model}: {args.version} (worker yang membaca {args.manifest} "
+              f"memuat ulang otomatis, atau POST /admin/model/reload)")
+    else:
+        manifest = load_manifest(args.manifest)
+        for key, entry in manifest['models'].items():
+            for version, info in entry['versions'].items():
+                marker = '*' if version == entry['active'] else ' '
+                print(f"{marker} {key:<9} {version:<6} {info['artifact']:<32} {info.get('created_at', '-'):<26} "
+                      f"{info.get('note', '')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Cache hasil prediksi in-process (LRU + TTL).
+
+Key: tuple 16 fitur ternormalisasi + nama model aktif + versi policy threshold.
+Value: hasil akhir (prediction, probability, model_used) setelah
+apply_threshold_adjustment, sehingga profil yang berulang tidak perlu
+inference sama sekali.
+
+Konfigurasi env:
+    PREDICTION_CACHE_SIZE  jumlah entry maksimum (default 10000, 0 = nonaktif)
+    PREDICTION_CACHE_TTL   umur entry dalam detik (default 300)
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from threshold import POLICY_VERSION
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 300
+
+
+def cache_key(features, model_name):
+    return (tuple(features), model_name, POLICY_VERSION)
+
+
+class PredictionCache:
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        """Return value atau None; entry kadaluarsa dihapus saat dibaca"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Kosongkan cache, dipanggil saat model aktif atau policy berubah"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'policy_version': POLICY_VERSION,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
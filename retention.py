@@ -0,0 +1,378 @@
+"""
+Retensi riwayat prediksi: arsip bulanan, hapus bertahap, vacuum, backup.
+
+- Baris yang lebih tua dari RETENTION_DAYS dipindah ke file arsip bulanan
+  gzip NDJSON (database/arsip/prediksi-YYYY-MM.ndjson.gz, satu objek per
+  baris, format sama dengan /riwayat/ekspor?format=ndjson).
+- Penghapusan dari tabel panas dilakukan per batch RETENTION_BATCH_ROWS baris,
+  masing-masing transaksi pendek (file arsip ditulis sebelum lock tulis
+  diambil), dengan jeda di antaranya supaya writer
+  prediksi tidak pernah menunggu lama. Counter /statistik milik baris arsip
+  dipindah ke prediksi_agregat_arsip (lihat aggregates.py).
+- Halaman kosong dikembalikan ke OS dengan PRAGMA incremental_vacuum bertahap.
+- Backup konsisten saat service berjalan memakai SQLite online backup API
+  (database/backup/, BACKUP_KEEP file terakhir disimpan).
+- Riwayat lama tetap bisa dicari offline dari file arsip (perintah query).
+
+Satu batch arsip = satu gzip member yang ditulis + fsync sebelum commit DELETE;
+jika proses mati di antaranya, batch tersebut bisa tertulis dua kali di arsip,
+dan query membuang duplikat berdasarkan id.
+
+Pemakaian:
+    python retention.py run                    # arsip + vacuum + backup
+    python retention.py archive --days 90
+    python retention.py vacuum
+    python retention.py enable-vacuum          # sekali untuk database lama (VACUUM penuh)
+    python retention.py backup
+    python retention.py status
+    python retention.py query --dari 2025-01-01 --sampai 2025-03-31 --hasil 1 --format csv
+Di service: RETENTION_INTERVAL_HOURS > 0 menjalankan `run` berkala di background.
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import db
+from aggregates import move_to_archive
+from db import PREDIKSI_COLUMNS
+
+logger = logging.getLogger('diabetes.retention')
+
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 90))
+# Default di sebelah file database (volume yang sama)
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(os.path.dirname(db.DB_PATH), 'arsip'))
+BACKUP_DIR = os.environ.get('BACKUP_DIR', os.path.join(os.path.dirname(db.DB_PATH), 'backup'))
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))
+
+# Batas kerja per transaksi tulis + jeda antar transaksi
+RETENTION_BATCH_ROWS = int(os.environ.get('RETENTION_BATCH_ROWS', 500))
+RETENTION_PAUSE_MS = int(os.environ.get('RETENTION_PAUSE_MS', 20))
+VACUUM_STEP_PAGES = 256
+
+
+def cutoff_timestamp(days, now=None):
+    """Batas waktu arsip dalam format waktu_prediksi (UTC)"""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def archive_path(month, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, f'prediksi-{month}.ndjson.gz')
+
+
+def _append_archive(path, rows):
+    """Tambah satu gzip member berisi rows (NDJSON) lalu fsync"""
+    data = ''.join(json.dumps(dict(zip(PREDIKSI_COLUMNS, row)), ensure_ascii=False) + '\n' for row in rows)
+    with open(path, 'ab') as f:
+        f.write(gzip.compress(data.encode('utf-8')))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def archive_old(conn, days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR,
+                batch_rows=RETENTION_BATCH_ROWS, pause_ms=RETENTION_PAUSE_MS):
+    """
+    Pindahkan baris dengan waktu_prediksi < sekarang - days ke arsip bulanan,
+    batch demi batch dari yang paling lama. Return {bulan: jumlah baris}.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = cutoff_timestamp(days)
+    archived = {}
+    while True:
+        # Dibaca tanpa lock tulis (WAL): insert baru selalu di atas cutoff, jadi
+        # baris batch ini tidak berubah sampai dihapus di transaksi di bawah
+        rows = db.decode_rows(conn, conn.execute(f'''
+            {db.STORED_SELECT}
+            WHERE waktu_prediksi < ?
+            ORDER BY waktu_prediksi, id
+            LIMIT ?
+        ''', (cutoff, batch_rows)).fetchall())
+        if not rows:
+            break
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(str(row[-1])[:7], []).append(row)
+        # File arsip (gzip + fsync) ditulis di luar transaksi tulis
+        for month, month_rows in by_month.items():
+            _append_archive(archive_path(month, archive_dir), month_rows)
+            archived[month] = archived.get(month, 0) + len(month_rows)
+
+        # Baris batch ini = semua baris sampai kunci (waktu, id) terakhir
+        last = rows[-1]
+        where = 'waktu_prediksi < ? AND (waktu_prediksi, id) <= (?, ?)'
+        params = (cutoff, last[-1], last[0])
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            move_to_archive(conn, where, params)
+            conn.execute(f'DELETE FROM prediksi WHERE {where}', params)
+        if len(rows) < batch_rows:
+            break
+        time.sleep(pause_ms / 1000)
+    return archived
+
+
+def enable_incremental_vacuum(conn):
+    """Ubah database lama ke auto_vacuum=INCREMENTAL (VACUUM penuh, sekali saja)"""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+
+def incremental_vacuum(conn, step_pages=VACUUM_STEP_PAGES, pause_ms=RETENTION_PAUSE_MS):
+    """Kembalikan halaman kosong ke OS sedikit demi sedikit; return jumlah halaman"""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        logger.warning("⚠️  auto_vacuum belum INCREMENTAL, jalankan: python retention.py enable-vacuum")
+        return 0
+    def free_pages():
+        return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    start_pages = remaining = free_pages()
+    while remaining > 0:
+        # executescript menjalankan pragma sampai selesai; execute() hanya
+        # satu langkah (= satu halaman) untuk incremental_vacuum
+        conn.executescript(f'PRAGMA incremental_vacuum({step_pages})')
+        previous, remaining = remaining, free_pages()
+        if remaining >= previous:
+            break  # tidak ada kemajuan (database sibuk), lanjut di siklus berikutnya
+        time.sleep(pause_ms / 1000)
+    # PASSIVE: pindahkan halaman WAL ke file utama tanpa menunggu (dan memblok) writer
+    conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+    return start_pages - remaining
+
+
+def backup(conn, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    """
+    Salin database dengan online backup API (konsisten walau ada insert),
+    dicek integrity_check, lalu simpan `keep` backup terakhir. Return path.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db.DB_PATH))[0]
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(backup_dir, f'{name}-{stamp}.db')
+    tmp_path = path + '.tmp'
+    target = sqlite3.connect(tmp_path)
+    try:
+        # Satu langkah penuh = satu snapshot baca; dengan WAL writer tetap bisa
+        # commit selama backup (backup bertahap justru restart setiap ada commit)
+        conn.backup(target)
+        result = target.execute('PRAGMA integrity_check').fetchone()[0]
+        if result != 'ok':
+            raise RuntimeError(f'integrity_check backup gagal: {result}')
+    finally:
+        target.close()
+    os.replace(tmp_path, path)
+    for old in sorted(glob.glob(os.path.join(backup_dir, f'{name}-*.db')))[:-max(keep, 1)]:
+        os.remove(old)
+    return path
+
+
+def run(conn, days=RETENTION_DAYS):
+    """Satu siklus retensi lengkap; return ringkasan"""
+    start = time.perf_counter()
+    archived = archive_old(conn, days)
+    freed = incremental_vacuum(conn)
+    path = backup(conn)
+    summary = {
+        'archived': archived,
+        'freed_pages': freed,
+        'backup': path,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    logger.info("🗄️  Retensi: %s baris diarsip, %s halaman dibebaskan, backup %s (%.2fs)",
+                sum(archived.values()), freed, path, summary['seconds'])
+    return summary
+
+
+def status(conn, archive_dir=ARCHIVE_DIR):
+    rows, oldest = conn.execute('SELECT COUNT(*), MIN(waktu_prediksi) FROM prediksi').fetchone()
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return {
+        'rows': rows,
+        'oldest': oldest,
+        'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}[conn.execute('PRAGMA auto_vacuum').fetchone()[0]],
+        'size_mb': round(conn.execute('PRAGMA page_count').fetchone()[0] * page_size / 1e6, 2),
+        'free_mb': round(conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size / 1e6, 2),
+        'archives': {
+            os.path.basename(path): round(os.path.getsize(path) / 1e6, 3)
+            for path in sorted(glob.glob(os.path.join(archive_dir, 'prediksi-*.ndjson.gz')))
+        },
+    }
+
+
+# ✅ QUERY OFFLINE DARI ARSIP
+
+def _matches(record, dari=None, sampai=None, hasil=None, model=None):
+    """Filter sama dengan db._history_where (perbandingan string waktu_prediksi)"""
+    waktu = str(record['waktu_prediksi'])
+    if dari and waktu < dari:
+        return False
+    if sampai:
+        if len(sampai) == 10:
+            # Tanggal saja → inklusif sampai akhir hari
+            if waktu[:10] > sampai:
+                return False
+        elif waktu > sampai:
+            return False
+    if hasil is not None and record['hasil_prediksi'] != hasil:
+        return False
+    if model and record['model_digunakan'] != model:
+        return False
+    return True
+
+
+def iter_archive(archive_dir=ARCHIVE_DIR, dari=None, sampai=None, hasil=None, model=None):
+    """Generator record (dict) dari file arsip yang bulannya masuk rentang filter"""
+    for value in (dari, sampai):
+        if value:
+            datetime.fromisoformat(value)
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'prediksi-*.ndjson.gz'))):
+        month = os.path.basename(path)[len('prediksi-'):-len('.ndjson.gz')]
+        if (dari and month < dari[:7]) or (sampai and month > sampai[:7]):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record['id'] in seen or not _matches(record, dari, sampai, hasil, model):
+                    continue
+                seen.add(record['id'])
+                yield record
+
+
+def query(out, export_format='csv', include_live=False, archive_dir=ARCHIVE_DIR, **filters):
+    """Tulis hasil query arsip (+ tabel panas jika include_live) ke file out; return jumlah baris"""
+    records = iter_archive(archive_dir, **filters)
+    if include_live:
+        import itertools
+        live = (dict(zip(PREDIKSI_COLUMNS, row)) for row in db.iter_history(**filters))
+        records = itertools.chain(records, live)
+    writer = csv.writer(out) if export_format == 'csv' else None
+    if writer:
+        writer.writerow(PREDIKSI_COLUMNS)
+    count = 0
+    for record in records:
+        if writer:
+            writer.writerow([record[column] for column in PREDIKSI_COLUMNS])
+        else:
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+# ✅ JADWAL DI DALAM SERVICE
+
+@contextlib.contextmanager
+def _run_lock():
+    """Lock antar worker: hanya satu proses yang menjalankan retensi pada satu waktu"""
+    import fcntl
+    with open(db.DB_PATH + '.retention.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class RetentionScheduler:
+    """Jalankan run() setiap interval_hours di thread background (per proses, lazy)"""
+
+    def __init__(self, interval_hours, days=RETENTION_DAYS):
+        self.interval = interval_hours * 3600
+        self.days = days
+        self.last = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self.interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            # Thread tidak ikut ter-copy saat fork, jadi dicek per proses
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name='retention', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with _run_lock() as acquired:
+                    if acquired:
+                        conn = db.connect()
+                        try:
+                            self.last = run(conn, self.days)
+                        finally:
+                            conn.close()
+            except Exception as e:
+                logger.error("❌ Error retensi: %s", e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['run', 'archive', 'vacuum', 'enable-vacuum', 'backup', 'status', 'query'])
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS, help='Umur minimal baris yang diarsip')
+    parser.add_argument('--dari')
+    parser.add_argument('--sampai')
+    parser.add_argument('--hasil', type=int, choices=[0, 1])
+    parser.add_argument('--model')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    parser.add_argument('--include-live', action='store_true', help='Gabungkan dengan tabel panas')
+    parser.add_argument('--output', help='File hasil query (default: stdout)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'query':
+        filters = {'dari': args.dari, 'sampai': args.sampai, 'hasil': args.hasil, 'model': args.model}
+        if args.output:
+            out = open(args.output, 'w', newline='', encoding='utf-8')
+        else:
+            out = contextlib.nullcontext(sys.stdout)
+        with out as f:
+            count = query(f, args.format, args.include_live, **filters)
+        print(f"✅ {count} baris", file=sys.stderr)
+        return 0
+
+    db.init_db()
+    conn = db.connect()
+    try:
+        if args.command == 'run':
+            with _run_lock() as acquired:
+                if not acquired:
+                    print("⚠️  Retensi sedang berjalan di proses lain")
+                    return 1
+                result = run(conn, args.days)
+        elif args.command == 'archive':
+            result = archive_old(conn, args.days)
+        elif args.command == 'vacuum':
+            result = {'freed_pages': incremental_vacuum(conn)}
+        elif args.command == 'enable-vacuum':
+            result = {'changed': enable_incremental_vacuum(conn)}
+        elif args.command == 'backup':
+            result = {'backup': backup(conn)}
+        else:
+            result = status(conn)
+    finally:
+        conn.close()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+Skema penyimpanan ringkas tabel prediksi (versi 2, disimpan di PRAGMA user_version).
+
+Versi 1 menyimpan jenis kelamin + 14 gejala sebagai TEXT ('Pria'/'Wanita',
+'Ya'/'Tidak') dan nama model lengkap di setiap baris. Versi 2:
+- fitur      : bitmask INTEGER; bit 0 = jenis kelamin 'Pria', bit 1-14 = gejala 'Ya'
+               (urutan sama dengan features.FEATURE_NAMES[1:] dan lookup_table.flag_grid)
+- fitur_null : bitmask field yang kosong (NULL)
+- fitur_lain : JSON untuk nilai di luar pasangan standar (NULL untuk input form)
+- model_id   : foreign key ke tabel model (nama unik, beberapa baris saja)
+Ketiga kolom fitur mengembalikan nilai lama persis, sehingga /riwayat,
+/api/riwayat dan ekspor CSV/NDJSON tidak berubah.
+
+Migrasi database versi 1 in-place, per chunk (bisa dilanjutkan jika terputus):
+    python schema.py status
+    python schema.py migrate --chunk-rows 1000
+init_db juga menjalankan migrasi otomatis saat menemukan skema versi 1.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+SCHEMA_VERSION = 2
+
+# Kolom hasil decode (urutan ekspor dan API riwayat)
+PREDIKSI_COLUMNS = (
+    'id', 'usia', 'jenis_kelamin', 'poliuria', 'polidipsia',
+    'penurunan_berat_badan', 'kelemahan', 'polifagia', 'infeksi_jamur',
+    'penglihatan_kabur', 'gatal_gatal', 'mudah_marah', 'penyembuhan_lambat',
+    'kelemahan_parsial', 'kekakuan_otot', 'kerontokan_rambut', 'obesitas',
+    'hasil_prediksi', 'probabilitas', 'model_digunakan', 'waktu_prediksi'
+)
+
+# 15 kolom versi 1 yang dipadatkan ke bitmask, bit ke-i = FLAG_COLUMNS[i]
+FLAG_COLUMNS = PREDIKSI_COLUMNS[2:17]
+FLAG_VALUES = [('Pria', 'Wanita')] + [('Ya', 'Tidak')] * (len(FLAG_COLUMNS) - 1)
+
+# Kolom fisik versi 2, urutan SELECT untuk decode_row
+STORED_COLUMNS = (
+    'id', 'usia', 'fitur', 'fitur_null', 'fitur_lain',
+    'hasil_prediksi', 'probabilitas', 'model_id', 'waktu_prediksi'
+)
+
+MODEL_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS model (
+        id INTEGER PRIMARY KEY,
+        nama TEXT NOT NULL UNIQUE
+    )
+'''
+
+PREDIKSI_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usia INTEGER,
+        fitur INTEGER NOT NULL DEFAULT 0,
+        fitur_null INTEGER NOT NULL DEFAULT 0,
+        fitur_lain TEXT,
+        hasil_prediksi INTEGER,
+        probabilitas REAL,
+        model_id INTEGER REFERENCES model (id),
+        waktu_prediksi DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# - waktu: keyset /riwayat + covering untuk rebuild agregat, arsip retensi
+#   dan query statistik per hari/model/usia (tanpa membaca baris tabel)
+# - hasil/model: filter /api/riwayat dan ekspor
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_prediksi_waktu_cover ON {table} '
+    '(waktu_prediksi, id, hasil_prediksi, model_id, usia)',
+    'CREATE INDEX IF NOT EXISTS idx_prediksi_hasil ON {table} (hasil_prediksi, waktu_prediksi, id)',
+    'CREATE INDEX IF NOT EXISTS idx_prediksi_model ON {table} (model_id, waktu_prediksi, id)',
+)
+
+INSERT_PREDIKSI_SQL = '''
+    INSERT INTO prediksi (
+        usia, fitur, fitur_null, fitur_lain,
+        hasil_prediksi, probabilitas, model_id, waktu_prediksi
+    ) VALUES (?, ?, ?, ?, ?, ?, (SELECT id FROM model WHERE nama = ?), ?)
+'''
+
+INSERT_MODEL_SQL = 'INSERT OR IGNORE INTO model (nama) VALUES (?)'
+
+
+# ✅ ENCODE / DECODE
+
+def _as_text(value):
+    """Nilai seperti yang dulu tersimpan di kolom TEXT (affinity SQLite)"""
+    if isinstance(value, bool):
+        return str(int(value))
+    return value if isinstance(value, str) else str(value)
+
+
+def encode_flags(values):
+    """15 nilai mentah (jenis kelamin + 14 gejala) → (fitur, fitur_null, fitur_lain)"""
+    fitur = fitur_null = 0
+    other = {}
+    for bit, (column, value, (yes, no)) in enumerate(zip(FLAG_COLUMNS, values, FLAG_VALUES)):
+        if value is None:
+            fitur_null |= 1 << bit
+            continue
+        value = _as_text(value)
+        if value == yes:
+            fitur |= 1 << bit
+        elif value != no:
+            other[column] = value
+    return fitur, fitur_null, json.dumps(other, ensure_ascii=False) if other else None
+
+
+def _flag_table(start, stop):
+    """Semua kombinasi bit start..stop-1 → tuple nilai (tanpa NULL)"""
+    values = FLAG_VALUES[start:stop]
+    return [
+        tuple(yes if bits >> i & 1 else no for i, (yes, no) in enumerate(values))
+        for bits in range(1 << len(values))
+    ]
+
+
+# Decode bitmask tanpa NULL = gabungan dua tabel kecil (256 + 128 tuple)
+_LOW_BITS = 8
+_LOW_FLAGS = _flag_table(0, _LOW_BITS)
+_HIGH_FLAGS = _flag_table(_LOW_BITS, len(FLAG_VALUES))
+
+
+def decode_flags(fitur, fitur_null, fitur_lain):
+    """Kebalikan encode_flags: tuple 15 nilai seperti di skema versi 1"""
+    values = _LOW_FLAGS[fitur & ((1 << _LOW_BITS) - 1)] + _HIGH_FLAGS[fitur >> _LOW_BITS]
+    if fitur_null:
+        values = tuple(None if fitur_null >> bit & 1 else value for bit, value in enumerate(values))
+    if fitur_lain:
+        other = json.loads(fitur_lain)
+        values = tuple(other.get(column, value) for column, value in zip(FLAG_COLUMNS, values))
+    return values
+
+
+def encode_row(usia, flags, hasil, probabilitas, model_name, waktu):
+    """Baris untuk INSERT_PREDIKSI_SQL (model_id dicari dari nama saat insert)"""
+    return (usia, *encode_flags(flags), hasil, probabilitas, model_name, waktu)
+
+
+class ModelNames:
+    """Cache id → nama model; tabel model hanya bertambah, jadi aman di-cache"""
+
+    def __init__(self):
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn, model_id):
+        if model_id is None:
+            return None
+        name = self._names.get(model_id)
+        if name is None:
+            with self._lock:
+                self._names = dict(conn.execute('SELECT id, nama FROM model').fetchall())
+            name = self._names.get(model_id)
+        return name
+
+    def clear(self):
+        self._names = {}
+
+
+def decode_row(row, model_name):
+    """Baris STORED_COLUMNS → tuple PREDIKSI_COLUMNS"""
+    row_id, usia, fitur, fitur_null, fitur_lain, hasil, probabilitas, _, waktu = row
+    return (row_id, usia, *decode_flags(fitur, fitur_null, fitur_lain), hasil, probabilitas, model_name, waktu)
+
+
+# ✅ VERSI SKEMA + MIGRASI
+
+def table_columns(conn, table='prediksi'):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def schema_version(conn):
+    """0 = belum ada tabel, 1 = skema TEXT lama, 2 = skema ringkas (dilihat dari kolom)"""
+    columns = table_columns(conn)
+    if not columns:
+        return 0
+    return SCHEMA_VERSION if 'fitur' in columns else 1
+
+
+def create_schema(conn, table='prediksi'):
+    conn.execute(MODEL_TABLE_SQL)
+    conn.execute(PREDIKSI_TABLE_SQL.format(table=table))
+    for index_sql in INDEXES:
+        conn.execute(index_sql.format(table=table))
+    if table == 'prediksi':
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+MIGRATION_TABLE = 'prediksi_v2_migrasi'
+LEGACY_SELECT = f"SELECT {', '.join(PREDIKSI_COLUMNS)} FROM prediksi"
+
+
+def _encode_legacy(rows):
+    """Encode baris versi 1 untuk tabel migrasi (id dipertahankan)"""
+    encoded = []
+    for row in rows:
+        flags = row[2:17]
+        fitur, fitur_null, fitur_lain = encode_flags(flags)
+        # Cek round-trip per baris sebelum ditulis: decode harus sama persis
+        if decode_flags(fitur, fitur_null, fitur_lain) != tuple(_as_text(v) if v is not None else None for v in flags):
+            raise ValueError(f'Baris id={row[0]} tidak bisa dipadatkan tanpa kehilangan data')
+        encoded.append((row[0], row[1], fitur, fitur_null, fitur_lain, row[17], row[18], row[19], row[20]))
+    return encoded
+
+
+def _copy_rows(conn, encoded):
+    conn.executemany(INSERT_MODEL_SQL, {(row[7],) for row in encoded if row[7] is not None})
+    conn.executemany(f'''
+        INSERT INTO {MIGRATION_TABLE} (
+            id, usia, fitur, fitur_null, fitur_lain, hasil_prediksi, probabilitas, model_id, waktu_prediksi
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT id FROM model WHERE nama = ?), ?)
+    ''', encoded)
+
+
+def migrate(conn, chunk_rows=1000, pause_ms=10, progress=None):
+    """
+    Ubah tabel prediksi versi 1 ke versi 2 di file yang sama.
+
+    Baris disalin per chunk (urut id) ke tabel migrasi, masing-masing dalam
+    transaksi pendek, sehingga writer service tetap bisa insert. Langkah akhir
+    (satu transaksi) menyalin sisa baris baru, membuang baris yang dihapus
+    selama migrasi, lalu menukar tabel. Return jumlah baris, atau None jika
+    database sudah versi 2.
+    """
+    from aggregates import create_triggers
+
+    if schema_version(conn) != 1:
+        return None
+    with conn:
+        create_schema(conn, MIGRATION_TABLE)
+
+    copied = conn.execute(f'SELECT COUNT(*) FROM {MIGRATION_TABLE}').fetchone()[0]
+    total = conn.execute('SELECT COUNT(*) FROM prediksi').fetchone()[0]
+    while True:
+        # Lanjut dari id terakhir yang sudah disalin (migrasi bisa dilanjutkan)
+        last_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {MIGRATION_TABLE}').fetchone()[0]
+        rows = conn.execute(f'{LEGACY_SELECT} WHERE id > ? ORDER BY id LIMIT ?', (last_id, chunk_rows)).fetchall()
+        if not rows:
+            break
+        # Encode di luar transaksi tulis; baris lama tidak diubah oleh service
+        encoded = _encode_legacy(rows)
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            _copy_rows(conn, encoded)
+        copied += len(rows)
+        if progress:
+            progress(copied, total)
+        if len(rows) < chunk_rows:
+            # Sisa insert baru disalin di transaksi akhir
+            break
+        time.sleep(pause_ms / 1000)
+
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        last_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {MIGRATION_TABLE}').fetchone()[0]
+        _copy_rows(conn, _encode_legacy(conn.execute(f'{LEGACY_SELECT} WHERE id > ? ORDER BY id', (last_id,)).fetchall()))
+        conn.execute(f'DELETE FROM {MIGRATION_TABLE} WHERE id NOT IN (SELECT id FROM prediksi)')
+        # AUTOINCREMENT: id yang pernah dipakai (lalu dihapus) tidak dipakai ulang
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'prediksi'").fetchone()
+        conn.execute('DROP TABLE prediksi')
+        conn.execute(f'ALTER TABLE {MIGRATION_TABLE} RENAME TO prediksi')
+        if sequence:
+            conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'prediksi'", sequence)
+        create_triggers(conn)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        rows = conn.execute('SELECT COUNT(*) FROM prediksi').fetchone()[0]
+    return rows
+
+
+def main(argv=None):
+    import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['status', 'migrate'])
+    parser.add_argument('--chunk-rows', type=int, default=1000)
+    parser.add_argument('--pause-ms', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    conn = db.connect()
+    version = schema_version(conn)
+    page_count, page_size, free_pages = (
+        conn.execute(f'PRAGMA {name}').fetchone()[0] for name in ('page_count', 'page_size', 'freelist_count')
+    )
+    if args.command == 'status':
+        print(f"📦 {db.DB_PATH}: skema versi {version}, {(page_count - free_pages) * page_size / 1e6:.2f} MB terpakai "
+              f"({free_pages * page_size / 1e6:.2f} MB halaman kosong)")
+        conn.close()
+        return 0
+
+    start = time.perf_counter()
+    rows = migrate(
+        conn, args.chunk_rows, args.pause_ms,
+        progress=lambda done, total: print(f"  {done}/{total} baris", end='\r', flush=True),
+    )
+    print()
+    if rows is None:
+        print(f"✅ {db.DB_PATH} sudah skema versi {SCHEMA_VERSION}" if version else f"❌ {db.DB_PATH} belum punya tabel prediksi")
+        conn.close()
+        return 0 if version else 1
+    used = conn.execute('PRAGMA page_count').fetchone()[0] - conn.execute('PRAGMA freelist_count').fetchone()[0]
+    print(f"✅ {rows} baris dimigrasi ke skema versi {SCHEMA_VERSION} ({time.perf_counter() - start:.1f}s), "
+          f"terpakai {(page_count - free_pages) * page_size / 1e6:.2f} → {used * page_size / 1e6:.2f} MB")
+    print("   Halaman kosong: python retention.py vacuum (atau enable-vacuum untuk database lama)")
+    conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""merge.merge_file: SQLite lokal → store bersama, termasuk karantina baris yang ditolak store"""
+import sqlite3
+
+import pytest
+
+import db
+from aggregates import init_aggregates, read_summary
+from merge import merge_file, pending, quarantined
+from schema import INSERT_MODEL_SQL, INSERT_PREDIKSI_SQL, create_schema, encode_row
+
+INT4_MAX = 2 ** 31 - 1
+
+
+class FakeDataError(Exception):
+    pass
+
+
+class FakeStore:
+    """Seperti PostgresStore.write: satu batch satu transaksi, (sumber, sumber_id) unik"""
+    name = 'fake'
+    Error = Exception
+    DataError = FakeDataError
+
+    def __init__(self, fail_after_commit=()):
+        self.rows = {}
+        self.writes = 0
+        # Nomor panggilan write yang commit lalu 'putus' sebelum merge_file menghapus baris lokal
+        self.fail_after_commit = set(fail_after_commit)
+
+    def write(self, rows, sumber=None, sumber_ids=None):
+        self.writes += 1
+        if any(row[0] is not None and abs(row[0]) > INT4_MAX for row in rows):
+            raise FakeDataError('integer out of range')
+        for row, sumber_id in zip(rows, sumber_ids):
+            self.rows.setdefault((sumber, sumber_id), row)
+        if self.writes in self.fail_after_commit:
+            raise ConnectionError('koneksi putus setelah commit')
+
+
+def local_row(i):
+    flags = tuple('Ya' if (i >> bit) & 1 else 'Tidak' for bit in range(14))
+    return encode_row(20 + i % 60, ('Pria' if i % 2 else 'Wanita',) + flags, i % 2, i / 100,
+                      'Gradient Boosting v1' if i % 3 else 'KNN v1', f'2025-03-{1 + i % 28:02d} 10:00:00')
+
+
+@pytest.fixture
+def local_db(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'pod.db')
+    create_schema(conn)
+    init_aggregates(conn)
+    rows = [local_row(i) for i in range(1, 26)]
+    with conn:
+        conn.executemany(INSERT_MODEL_SQL, {(row[6],) for row in rows})
+        conn.executemany(INSERT_PREDIKSI_SQL, rows)
+    yield conn
+    conn.close()
+
+
+def local_rows(conn):
+    """{id: baris seperti yang dikirim ke store.write}"""
+    return {
+        row[0]: (*row[1:7], name, row[8])
+        for *row, name in conn.execute(f'''
+            SELECT p.{', p.'.join(db.STORED_COLUMNS)}, m.nama
+            FROM prediksi p LEFT JOIN model m ON m.id = p.model_id ORDER BY p.id
+        ''')
+    }
+
+
+def test_merge_moves_every_row_once(local_db):
+    expected = local_rows(local_db)
+    store = FakeStore()
+
+    assert merge_file(local_db, store, batch_rows=10, pause_ms=0) == len(expected)
+
+    assert {sumber_id: row for (_, sumber_id), row in store.rows.items()} == expected
+    assert pending(local_db) == 0
+    assert quarantined(local_db) == 0
+    assert read_summary(local_db)['total'] == 0
+
+
+def test_merge_quarantines_rows_the_store_rejects(local_db):
+    with local_db:
+        local_db.execute('UPDATE prediksi SET usia = ? WHERE id = 13', (10 ** 10,))
+    expected = local_rows(local_db)
+    bad = expected.pop(13)
+    store = FakeStore()
+
+    assert merge_file(local_db, store, batch_rows=10, pause_ms=0) == len(expected)
+
+    # Batch lain dan sisa batch yang berisi baris rusak tetap masuk, masing-masing sekali
+    assert {sumber_id: row for (_, sumber_id), row in store.rows.items()} == expected
+    assert pending(local_db) == 0
+    karantina = local_db.execute(
+        f"SELECT {', '.join(db.STORED_COLUMNS)}, alasan FROM merge_karantina"
+    ).fetchall()
+    assert len(karantina) == 1
+    assert karantina[0][0] == 13 and karantina[0][1] == bad[0]
+    assert karantina[0][-1] == 'integer out of range'
+
+    # Merge berikutnya tidak mencoba baris karantina lagi
+    writes = store.writes
+    assert merge_file(local_db, store, batch_rows=10, pause_ms=0) == 0
+    assert store.writes == writes
+
+
+def test_merge_resumes_without_duplicates(local_db):
+    """Store commit lalu koneksi putus: batch dikirim ulang dan dilewati store"""
+    expected = local_rows(local_db)
+    store = FakeStore(fail_after_commit={2})
+
+    with pytest.raises(ConnectionError):
+        merge_file(local_db, store, batch_rows=10, pause_ms=0)
+    # Batch pertama sudah dihapus lokal; batch kedua masih ada walau sudah di store
+    assert pending(local_db) == len(expected) - 10
+    assert len(store.rows) == 20
+
+    merge_file(local_db, store, batch_rows=10, pause_ms=0)
+    assert {sumber_id: row for (_, sumber_id), row in store.rows.items()} == expected
+    assert pending(local_db) == 0
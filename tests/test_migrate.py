@@ -0,0 +1,159 @@
+"""Migrasi skema versi 1 → 2 (schema.migrate) pada file SQLite sementara"""
+import sqlite3
+
+import pytest
+
+from aggregates import SCHEMA_SQL, init_aggregates, read_summary, rebuild
+from schema import (
+    INSERT_MODEL_SQL, INSERT_PREDIKSI_SQL, LEGACY_SELECT, PREDIKSI_COLUMNS, SCHEMA_VERSION,
+    create_schema, decode_row, encode_row, migrate, schema_version
+)
+
+# Tabel prediksi versi 1 (sebelum schema.py)
+LEGACY_TABLE_SQL = f'''
+    CREATE TABLE prediksi (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usia INTEGER,
+        {', '.join(f'{column} TEXT' for column in PREDIKSI_COLUMNS[2:17])},
+        hasil_prediksi INTEGER,
+        probabilitas REAL,
+        model_digunakan TEXT,
+        waktu_prediksi DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+LEGACY_INSERT_SQL = f'''
+    INSERT INTO prediksi ({', '.join(PREDIKSI_COLUMNS[1:])})
+    VALUES ({', '.join('?' * (len(PREDIKSI_COLUMNS) - 1))})
+'''
+
+STORED_WITH_NAME = '''
+    SELECT p.id, p.usia, p.fitur, p.fitur_null, p.fitur_lain, p.hasil_prediksi, p.probabilitas,
+           p.model_id, p.waktu_prediksi, m.nama
+    FROM prediksi p LEFT JOIN model m ON m.id = p.model_id
+    ORDER BY p.id
+'''
+
+
+def legacy_row(i):
+    """Baris versi 1 yang bervariasi: nilai standar, NULL, nilai di luar pasangan standar"""
+    flags = []
+    for bit in range(15):
+        yes, no = ('Pria', 'Wanita') if bit == 0 else ('Ya', 'Tidak')
+        choice = (i * 7 + bit * 3) % 11
+        flags.append(None if choice == 0 else 'Yes' if choice == 1 else yes if choice % 2 else no)
+    usia = None if i % 13 == 0 else -3 if i % 17 == 0 else (i * 5) % 121
+    hasil = None if i % 19 == 0 else i % 2
+    model = None if i % 23 == 0 else ('Gradient Boosting', 'KNN v1', 'Logika Fallback')[i % 3]
+    waktu = f'2025-0{1 + i % 3}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:00'
+    return (usia, *flags, hasil, round(i / 250, 4), model, waktu)
+
+
+def reference_counters(rows):
+    """Counter agregat untuk rows jika ditulis langsung ke skema versi 2"""
+    conn = sqlite3.connect(':memory:')
+    create_schema(conn)
+    init_aggregates(conn)
+    with conn:
+        conn.executemany(INSERT_MODEL_SQL, {(row[18],) for row in rows if row[18] is not None})
+        conn.executemany(INSERT_PREDIKSI_SQL, [
+            encode_row(row[0], row[1:16], row[16], row[17], row[18], row[19]) for row in rows
+        ])
+    return counters(conn)
+
+
+def counters(conn):
+    return sorted(conn.execute('SELECT * FROM prediksi_agregat WHERE total <> 0').fetchall())
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """File versi 1 dengan id berlubang (baris dihapus)"""
+    conn = sqlite3.connect(tmp_path / 'prediksi.db')
+    conn.execute(LEGACY_TABLE_SQL)
+    conn.executemany(LEGACY_INSERT_SQL, [legacy_row(i) for i in range(1, 1201)])
+    conn.execute('DELETE FROM prediksi WHERE id % 97 = 0 OR id = 1200')
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def add_legacy_counters(conn):
+    """Counter agregat yang dulu di-maintain trigger untuk baris versi 1 yang sama"""
+    kept = [row[1:] for row in conn.execute(f'{LEGACY_SELECT} ORDER BY id')]
+    with conn:
+        conn.execute(SCHEMA_SQL.format(table='prediksi_agregat'))
+        conn.executemany('INSERT INTO prediksi_agregat VALUES (?, ?, ?, ?, ?, ?)', reference_counters(kept))
+    return counters(conn)
+
+
+def legacy_rows(conn):
+    return conn.execute(f'{LEGACY_SELECT} ORDER BY id').fetchall()
+
+
+def migrated_rows(conn):
+    return [decode_row(row[:9], row[9]) for row in conn.execute(STORED_WITH_NAME)]
+
+
+def test_migrate_round_trips_every_row(legacy_db):
+    before = legacy_rows(legacy_db)
+    counters_before = add_legacy_counters(legacy_db)
+
+    assert migrate(legacy_db, chunk_rows=100, pause_ms=0) == len(before)
+
+    assert schema_version(legacy_db) == SCHEMA_VERSION
+    assert migrated_rows(legacy_db) == before
+    init_aggregates(legacy_db)
+    assert counters(legacy_db) == counters_before
+    # Trigger baru konsisten dengan tabel: rebuild tidak mengubah counter
+    assert rebuild(legacy_db) == 0
+
+
+def test_migrate_keeps_ids_and_sequence(legacy_db):
+    """AUTOINCREMENT: id baris yang dihapus sebelum migrasi tidak dipakai ulang; trigger baru jalan"""
+    add_legacy_counters(legacy_db)
+    migrate(legacy_db, chunk_rows=100, pause_ms=0)
+    init_aggregates(legacy_db)
+    with legacy_db:
+        legacy_db.execute(INSERT_MODEL_SQL, ('KNN v1',))
+        legacy_db.execute(INSERT_PREDIKSI_SQL, encode_row(40, ('Pria',) + ('Ya',) * 14, 1, 0.9, 'KNN v1', None))
+        # Baris lama tanpa hasil_prediksi (NULL) tetap bisa dihapus
+        legacy_db.execute('DELETE FROM prediksi WHERE hasil_prediksi IS NULL')
+    assert legacy_db.execute('SELECT MAX(id) FROM prediksi').fetchone()[0] == 1201
+    assert read_summary(legacy_db)['total'] == len(migrated_rows(legacy_db))
+    assert rebuild(legacy_db) == 0
+
+
+def test_migrate_copies_rows_written_during_migration(legacy_db):
+    """Insert/delete service di antara chunk ikut terbawa di transaksi akhir"""
+    def service_writes(done, total):
+        if done == 100:
+            legacy_db.executemany(LEGACY_INSERT_SQL, [legacy_row(i) for i in range(2000, 2005)])
+            # Baris yang sudah disalin ke tabel migrasi lalu dihapus service
+            legacy_db.execute('DELETE FROM prediksi WHERE id = 5')
+            legacy_db.commit()
+
+    migrate(legacy_db, chunk_rows=100, pause_ms=0, progress=service_writes)
+
+    expected = [(row_id, *legacy_row(i)) for row_id, i in zip(range(1201, 1206), range(2000, 2005))]
+    rows = migrated_rows(legacy_db)
+    assert rows[-5:] == expected
+    assert 5 not in {row[0] for row in rows}
+    init_aggregates(legacy_db)
+    assert read_summary(legacy_db)['total'] == len(rows)
+
+
+def test_migrate_resumes_after_interruption(legacy_db):
+    before = legacy_rows(legacy_db)
+
+    def crash(done, total):
+        if done >= 300:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        migrate(legacy_db, chunk_rows=100, pause_ms=0, progress=crash)
+    assert schema_version(legacy_db) == 1
+    assert legacy_rows(legacy_db) == before
+
+    assert migrate(legacy_db, chunk_rows=100, pause_ms=0) == len(before)
+    assert migrated_rows(legacy_db) == before
+    assert migrate(legacy_db) is None
@@ -0,0 +1,174 @@
+import logging
+
+import numpy as np
+
+# Naikkan versi ini setiap kali logika threshold/fallback di modul ini berubah
+# (dipakai lookup table dan cache prediksi untuk membuang hasil lama)
+POLICY_VERSION = 1
+
+logger = logging.getLogger('diabetes.threshold')
+
+
+def apply_threshold_adjustment(raw_prediction, raw_probability, features, model_name):
+    """
+    Adjust prediction threshold untuk hasil yang lebih konservatif
+    - Minimal 70% probability untuk prediksi diabetes
+    - Minimal 2 gejala utama atau 3+ gejala total
+    - Pertimbangan usia
+    """
+    # Hitung gejala utama (yang paling penting secara medis)
+    main_symptoms = features[2:4]  # Hanya Polyuria dan Polydipsia - gejala paling khas diabetes
+    secondary_symptoms = features[4:9]  # Gejala sekunder
+    other_symptoms = features[9:14]  # Gejala lainnya
+    
+    main_symptom_count = sum(main_symptoms)
+    secondary_symptom_count = sum(secondary_symptoms)
+    other_symptom_count = sum(other_symptoms)
+    total_symptoms = sum(features[2:14])  # Semua gejala kecuali age, gender, alopecia, obesity
+    
+    age = features[0]
+    
+    logger.debug("🔍 Threshold Check: main=%s, secondary=%s, other=%s, total=%s, age=%s, raw_prob=%.2f",
+                 main_symptom_count, secondary_symptom_count, other_symptom_count, total_symptoms, age, raw_probability)
+    
+    # ✅ KRITERIA KETAT UNTUK PREDIKSI DIABETES:
+    if raw_prediction == 1:
+        # 1. Probability harus > 65% (dinaikkan dari 50%)
+        if raw_probability < 0.65:
+            logger.debug("🔄 Adjust: Probability %.2f < 65%%, set to Normal", raw_probability)
+            return 0, raw_probability
+        
+        # 2. Harus punya minimal 2 gejala utama ATAU 1 gejala utama + 2 sekunder ATAU 4+ gejala total
+        if main_symptom_count < 2 and (main_symptom_count + secondary_symptom_count) < 3 and total_symptoms < 4:
+            logger.debug("🔄 Adjust: Gejala tidak cukup (main=%s, total=%s), set to Normal", main_symptom_count, total_symptoms)
+            return 0, raw_probability
+        
+        # 3. Jika usia muda (<30) butuh lebih banyak gejala
+        if age < 30 and total_symptoms < 4:
+            logger.debug("🔄 Adjust: Usia muda (%s) dengan sedikit gejala (%s), set to Normal", age, total_symptoms)
+            return 0, raw_probability
+            
+        # 4. Jika hanya 1-2 gejala total, terlalu sedikit
+        if total_symptoms <= 2:
+            logger.debug("🔄 Adjust: Hanya %s gejala total, set to Normal", total_symptoms)
+            return 0, raw_probability
+            
+        # 5. Jika hanya gejala minor tanpa gejala utama, turunkan
+        if main_symptom_count == 0 and total_symptoms < 5:
+            logger.debug("🔄 Adjust: Tidak ada gejala utama dan hanya %s gejala, set to Normal", total_symptoms)
+            return 0, raw_probability
+    
+    # ✅ JIKA NORMAL TAPI PROBABILITY TINGGI + GEJALA KUAT, CEK LAGI
+    elif raw_prediction == 0 and raw_probability > 0.60:
+        # Jika punya 2+ gejala utama, mungkin ada risiko
+        if main_symptom_count >= 2:
+            logger.debug("🔄 Adjust: %s gejala utama dengan prob %.2f, set to Risk", main_symptom_count, raw_probability)
+            return 1, raw_probability
+            
+        # Jika usia >45 dengan beberapa gejala
+        if age > 45 and total_symptoms >= 3:
+            logger.debug("🔄 Adjust: Usia %s dengan %s gejala dan prob %.2f, set to Risk", age, total_symptoms, raw_probability)
+            return 1, raw_probability
+    
+    logger.debug("✅ Final: prediction=%s, probability=%.2f", raw_prediction, raw_probability)
+    return raw_prediction, raw_probability
+
+def prediksi_fallback(features):
+    """Improved fallback logic dengan threshold lebih tinggi"""
+    # Gejala utama diabetes
+    main_symptoms = features[2:4] 
+    secondary_symptoms = features[4:9] 
+    other_symptoms = features[9:14]
+    
+    main_symptom_count = sum(main_symptoms)
+    secondary_symptom_count = sum(secondary_symptoms)
+    other_symptom_count = sum(other_symptoms)
+    total_symptoms = sum(features[2:14])
+    age = features[0]
+    
+    logger.debug("🔍 Fallback Check: main=%s, secondary=%s, other=%s, total=%s, age=%s",
+                 main_symptom_count, secondary_symptom_count, other_symptom_count, total_symptoms, age)
+    
+    # ✅ KRITERIA KETAT UNTUK FALLBACK:
+    # 1. Dua gejala utama langsung = risiko tinggi
+    if main_symptom_count >= 2:
+        probability = min(0.85, 0.70 + (total_symptoms * 0.05))
+        return 1, probability
+        
+    # 2. Satu gejala utama + minimal 2 gejala lain
+    elif main_symptom_count >= 1 and total_symptoms >= 3:
+        probability = min(0.80, 0.65 + (total_symptoms * 0.04))
+        return 1, probability
+        
+    # 3. Usia >45 dengan beberapa gejala
+    elif age > 45 and total_symptoms >= 4:
+        return 1, 0.70
+        
+    # 4. Banyak gejala sekunder (5+)
+    elif total_symptoms >= 5:
+        return 1, 0.65
+        
+    # 5. Normal cases
+    else:
+        base_prob = 0.20 + (total_symptoms * 0.03)
+        return 0, min(0.45, base_prob)
+
+
+def _symptom_counts(X):
+    """Hitung gejala per baris untuk matrix fitur (n, 16)"""
+    X = np.asarray(X)
+    main_count = X[:, 2:4].sum(axis=1)
+    secondary_count = X[:, 4:9].sum(axis=1)
+    total = X[:, 2:14].sum(axis=1)
+    age = X[:, 0]
+    return main_count, secondary_count, total, age
+
+
+def apply_threshold_adjustment_batch(raw_predictions, raw_probabilities, X):
+    """
+    Versi vectorized dari apply_threshold_adjustment untuk satu batch.
+    Hasilnya identik baris per baris dengan versi skalar.
+    """
+    raw_predictions = np.asarray(raw_predictions).astype(np.int64)
+    raw_probabilities = np.asarray(raw_probabilities, dtype=np.float64)
+    main_count, secondary_count, total, age = _symptom_counts(X)
+
+    # ✅ Kriteria untuk menurunkan prediksi diabetes (sama dengan urutan 1-5)
+    downgrade = (
+        (raw_probabilities < 0.65)
+        | ((main_count < 2) & ((main_count + secondary_count) < 3) & (total < 4))
+        | ((age < 30) & (total < 4))
+        | (total <= 2)
+        | ((main_count == 0) & (total < 5))
+    )
+    # ✅ Kriteria untuk menaikkan prediksi normal dengan probability tinggi
+    upgrade = (main_count >= 2) | ((age > 45) & (total >= 3))
+
+    predictions = raw_predictions.copy()
+    predictions[(raw_predictions == 1) & downgrade] = 0
+    predictions[(raw_predictions == 0) & (raw_probabilities > 0.60) & upgrade] = 1
+    return predictions, raw_probabilities
+
+
+def prediksi_fallback_batch(X):
+    """Versi vectorized dari prediksi_fallback untuk satu batch"""
+    main_count, _, total, age = _symptom_counts(X)
+
+    conditions = [
+        main_count >= 2,
+        (main_count >= 1) & (total >= 3),
+        (age > 45) & (total >= 4),
+        total >= 5,
+    ]
+    probabilities = np.select(
+        conditions,
+        [
+            np.minimum(0.85, 0.70 + (total * 0.05)),
+            np.minimum(0.80, 0.65 + (total * 0.04)),
+            0.70,
+            0.65,
+        ],
+        default=np.minimum(0.45, 0.20 + (total * 0.03)),
+    )
+    predictions = np.select(conditions, [1, 1, 1, 1], default=0)
+    return predictions, probabilities
@@ -0,0 +1,17 @@
+"""
+Entry point WSGI untuk server produksi:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Dengan preload_app, modul ini di-import sekali di master gunicorn: model
+di-load sampai selesai sebelum fork, sehingga semua worker berbagi memori
+model secara copy-on-write.
+"""
+import gc
+
+from app import create_app
+
+app = create_app(wait_for_models=True)
+
+# Objek yang sudah ada (termasuk model) dipindah keluar dari jangkauan GC,
+# supaya siklus GC di worker tidak menyentuh page hasil fork (copy-on-write)
+gc.freeze()